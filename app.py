@@ -1,187 +1,1265 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash
+import hashlib
+import logging
+import mimetypes
+import time
+from functools import wraps, lru_cache
+from contextlib import contextmanager
+from flask import (Flask, Response, render_template, stream_template, stream_with_context,
+                   request, redirect, url_for, flash, abort, g, jsonify, session,
+                   make_response, send_from_directory, has_request_context, has_app_context, before_render_template,
+                   template_rendered)
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, date
-from sqlalchemy import extract, func
+from flask_sqlalchemy.session import Session
+from datetime import datetime, date, timedelta, timezone
+from datetime import date as date_class
+from sqlalchemy import (extract, func, tuple_, table, column, text, event, type_coerce, case,
+                        create_engine)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from pathlib import Path
-import sqlite3
+import io
+import threading
+from collections import Counter
+import click
+import conexao
+from models import validar_campos
+from periodos import intervalo_periodo, plano_usa_indice
+import importacao
+import exportacao
+from cache import CacheVersionado
+import relatorios
+import busca
+import saldo
+import orcamento
+import dinheiro
+import metricas
+import limpeza
+import migracoes
+import fila_escrita
+import livros
+import compressao
+import estaticos
 
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
+app.config['EXTRATO_PAGE_SIZE'] = int(os.getenv('EXTRATO_PAGE_SIZE', 50))
+app.config['EXPORT_CHUNK_SIZE'] = int(os.getenv('EXPORT_CHUNK_SIZE', 1000))
+app.config['RESULT_CACHE_SIZE'] = int(os.getenv('RESULT_CACHE_SIZE', 256))
+app.config['SEARCH_LIMIT'] = int(os.getenv('SEARCH_LIMIT', 200))
+app.config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', 200))
+# Sampling profiler for requests slower than this; 0 turns it off
+app.config['PROFILE_SLOW_MS'] = float(os.getenv('PROFILE_SLOW_MS', 0))
+app.config['PROFILE_INTERVAL_MS'] = float(os.getenv('PROFILE_INTERVAL_MS', 5))
 
 # Database configuration
 BASE_DIR = Path(__file__).parent
 DB_DIR = BASE_DIR / 'instance'
-DB_PATH = DB_DIR / 'financas.db'
+DB_PATH = Path(os.getenv('DATABASE_PATH', DB_DIR / 'financas.db'))
+
+# Named ledgers, one SQLite file per household (see livros.py and Ledger below)
+LEDGERS_DIR = Path(os.getenv('LEDGERS_DIR', DB_DIR / 'ledgers'))
 
 # Ensure instance directory exists
 DB_DIR.mkdir(exist_ok=True)
 
+# Fingerprinted copies of static/, built by `flask build-assets` (see estaticos.py)
+STATIC_DIR = Path(app.static_folder)
+ASSETS_DIR = STATIC_DIR / estaticos.PASTA_SAIDA
+asset_manifest = estaticos.carregar_manifesto(STATIC_DIR)
+
 # Configure SQLAlchemy
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_PATH}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
     'pool_pre_ping': True,
-    'connect_args': {'check_same_thread': False}
+    # Small per-process pool; each thread checks out its own connection
+    'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+    'connect_args': {
+        'check_same_thread': False,
+        'timeout': conexao.PRAGMAS['busy_timeout'] / 1000
+    }
 }
 
-db = SQLAlchemy(app)
+class LedgerSession(Session):
+    """Sends every statement to the database of the ledger in ``g.ledger``."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and 'ledger' in g:
+            return g.ledger.engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(app, session_options={'class_': LedgerSession})
+
+# Instrumentation, exposed at /metrics (per process; Prometheus sums the workers)
+metrics = metricas.Registro()
+request_duration = metrics.histograma(
+    'http_request_duration_seconds', 'Request wall time.', ('route', 'method'))
+requests_total = metrics.contador(
+    'http_requests_total', 'Requests answered.', ('route', 'method', 'status'))
+request_sql_statements = metrics.histograma(
+    'http_request_sql_statements', 'SQL statements per request.', ('route',),
+    metricas.LIMITES_QUANTIDADE)
+request_sql_duration = metrics.histograma(
+    'http_request_sql_seconds', 'Time spent in SQL per request.', ('route',))
+request_template_duration = metrics.histograma(
+    'http_request_template_seconds', 'Template render time per request.', ('route',))
+slow_queries_total = metrics.contador(
+    'sql_slow_queries_total', 'Statements slower than SLOW_QUERY_MS.')
+slow_query_log = logging.getLogger('app.slow_queries')
+
+profiler = (metricas.AmostradorPilhas(DB_DIR / 'profiles',
+                                      app.config['PROFILE_SLOW_MS'] / 1000,
+                                      app.config['PROFILE_INTERVAL_MS'] / 1000)
+            if app.config['PROFILE_SLOW_MS'] else None)
+
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    if has_request_context():
+        g.sql_statements = g.get('sql_statements', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+    if elapsed * 1000 >= app.config['SLOW_QUERY_MS']:
+        with metrics.trava:
+            slow_queries_total.incrementar()
+        slow_query_log.warning('%.1f ms%s: %s %r', elapsed * 1000,
+                               f' ({request.path})' if has_request_context() else '',
+                               ' '.join(statement.split())[:1000], parameters)
+
+def _query_failed(context):
+    started = context.connection.info.get('query_started') if context.connection else None
+    if started:
+        started.pop()
+
+def setup_engine(engine):
+    """Pragmas and instrumentation for an engine (the default one and each ledger's)."""
+    # WAL, synchronous=NORMAL, busy_timeout, mmap and cache pragmas on every connection
+    conexao.instalar_no_engine(engine)
+    event.listen(engine, 'before_cursor_execute', _query_started)
+    event.listen(engine, 'after_cursor_execute', _query_finished)
+    event.listen(engine, 'handle_error', _query_failed)
+
+with app.app_context():
+    setup_engine(db.engine)
+
+@before_render_template.connect_via(app)
+def _template_started(sender, template, context, **extra):
+    g.template_started = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def _template_finished(sender, template, context, **extra):
+    started = g.pop('template_started', None)
+    if started is not None:
+        g.template_seconds = g.get('template_seconds', 0.0) + time.perf_counter() - started
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if profiler:
+        profiler.iniciar()
+
+@app.after_request
+def remember_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.after_request
+def compress_response(response):
+    """gzip/brotli for HTML and JSON bodies (see compressao.py for the levels)."""
+    if (response.mimetype not in compressao.TIPOS or response.status_code != 200
+            or response.direct_passthrough or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = compressao.escolher(request.accept_encodings)
+    if encoding is None or request.method == 'HEAD':
+        return response
+    if response.is_streamed:
+        # Streamed extratos go out compressed block by block, as rows render
+        response.response = compressao.comprimir_fluxo(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < compressao.MIN_BYTES:
+            return response
+        response.set_data(compressao.comprimir(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # Same page, different bytes: the ETag can only be a weak match now
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+@app.teardown_request
+def record_request_metrics(error):
+    # Streamed responses tear down after the last chunk, so this covers them too
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = 500 if error else g.get('response_status', 500)
+    with metrics.trava:
+        request_duration.observar(route, request.method, valor=elapsed)
+        requests_total.incrementar(route, request.method, status)
+        request_sql_statements.observar(route, valor=g.get('sql_statements', 0))
+        request_sql_duration.observar(route, valor=g.get('sql_seconds', 0.0))
+        request_template_duration.observar(route, valor=g.get('template_seconds', 0.0))
+    if profiler:
+        stacks = profiler.finalizar(elapsed, f'{request.method} {route}')
+        if stacks:
+            app.logger.warning('Slow request %s %s (%.0f ms); stacks in %s',
+                               request.method, request.full_path.rstrip('?'), elapsed * 1000, stacks)
 
 # Transaction Model
 class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(100), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(db.Integer, nullable=False)  # cents
     category = db.Column(db.String(50), nullable=False)
     type = db.Column(db.String(10), nullable=False)  # 'income' or 'expense'
     date = db.Column(db.Date, nullable=False)
     deleted_at = db.Column(db.DateTime)
 
+    # Managed indexes: every list/filter query must be served by one of these
+    # (see `flask check-query-plans`). Partial indexes only cover the rows
+    # each view can show.
+    __table_args__ = (
+        db.Index('ix_transaction_active_date', 'date', 'id',
+                 sqlite_where=db.text('deleted_at IS NULL')),
+        db.Index('ix_transaction_active_type_date', 'type', 'date', 'id',
+                 sqlite_where=db.text('deleted_at IS NULL')),
+        db.Index('ix_transaction_trash', 'deleted_at',
+                 sqlite_where=db.text('deleted_at IS NOT NULL')),
+        # Purged ids are never handed out again (migration 8)
+        {'sqlite_autoincrement': True},
+    )
+
     def __init__(self, description, amount, category, type, date):
-        self.description = description
-        self.amount = float(amount)
-        self.category = category
-        self.type = type
+        # Raises ValueError (description 1-100 chars, positive amount, known type)
+        self.description, self.amount, self.category, self.type = validar_campos(
+            description, amount, category, type)
         
-        # Handle date conversion
+        # Handle date conversion; the ``date`` argument shadows the class here
         if isinstance(date, str):
             self.date = datetime.strptime(date, '%Y-%m-%d').date()
-        elif isinstance(date, date):
+        elif isinstance(date, date_class):
             self.date = date
         else:
             raise ValueError("Formato de data inválido. Use 'YYYY-MM-DD'")
 
-# Create database tables
-with app.app_context():
+# Monthly rollup of active transactions, one row per (year, month, type, category)
+class MonthlySummary(db.Model):
+    __tablename__ = 'monthly_summary'
+
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(10), primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)  # cents
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+# Running balance, one row per day with active transactions (see saldo.py)
+class DailyBalance(db.Model):
+    __tablename__ = 'daily_balance'
+
+    date = db.Column(db.Date, primary_key=True)
+    net = db.Column(db.Integer, nullable=False)  # that day's income - expense, in cents
+    count = db.Column(db.Integer, nullable=False)
+    balance = db.Column(db.Integer, nullable=False)  # at the end of the day
+
+# Monthly spending limit per category; spend comes from MonthlySummary (see orcamento.py)
+class Budget(db.Model):
+    __tablename__ = 'budget'
+
+    category = db.Column(db.String(50), primary_key=True)
+    amount = db.Column(db.Integer, nullable=False)  # cents
+
+# Single-row counter bumped by every write, shared by all workers
+class DataVersion(db.Model):
+    __tablename__ = 'data_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime)  # UTC
+
+def data_version_info():
+    """(version, last write time in UTC), read at most once per request."""
+    if 'data_version' not in g:
+        row = db.session.execute(
+            db.select(DataVersion.version, DataVersion.updated_at)
+            .where(DataVersion.id == 1)
+        ).first()
+        g.data_version = (row.version, row.updated_at) if row else (0, None)
+    return g.data_version
+
+def data_version():
+    return data_version_info()[0]
+
+def bump_data_version():
+    """Invalidate cached results; call inside the write's transaction."""
+    db.session.execute(
+        db.update(DataVersion)
+        .where(DataVersion.id == 1)
+        .values(version=DataVersion.version + 1,
+                updated_at=datetime.now(timezone.utc).replace(tzinfo=None))
+    )
+    g.pop('data_version', None)
+
+def conditional(view):
+    """Answer 304 from the data version alone when the page has not changed.
+
+    Pages with pending flash messages are always rendered, since the
+    cached copy would not show them.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if '_flashes' in session:
+            return view(*args, **kwargs)
+        
+        version, updated_at = data_version_info()
+        today = date.today()
+        # Pages also depend on today's date (current month, footer year);
+        # ledgers have their own version counters, so the ledger is in the tag
+        etag = hashlib.sha1(
+            f'{current_ledger().name}:{version}:{request.full_path}:{today}'.encode()
+        ).hexdigest()[:20]
+        # For the same reason a page is never older than today's (local)
+        # midnight: an If-Modified-Since from yesterday gets a fresh page
+        last_modified = datetime.combine(today, datetime.min.time()).astimezone(timezone.utc)
+        if updated_at:
+            last_modified = max(last_modified, updated_at.replace(tzinfo=timezone.utc))
+        last_modified = last_modified.replace(microsecond=0)
+        
+        if request.if_none_match:
+            # Weak comparison: compressed responses carry W/"..." tags
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            since = request.if_modified_since
+            not_modified = bool(since and last_modified <= since)
+        
+        if not_modified:
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+def cached(kind, *key, compute):
+    return current_ledger().result_cache.obter((kind, *key), data_version(), compute)
+
+# CLI commands take --ledger NAME (see Ledger below)
+def ledger_option(command):
+    """Add --ledger NAME to a CLI command, which then runs against that ledger."""
+    @click.option('--ledger', 'ledger_name', metavar='NAME',
+                  help='Use the named ledger instead of the default database.')
+    @wraps(command)
+    def wrapper(*args, ledger_name=None, **kwargs):
+        try:
+            if kwargs.get('dados') and ledger_name:
+                from dados import GerenciadorTransacoes
+                with GerenciadorTransacoes.livro(ledger_name) as manager:
+                    g.dados_manager = manager
+                    return command(*args, **kwargs)
+            with use_ledger(ledger_name):
+                return command(*args, **kwargs)
+        except (livros.LivroInvalido, livros.LivroInexistente) as e:
+            raise click.BadParameter(str(e), param_hint='--ledger')
+    return wrapper
+
+def dados_manager():
+    """The GerenciadorTransacoes for a CLI command (see ledger_option)."""
+    from dados import GerenciadorTransacoes
+    return g.get('dados_manager') or GerenciadorTransacoes()
+
+# Monthly summary maintenance
+def _upsert_summary(year, month, type, category, total, count):
+    stmt = sqlite_insert(MonthlySummary).values(
+        year=year, month=month, type=type, category=category,
+        total=total, count=count
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['year', 'month', 'type', 'category'],
+        set_={
+            'total': MonthlySummary.total + stmt.excluded.total,
+            'count': MonthlySummary.count + stmt.excluded.count
+        }
+    ))
+
+def apply_to_summary(transaction, sign):
+    """Add (sign=1) or remove (sign=-1) one active transaction from the
+    monthly summary and the daily balance.
+
+    Runs inside the caller's session, so it commits together with the write.
+    """
+    _upsert_summary(transaction.date.year, transaction.date.month,
+                    transaction.type, transaction.category,
+                    sign * transaction.amount, sign)
+    apply_to_balance({transaction.date.isoformat():
+                      (saldo.assinado(transaction.type, transaction.amount), 1)}, sign)
+
+def _summary_groups(*criteria, trashed=False):
+    year = extract('year', Transaction.date)
+    month = extract('month', Transaction.date)
+    state = Transaction.deleted_at.isnot(None) if trashed else Transaction.deleted_at.is_(None)
+    return db.session.execute(
+        db.select(year, month, Transaction.type, Transaction.category,
+                  func.sum(Transaction.amount), func.count())
+        .where(state, *criteria)
+        .group_by(year, month, Transaction.type, Transaction.category)
+    ).all()
+
+def apply_query_to_summary(sign, *criteria):
+    """Same as apply_to_summary for every active row matching ``criteria``.
+
+    Must be called before the rows are deleted (sign=-1) or after they are
+    restored (sign=1), since only active rows are aggregated.
+    """
+    for year, month, type_, category, total, count in _summary_groups(*criteria):
+        _upsert_summary(int(year), int(month), type_, category, sign * total, sign * count)
+    apply_to_balance(_balance_groups(*criteria), sign)
+
+def apply_groups_to_summary(groups, sign=1):
+    """Apply pre-aggregated {(year, month, type, category): (total, count)}."""
+    for (year, month, type_, category), (total, count) in groups.items():
+        _upsert_summary(year, month, type_, category, sign * total, sign * count)
+
+def summary_total(type_, year=None, month=None):
+    query = db.select(func.sum(MonthlySummary.total)).where(MonthlySummary.type == type_)
+    if year:
+        query = query.where(MonthlySummary.year == year)
+    if month:
+        query = query.where(MonthlySummary.month == month)
+    return db.session.scalar(query) or 0
+
+def summary_years():
+    return db.session.scalars(
+        db.select(MonthlySummary.year).distinct()
+        .where(MonthlySummary.count > 0)
+        .order_by(MonthlySummary.year.desc())
+    ).all()
+
+def summary_drift():
+    """Compare the summary table against the transactions it aggregates."""
+    expected = {
+        (int(y), int(m), t, c): (total, count)
+        for y, m, t, c, total, count in _summary_groups()
+    }
+    stored = {
+        (s.year, s.month, s.type, s.category): (s.total, s.count)
+        for s in db.session.scalars(db.select(MonthlySummary)).all()
+        if s.count
+    }
+    drift = []
+    for key in sorted(expected.keys() | stored.keys()):
+        exp_total, exp_count = expected.get(key, (0, 0))
+        got_total, got_count = stored.get(key, (0, 0))
+        if (exp_total, exp_count) != (got_total, got_count):
+            drift.append((key, (exp_total, exp_count), (got_total, got_count)))
+    return drift
+
+def rebuild_summary():
+    db.session.execute(db.delete(MonthlySummary))
+    for year, month, type_, category, total, count in _summary_groups():
+        db.session.add(MonthlySummary(year=int(year), month=int(month), type=type_,
+                                      category=category, total=total, count=count))
+    bump_data_version()
+    db.session.commit()
+
+@app.cli.command('rebuild-summary')
+@click.option('--verify', is_flag=True, help='Only report drift, do not rebuild.')
+@click.option('--dados', is_flag=True, help='Use the GerenciadorTransacoes database.')
+@ledger_option
+def rebuild_summary_command(verify, dados):
+    """Rebuild (or verify) the monthly summary table."""
+    if dados:
+        drift = dados_manager().reconstruir_resumo(verificar=True)
+    else:
+        drift = summary_drift()
+    for (year, month, type_, category), expected, stored in drift:
+        click.echo(f'{year}-{month:02d} {type_} {category}: '
+                   f'esperado {dinheiro.formatar(expected[0])} ({expected[1]}), '
+                   f'encontrado {dinheiro.formatar(stored[0])} ({stored[1]})')
+    if verify:
+        click.echo(f'{len(drift)} divergências encontradas.')
+        if drift:
+            raise SystemExit(1)
+        return
+    if dados:
+        dados_manager().reconstruir_resumo()
+    else:
+        rebuild_summary()
+    click.echo('Resumo mensal reconstruído.')
+
+# Daily running balance maintenance: a write adds to its day's net and
+# re-accumulates the balance from that day on (one row for today's entries)
+def _balance_groups(*criteria, trashed=False):
+    """{iso date: (net, count)} of the active (or trashed) rows matching ``criteria``."""
+    day = type_coerce(Transaction.date, db.String)
+    signed = case((Transaction.type == 'income', Transaction.amount),
+                  else_=-Transaction.amount)
+    state = Transaction.deleted_at.isnot(None) if trashed else Transaction.deleted_at.is_(None)
+    rows = db.session.execute(
+        db.select(day, func.sum(signed), func.count())
+        .where(state, *criteria)
+        .group_by(Transaction.date)
+    ).all()
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+def apply_to_balance(days, sign=1):
+    """Add (sign=1) or remove (sign=-1) {iso date: (net, count)} from the daily balance."""
+    if not days:
+        return
+    params = saldo.parametros(days, sign)
+    db.session.execute(text(saldo.SOMAR_DIA), params)
+    db.session.execute(text(saldo.REMOVER_VAZIO), [{'date': p['date']} for p in params])
+    db.session.execute(text(saldo.ACUMULAR), {'desde': min(days)})
+
+def balance_at_query(day):
+    return (db.select(DailyBalance.balance)
+            .where(DailyBalance.date <= day)
+            .order_by(DailyBalance.date.desc())
+            .limit(1))
+
+def balance_at(day):
+    """Account balance at the end of ``day`` (an index lookup, not a sum)."""
+    return db.session.scalar(balance_at_query(day)) or 0
+
+def balance_series(start, end):
+    """[(iso date, balance)] for the days in [start, end] with transactions,
+    starting with the balance carried into ``start``."""
+    rows = db.session.execute(
+        db.select(type_coerce(DailyBalance.date, db.String), DailyBalance.balance)
+        .where(DailyBalance.date >= start, DailyBalance.date <= end)
+        .order_by(DailyBalance.date)
+    ).all()
+    points = [tuple(row) for row in rows]
+    if not points or points[0][0] != start.isoformat():
+        points.insert(0, (start.isoformat(), balance_at(start)))
+    return points
+
+def month_end_balances(start, end):
+    """Balance at the end of each month index (year * 12 + month - 1) in
+    [start, end), from a single range read of daily_balance."""
+    first = date(start // 12, start % 12 + 1, 1)
+    last = date(end // 12, end % 12 + 1, 1) - timedelta(days=1)
+    balances, current = [], 0
+    points = iter(balance_series(first, last))
+    point = next(points, None)
+    for i in range(start, end):
+        month = f'{i // 12:04d}-{i % 12 + 1:02d}'
+        while point and point[0][:7] <= month:
+            current = point[1]
+            point = next(points, None)
+        balances.append(current)
+    return balances
+
+def balance_drift():
+    """Compare the daily balance table against the transactions it aggregates."""
+    return saldo.divergencias(
+        db.session.execute(text(saldo.ESPERADO)).all(),
+        db.session.execute(
+            db.select(type_coerce(DailyBalance.date, db.String), DailyBalance.net,
+                      DailyBalance.count, DailyBalance.balance)
+        ).all()
+    )
+
+def rebuild_balance():
+    for statement in saldo.RECONSTRUIR:
+        db.session.execute(text(statement))
+    bump_data_version()
+    db.session.commit()
+
+@app.cli.command('rebuild-balance')
+@click.option('--verify', is_flag=True, help='Only report drift, do not rebuild.')
+@click.option('--dados', is_flag=True, help='Use the GerenciadorTransacoes database.')
+@ledger_option
+def rebuild_balance_command(verify, dados):
+    """Rebuild (or verify) the daily running balance table."""
+    if dados:
+        drift = dados_manager().reconstruir_saldo(verificar=True)
+    else:
+        drift = balance_drift()
+    for day, expected, stored in drift:
+        click.echo(f'{day}: esperado {dinheiro.formatar(expected[0])} ({expected[1]}) '
+                   f'saldo {dinheiro.formatar(expected[2] or 0)}, '
+                   f'encontrado {dinheiro.formatar(stored[0])} ({stored[1]}) '
+                   f'saldo {dinheiro.formatar(stored[2] or 0)}')
+    if verify:
+        click.echo(f'{len(drift)} divergências encontradas.')
+        if drift:
+            raise SystemExit(1)
+        return
+    if dados:
+        dados_manager().reconstruir_saldo()
+    else:
+        rebuild_balance()
+    click.echo('Saldo diário reconstruído.')
+
+# Budgets: each category's month-to-date spend is its MonthlySummary expense
+# row, which every write path already keeps current, so checking all budgets
+# is one primary-key lookup per budgeted category
+def budget_status(year, month):
+    """Limit, spend and state of every budget for the month, in cents."""
+    return cached('budgets', year, month, compute=lambda: orcamento.situacoes(
+        db.session.execute(text(orcamento.SITUACAO), {'year': year, 'month': month}).all()))
+
+def budget_drift():
+    """Compare the budgeted categories' spend counters against the transactions."""
+    return orcamento.divergencias(db.session.execute(text(orcamento.ESPERADO)).all(),
+                                  db.session.execute(text(orcamento.GRAVADO)).all())
+
+def rebuild_budget_counters():
+    for statement in orcamento.RECONSTRUIR:
+        db.session.execute(text(statement))
+    bump_data_version()
+    db.session.commit()
+
+@app.cli.command('rebuild-budgets')
+@click.option('--verify', is_flag=True, help='Only report drift, do not rebuild.')
+@click.option('--dados', is_flag=True, help='Use the GerenciadorTransacoes database.')
+@ledger_option
+def rebuild_budgets_command(verify, dados):
+    """Recompute (or verify) the monthly spend counters of the budgeted categories."""
+    if dados:
+        drift = dados_manager().reconstruir_orcamentos(verificar=True)
+    else:
+        drift = budget_drift()
+    for (year, month, category), expected, stored in drift:
+        click.echo(f'{year}-{month:02d} {category}: '
+                   f'esperado {dinheiro.formatar(expected[0])} ({expected[1]}), '
+                   f'encontrado {dinheiro.formatar(stored[0])} ({stored[1]})')
+    if verify:
+        click.echo(f'{len(drift)} divergências encontradas.')
+        if drift:
+            raise SystemExit(1)
+        return
+    if dados:
+        dados_manager().reconstruir_orcamentos()
+    else:
+        rebuild_budget_counters()
+    click.echo('Gastos dos orçamentos recalculados.')
+
+# Shared list queries
+def period_criteria(year=None, month=None):
+    """Index-friendly filters for a year/month period (half-open date range)."""
+    bounds = intervalo_periodo(year, month)
+    if bounds:
+        start, end = bounds
+        return [Transaction.date >= start, Transaction.date < end]
+    if month:
+        return [extract('month', Transaction.date) == month]
+    return []
+
+# List pages read plain rows with just the columns they render, never ORM
+# objects. Dates stay ISO strings (no per-row parsing); templates format
+# them with the cached |br_date and |br_datetime filters.
+LIST_COLUMNS = (
+    Transaction.id, Transaction.description, Transaction.amount,
+    Transaction.category, Transaction.type,
+    type_coerce(Transaction.date, db.String).label('date'),
+    type_coerce(Transaction.deleted_at, db.String).label('deleted_at'),
+)
+
+def recent_query(limit=5):
+    return (db.select(*LIST_COLUMNS)
+            .where(Transaction.deleted_at.is_(None))
+            .order_by(Transaction.date.desc())
+            .limit(limit))
+
+def extrato_query(year=None, month=None, type_=None):
+    query = db.select(*LIST_COLUMNS).where(Transaction.deleted_at.is_(None))
+    if type_:
+        query = query.where(Transaction.type == type_)
+    return (query.where(*period_criteria(year, month))
+            .order_by(Transaction.date.desc(), Transaction.id.desc()))
+
+def make_cursor(row):
+    return f'{row.date}_{row.id}'
+
+def parse_cursor(value):
     try:
-        db.create_all()
-    except Exception as e:
+        day, id_ = value.split('_')
+        return date.fromisoformat(day), int(id_)
+    except (AttributeError, ValueError):
+        return None
+
+def extrato_page(query, after=None, before=None, size=None):
+    """Keyset page of an extrato query ordered by (date, id) descending.
+
+    ``after``/``before`` are parsed cursors; only one of them is used.
+    Returns (transactions, next_cursor, prev_cursor).
+    """
+    size = size or app.config['EXTRATO_PAGE_SIZE']
+    key = tuple_(Transaction.date, Transaction.id)
+    if before:
+        rows = db.session.execute(
+            query.where(key > before)
+            .order_by(None).order_by(Transaction.date, Transaction.id)
+            .limit(size + 1)
+        ).all()
+        has_more = len(rows) > size
+        rows = rows[:size][::-1]
+        next_cursor = make_cursor(rows[-1]) if rows else None
+        prev_cursor = make_cursor(rows[0]) if has_more else None
+    else:
+        if after:
+            query = query.where(key < after)
+        rows = db.session.execute(query.limit(size + 1)).all()
+        has_more = len(rows) > size
+        rows = rows[:size]
+        next_cursor = make_cursor(rows[-1]) if has_more else None
+        prev_cursor = make_cursor(rows[0]) if after and rows else None
+    return rows, next_cursor, prev_cursor
+
+def trash_query():
+    return (db.select(*LIST_COLUMNS)
+            .where(Transaction.deleted_at.isnot(None))
+            .order_by(Transaction.deleted_at.desc()))
+
+def explain(query):
+    compiled = query.compile(db.engine)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.session.connection().exec_driver_sql(
+        f'EXPLAIN QUERY PLAN {compiled}', params
+    ).all()
+    return [row[-1] for row in rows]
+
+def query_plans():
+    today = date.today()
+    return {
+        'index': explain(recent_query()),
+        'extrato (mês)': explain(extrato_query(today.year, today.month)),
+        'extrato (ano)': explain(extrato_query(today.year)),
+        'extrato (tipo)': explain(extrato_query(today.year, today.month, 'income')),
+        'extrato (página)': explain(
+            extrato_query().where(tuple_(Transaction.date, Transaction.id) < (today, 0))
+            .limit(app.config['EXTRATO_PAGE_SIZE'] + 1)
+        ),
+        'lixeira': explain(trash_query()),
+        'expurgo': explain(purge_batch_query(datetime.now(), limpeza.TAMANHO_LOTE)),
+        'saldo (data)': explain(balance_at_query(today)),
+    }
+
+@app.cli.command('check-query-plans')
+@click.option('--dados', is_flag=True, help='Use the GerenciadorTransacoes database.')
+@ledger_option
+def check_query_plans_command(dados):
+    """Fail if a list query falls back to a full table scan."""
+    if dados:
+        plans = dados_manager().planos_de_consulta()
+    else:
+        plans = query_plans()
+    failures = 0
+    for name, details in plans.items():
+        ok = plano_usa_indice(details)
+        failures += not ok
+        click.echo(f"{'ok' if ok else 'SCAN'}  {name}: {' | '.join(details)}")
+    if failures:
+        raise SystemExit(1)
+
+# Trash purge, in short batches so other writers get the lock in between
+def trash_criteria(cutoff=None):
+    criteria = [Transaction.deleted_at.isnot(None)]
+    if cutoff:
+        criteria.append(Transaction.deleted_at < cutoff)
+    return criteria
+
+def purge_batch_query(cutoff, size):
+    return (db.select(Transaction.id)
+            .where(*trash_criteria(cutoff))
+            .order_by(Transaction.deleted_at)
+            .limit(size))
+
+def purge_trash_batch(ledger, cutoff, size):
+    """Permanently delete up to `size` trashed rows in one transaction."""
+    # Runs in the purge thread, which has no app context of its own
+    with ledger_context(ledger):
+        # Trashed rows are already out of the monthly summary
+        deleted = db.session.execute(
+            db.delete(Transaction)
+            .where(Transaction.id.in_(purge_batch_query(cutoff, size)))
+        ).rowcount
+        if deleted:
+            bump_data_version()
+        db.session.commit()
+        return deleted
+
+def count_trash(ledger, cutoff):
+    with ledger_context(ledger):
+        return db.session.scalar(
+            db.select(func.count()).select_from(Transaction).where(*trash_criteria(cutoff))
+        )
+
+@app.cli.command('purge-trash')
+@click.option('--older-than', type=int, help='Only rows trashed more than DAYS days ago.')
+@click.option('--dados', is_flag=True, help='Use the GerenciadorTransacoes database.')
+@ledger_option
+def purge_trash_command(older_than, dados):
+    """Permanently delete trashed transactions in short batches."""
+    if dados:
+        task = dados_manager().expurgo
+    else:
+        task = current_ledger().trash_purge
+    cutoff = limpeza.corte_retencao(older_than) if older_than is not None else None
+    if not task.iniciar(cutoff):
+        raise click.ClickException('Já existe um expurgo da lixeira em andamento.')
+    while True:
+        time.sleep(0.2)
+        progress = task.progresso
+        click.echo(f"\r{progress['removidas']}/{progress['total'] or '?'} transações excluídas",
+                   nl=False)
+        if not progress['rodando']:
+            break
+    click.echo()
+    if progress['erro']:
+        raise click.ClickException(progress['erro'])
+
+# Bulk statement import
+def existing_import_keys(start, end):
+    columns = (Transaction.date, Transaction.description, Transaction.amount, Transaction.type)
+    in_range = (Transaction.date >= start, Transaction.date <= end)
+    rows = db.session.execute(
+        db.select(*columns).where(Transaction.deleted_at.is_(None), *in_range)
+    ).all()
+    # Trashed rows also count, so a re-import does not resurrect them
+    rows += db.session.execute(
+        db.select(*columns).where(Transaction.deleted_at.isnot(None), *in_range)
+    ).all()
+    return Counter(importacao.chave(*row) for row in rows)
+
+def insert_import_batch(rows):
+    db.session.execute(db.insert(Transaction), rows)
+    apply_groups_to_summary(importacao.agrupar_por_mes(rows))
+    apply_to_balance(saldo.agrupar_por_dia(rows))
+    bump_data_version()
+    db.session.commit()
+
+def import_statement(stream, formato):
+    try:
+        return importacao.importar_extrato(stream, formato,
+                                           existing_import_keys, insert_import_batch)
+    except Exception:
+        db.session.rollback()
+        raise
+
+@app.cli.command('import-statement')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'formato', type=click.Choice(sorted(importacao.LEITORES)),
+              help='Defaults to the file extension.')
+@click.option('--encoding', default='utf-8-sig', show_default=True)
+@click.option('--dados', is_flag=True, help='Use the GerenciadorTransacoes database.')
+@ledger_option
+def import_statement_command(path, formato, encoding, dados):
+    """Bulk import a CSV or OFX bank statement."""
+    formato = formato or importacao.detectar_formato(path)
+    with open(path, encoding=encoding, errors='replace', newline='') as f:
+        if dados:
+            result = dados_manager().importar_extrato(f, formato)
+        else:
+            result = import_statement(f, formato)
+    for line, error in result.erros:
+        click.echo(f'linha {line}: {error}')
+    click.echo(str(result))
+
+# Full-text search (FTS5 index kept in sync by triggers, see busca.ddl_fts)
+transaction_fts = table('transaction_fts', column('rowid'), column('rank'))
+
+def search_query(terms, year=None, month=None, trash=False, limit=None):
+    """Best-ranked matches for ``terms`` (prefix search), or None if empty."""
+    match = busca.expressao_fts(terms)
+    if not match:
+        return None
+    return (db.select(*LIST_COLUMNS)
+            .join(transaction_fts, transaction_fts.c.rowid == Transaction.id)
+            .where(text('transaction_fts MATCH :match').bindparams(match=match))
+            .where(Transaction.deleted_at.isnot(None) if trash
+                   else Transaction.deleted_at.is_(None))
+            .where(*period_criteria(year, month))
+            .order_by(transaction_fts.c.rank)
+            .limit(limit or app.config['SEARCH_LIMIT']))
+
+# Vectorized reports over in-memory ledger columns
+def _ledger_rows(after_id):
+    return db.session.execute(
+        db.select(Transaction.id, Transaction.date, Transaction.amount, Transaction.category,
+                  Transaction.type, Transaction.deleted_at.isnot(None))
+        .where(Transaction.id > after_id)
+        .order_by(Transaction.id)
+    )
+
+def _trash_ids():
+    return db.session.scalars(
+        db.select(Transaction.id).where(Transaction.deleted_at.isnot(None))
+    ).all()
+
+def _existing_ids(ids):
+    found = []
+    for i in range(0, len(ids), 500):
+        found += db.session.scalars(
+            db.select(Transaction.id).where(Transaction.id.in_(ids[i:i + 500]))
+        ).all()
+    return found
+
+def _active_count():
+    return db.session.scalar(db.select(func.sum(MonthlySummary.count))) or 0
+
+# Ledgers: the default one is DB_PATH on the Flask-SQLAlchemy engine; named
+# ones (LEDGERS_DIR/<name>.db, created by `flask migrate --ledger NAME`) get
+# their own engine, so writes to different ledgers take different SQLite
+# write locks and run in parallel. A request picks its ledger with the
+# X-Ledger header or, in the browser, at /livro/<name>.
+class Ledger:
+    """A ledger database and the state each process keeps for it."""
+
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.result_cache = CacheVersionado(app.config['RESULT_CACHE_SIZE'])
+        self.columns = relatorios.LivroVetorizado(_ledger_rows, _trash_ids,
+                                                  _existing_ids, _active_count)
+        self.trash_purge = limpeza.TarefaExpurgo(
+            lambda cutoff, size: purge_trash_batch(self, cutoff, size),
+            lambda cutoff: count_trash(self, cutoff))
+        self.write_queue = (fila_escrita.FilaEscrita(lambda items: write_batch(self, items))
+                            if fila_escrita.ATIVA else None)
+        self.schema_ready = False
+        self.schema_lock = threading.Lock()
+
+    def close(self):
+        if self.write_queue:
+            self.write_queue.fechar()
+        self.engine.dispose()
+
+def open_ledger(name):
+    path = livros.existente(LEDGERS_DIR, name)
+    engine = create_engine(f'sqlite:///{path}', **app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    setup_engine(engine)
+    return Ledger(name, engine)
+
+with app.app_context():
+    default_ledger = Ledger(None, db.engine)
+
+# At most LEDGER_MAX_OPEN named ledgers open per process; idle ones are
+# closed after LEDGER_IDLE_SECONDS, never while a request or purge uses them
+ledgers = livros.AbertosLRU(open_ledger, Ledger.close,
+                            ocupado=lambda ledger: ledger.trash_purge.progresso['rodando'])
+
+def current_ledger():
+    return g.get('ledger', default_ledger) if has_app_context() else default_ledger
+
+@contextmanager
+def ledger_context(ledger):
+    """App context bound to ``ledger``, for the writer and purge threads."""
+    with app.app_context():
+        g.ledger = ledger
+        yield
+
+@contextmanager
+def use_ledger(name):
+    """Bind the current app context to ledger ``name`` (None: the default one)."""
+    if not name:
+        yield default_ledger
+        return
+    with ledgers.usar(name) as ledger:
+        g.ledger = ledger
         try:
-            conn = sqlite3.connect(DB_PATH)
-            conn.close()
-            db.create_all()
-        except Exception as e:
-            raise
+            yield ledger
+        finally:
+            # Hand the connection back before the ledger may be closed
+            db.session.remove()
+            g.pop('ledger')
+
+# Endpoints that work whatever ledger the session points to
+LEDGER_FREE_ENDPOINTS = {'switch_ledger', 'static', 'asset', 'metrics_endpoint'}
+
+@app.before_request
+def select_ledger():
+    if request.endpoint in LEDGER_FREE_ENDPOINTS:
+        return
+    name = request.headers.get('X-Ledger') or session.get('ledger')
+    if not name:
+        return
+    try:
+        g.ledger = ledgers.reservar(name)
+    except (livros.LivroInvalido, livros.LivroInexistente):
+        if 'X-Ledger' not in request.headers:
+            session.pop('ledger', None)
+        abort(404, description=f'Livro não encontrado: {name}')
+    g.ledger_lease = name
+
+@app.teardown_appcontext
+def release_ledger(error):
+    # Runs before Flask-SQLAlchemy's own teardown (registered earlier)
+    name = g.pop('ledger_lease', None)
+    if name:
+        db.session.remove()
+        ledgers.liberar(name)
+
+# Schema changes run in `flask migrate` (see migracoes.py), never on import:
+# a worker only checks the schema version of each ledger it opens, once
+@app.before_request
+def require_current_schema():
+    ledger = current_ledger()
+    if ledger.schema_ready:
+        return
+    with ledger.schema_lock:
+        if ledger.schema_ready:
+            return
+        with ledger.engine.connect() as connection:
+            try:
+                migracoes.verificar(connection.connection.driver_connection)
+            except migracoes.EsquemaDesatualizado as e:
+                app.logger.error(str(e))
+                abort(503, description=str(e))
+        # Auto-purge rows past the trash retention period (TRASH_RETENTION_DAYS):
+        # on a timer for the default ledger, whenever a named one is opened
+        if limpeza.RETENCAO_DIAS:
+            if ledger is default_ledger:
+                ledger.trash_purge.agendar()
+            else:
+                ledger.trash_purge.iniciar(limpeza.corte_retencao(limpeza.RETENCAO_DIAS))
+        ledger.schema_ready = True
+
+def print_migration_status(path):
+    connection = conexao.conectar(path)
+    try:
+        pending = migracoes.pendentes(connection)
+        click.echo(f'Versão do esquema: {migracoes.versao(connection)} '
+                   f'(atual: {migracoes.VERSAO_ATUAL})')
+    finally:
+        connection.close()
+    for migration in pending:
+        click.echo(f'pendente  {migration.versao:03d} {migration.descricao}')
+
+@app.cli.command('migrate')
+@click.option('--status', is_flag=True, help='Only list pending migrations.')
+@click.option('--dados', is_flag=True, help='Use the GerenciadorTransacoes database.')
+@click.option('--ledger', 'ledger_names', metavar='NAME', multiple=True,
+              help='Migrate the named ledger, creating it if needed (repeatable).')
+@click.option('--all-ledgers', is_flag=True, help='Migrate every existing named ledger.')
+def migrate_command(status, dados, ledger_names, all_ledgers):
+    """Apply pending schema migrations."""
+    if dados:
+        import dados as dados_module
+        folder, path = dados_module.PASTA_LIVROS, dados_module.CAMINHO_BANCO
+    else:
+        folder, path = LEDGERS_DIR, DB_PATH
+    names = livros.listar(folder) if all_ledgers else list(ledger_names)
+    try:
+        targets = [(name, livros.caminho(folder, name)) for name in names] or [(None, path)]
+    except livros.LivroInvalido as e:
+        raise click.BadParameter(str(e), param_hint='--ledger')
+    for name, path in targets:
+        if name:
+            click.echo(f'Livro {name}:')
+        if status:
+            print_migration_status(path)
+            continue
+        if name:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        applied = migracoes.migrar(path, lambda migration, seconds: click.echo(
+            f'{migration.versao:03d} {migration.descricao} ({seconds:.2f}s)'))
+        if dados:
+            # Catch up with the backup change log (or the legacy JSON backup)
+            if name:
+                with dados_module.GerenciadorTransacoes.livro(name) as manager:
+                    manager.carregar_backup()
+            else:
+                dados_module.GerenciadorTransacoes().carregar_backup()
+        click.echo(f'{len(applied)} migrações aplicadas; esquema na versão {migracoes.VERSAO_ATUAL}.')
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress the files in static/ (run on every deploy)."""
+    for name, hashed, size, compressed in estaticos.construir(STATIC_DIR):
+        sizes = ''.join(f', {encoding} {n} B' for encoding, n in compressed.items())
+        click.echo(f'{name} -> {hashed} ({size} B{sizes})')
+    asset_manifest.clear()
+    asset_manifest.update(estaticos.carregar_manifesto(STATIC_DIR))
 
 # Context processor
 @app.context_processor
 def inject_now():
     return {
         'now': datetime.now(),
-        'current_year': date.today().year
+        'current_year': date.today().year,
+        'ledger_name': current_ledger().name
     }
 
-# Format transactions
-def format_transactions(transactions):
-    formatted = []
-    for t in transactions:
-        try:
-            if isinstance(t.date, str):
-                transaction_date = datetime.strptime(t.date, '%Y-%m-%d').date()
-            elif isinstance(t.date, date):
-                transaction_date = t.date
-            else:
-                transaction_date = t.date.date() if hasattr(t.date, 'date') else date.today()
-            
-            if t.deleted_at:
-                if isinstance(t.deleted_at, str):
-                    deleted_at_fmt = datetime.fromisoformat(t.deleted_at).strftime('%d/%m/%Y %H:%M')
-                elif isinstance(t.deleted_at, datetime):
-                    deleted_at_fmt = t.deleted_at.strftime('%d/%m/%Y %H:%M')
-                else:
-                    deleted_at_fmt = None
-            else:
-                deleted_at_fmt = None
-            
-            formatted.append({
-                'id': t.id,
-                'description': t.description,
-                'amount': float(t.amount),
-                'category': t.category,
-                'type': t.type,
-                'date': transaction_date.strftime('%d/%m/%Y'),
-                'original_date': transaction_date,
-                'deleted_at': deleted_at_fmt
-            })
-        except Exception as e:
-            print(f"Erro ao formatar transação {t.id}: {str(e)}")
-            continue
-            
-    return formatted
+# Date filters; the same few thousand dates repeat across every list page
+@app.template_filter('br_date')
+@lru_cache(maxsize=8192)
+def format_date(value):
+    """'2024-01-31' (or a date) -> '31/01/2024'."""
+    if not value:
+        return ''
+    if not isinstance(value, str):
+        value = value.isoformat()
+    return f'{value[8:10]}/{value[5:7]}/{value[:4]}'
+
+@app.template_filter('br_datetime')
+@lru_cache(maxsize=8192)
+def format_datetime(value):
+    """'2024-01-31 14:05:09.123' (or a datetime) -> '31/01/2024 14:05'."""
+    if not value:
+        return ''
+    if not isinstance(value, str):
+        value = value.isoformat(' ')
+    return f'{format_date(value)} {value[11:16]}'
+
+@app.template_global()
+def asset_url(filename):
+    """URL of a static file; its fingerprinted copy once `flask build-assets` ran."""
+    hashed = asset_manifest.get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('asset', filename=hashed)
+
+@app.template_filter('reais')
+def format_reais(cents):
+    """Integer cents -> '1234.56' (averages may be fractional cents)."""
+    return dinheiro.formatar(cents)
 
 @app.route('/')
+@conditional
 def index():
     today = date.today()
     current_month = today.month
     current_year = today.year
     
-    incomes = db.session.scalar(
-        db.select(func.sum(Transaction.amount))
-        .where(Transaction.type == 'income')
-        .where(Transaction.deleted_at.is_(None))
-        .where(extract('month', Transaction.date) == current_month)
-        .where(extract('year', Transaction.date) == current_year)
-    ) or 0
+    def compute():
+        return (summary_total('income', current_year, current_month),
+                summary_total('expense', current_year, current_month),
+                db.session.execute(recent_query()).all(),
+                balance_at(today))
     
-    expenses = db.session.scalar(
-        db.select(func.sum(Transaction.amount))
-        .where(Transaction.type == 'expense')
-        .where(Transaction.deleted_at.is_(None))
-        .where(extract('month', Transaction.date) == current_month)
-        .where(extract('year', Transaction.date) == current_year)
-    ) or 0
+    incomes, expenses, transactions, account_balance = cached(
+        'dashboard', current_year, current_month, today, compute=compute)
     
     balance = incomes - expenses
     
-    transactions = db.session.scalars(
-        db.select(Transaction)
-        .where(Transaction.deleted_at.is_(None))
-        .order_by(Transaction.date.desc())
-        .limit(5)
-    ).all()
-    
     return render_template('index.html', 
                          balance=balance, 
                          incomes=incomes, 
                          expenses=expenses, 
-                         transactions=format_transactions(transactions))
+                         account_balance=account_balance,
+                         transactions=transactions,
+                         budgets=budget_status(current_year, current_month))
+
+# Optional group commit (WRITE_QUEUE=1): a single writer thread applies the
+# queued inserts and soft deletes together, one transaction per batch
+def soft_delete(transaction):
+    # Already in the trash: keep the original date, so the purge isn't pushed back
+    if transaction.deleted_at is None:
+        apply_to_summary(transaction, -1)
+        transaction.deleted_at = datetime.now()
+
+def queued_add(fields):
+    # Built here, not in the request: a failed batch is retried item by item
+    transaction = Transaction(**fields)
+    db.session.add(transaction)
+    apply_to_summary(transaction, 1)
+    return transaction
+
+def queued_delete(id):
+    transaction = db.session.get(Transaction, id)
+    if transaction is None:
+        raise LookupError(f'Transaction {id} not found')
+    soft_delete(transaction)
+    return id
+
+QUEUED_WRITES = {'add': queued_add, 'delete': queued_delete}
+
+def write_batch(ledger, items):
+    """Apply a batch of (kind, payload) writes to ``ledger`` with a single commit."""
+    # Runs in the writer thread, which has no app context of its own
+    with ledger_context(ledger):
+        try:
+            results = [QUEUED_WRITES[kind](payload) for kind, payload in items]
+            db.session.flush()
+            results = [r.id if isinstance(r, Transaction) else r for r in results]
+            bump_data_version()
+            db.session.commit()
+            return results
+        except Exception:
+            db.session.rollback()
+            raise
 
 @app.route('/add', methods=['GET', 'POST'])
 def add_transaction():
     if request.method == 'POST':
         try:
-            transaction = Transaction(
+            fields = dict(
                 description=request.form['description'],
                 amount=request.form['amount'],
                 category=request.form['category'],
                 type=request.form['type'],
                 date=request.form['transaction_date']
             )
+            # Validates every field (see models.validar_campos)
+            transaction = Transaction(**fields)
+            write_queue = current_ledger().write_queue
             
-            if not transaction.description or transaction.amount <= 0:
-                flash('Descrição e valor positivo são obrigatórios!', 'error')
+            if write_queue:
+                write_queue.gravar(('add', fields))
             else:
                 db.session.add(transaction)
+                apply_to_summary(transaction, 1)
+                bump_data_version()
                 db.session.commit()
-                flash('Transação adicionada com sucesso!', 'success')
-                return redirect(url_for('index'))
+            flash('Transação adicionada com sucesso!', 'success')
+            return redirect(url_for('index'))
         except ValueError as e:
             flash(f'Dados inválidos: {str(e)}', 'error')
         except Exception as e:
             db.session.rollback()
             flash('Erro ao adicionar transação!', 'error')
             print(f"Error adding transaction: {e}")
+        return redirect(url_for('add_transaction'))
     
     return render_template('add_transaction.html', 
                          default_date=date.today().strftime('%Y-%m-%d'))
 
+@app.route('/importar', methods=['GET', 'POST'])
+def import_transactions():
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('arquivo')
+        if not upload or not upload.filename:
+            flash('Selecione um arquivo CSV ou OFX.', 'error')
+        else:
+            formato = request.form.get('formato') or importacao.detectar_formato(upload.filename)
+            try:
+                stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig',
+                                          errors='replace', newline='')
+                result = import_statement(stream, formato)
+                flash(f'Importação concluída: {result}', 'success')
+            except (ValueError, KeyError) as e:
+                flash(f'Arquivo inválido: {str(e)}', 'error')
+            except Exception as e:
+                flash('Erro ao importar extrato!', 'error')
+                print(f"Error importing statement: {e}")
+    
+    return render_template('import.html', result=result)
+
 @app.route('/delete/<int:id>')
 def delete_transaction(id):
+    write_queue = current_ledger().write_queue
     try:
-        transaction = db.get_or_404(Transaction, id)
-        transaction.deleted_at = datetime.now()
-        db.session.commit()
+        if write_queue:
+            write_queue.gravar(('delete', id))
+        else:
+            soft_delete(db.get_or_404(Transaction, id))
+            bump_data_version()
+            db.session.commit()
         flash('Transação movida para a lixeira!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -190,76 +1268,216 @@ def delete_transaction(id):
     
     return redirect(request.referrer or url_for('index'))
 
+def extrato_filters():
+    month = request.args.get('month', type=int)
+    year = request.args.get('year', type=int)
+    type_ = request.args.get('type')
+    if type_ not in ('income', 'expense'):
+        type_ = None
+    return year, month, type_
+
 @app.route('/extrato')
+@conditional
 def extrato():
     try:
-        month = request.args.get('month', type=int)
-        year = request.args.get('year', type=int)
-        
-        query = db.select(Transaction).where(Transaction.deleted_at.is_(None))
+        year, month, type_ = extrato_filters()
         
-        if year:
-            query = query.where(extract('year', Transaction.date) == year)
-        if month:
-            query = query.where(extract('month', Transaction.date) == month)
+        stream = request.args.get('stream', type=int)
+        query = extrato_query(year, month, type_)
         
-        transactions = db.session.scalars(
-            query.order_by(Transaction.date.desc())
-        ).all()
+        total_income, total_expense, available_years = cached(
+            'extrato_totals', year, month,
+            compute=lambda: (summary_total('income', year, month),
+                             summary_total('expense', year, month),
+                             summary_years())
+        )
         
-        formatted_transactions = format_transactions(transactions)
+        balance = total_income - total_expense
         
-        total_income = db.session.scalar(
-            db.select(func.sum(Transaction.amount))
-            .where(Transaction.type == 'income')
-            .where(Transaction.deleted_at.is_(None))
-            .where(extract('year', Transaction.date) == year if year else True)
-            .where(extract('month', Transaction.date) == month if month else True)
-        ) or 0
+        context = dict(total_income=total_income,
+                       total_expense=total_expense,
+                       balance=balance,
+                       selected_month=month,
+                       selected_year=year,
+                       selected_type=type_,
+                       available_years=available_years)
         
-        total_expense = db.session.scalar(
-            db.select(func.sum(Transaction.amount))
-            .where(Transaction.type == 'expense')
-            .where(Transaction.deleted_at.is_(None))
-            .where(extract('year', Transaction.date) == year if year else True)
-            .where(extract('month', Transaction.date) == month if month else True)
-        ) or 0
+        if stream:
+            # Render rows as they are read, without materializing the ledger
+            rows = db.session.execute(query.execution_options(yield_per=500))
+            has_transactions = db.session.scalar(
+                db.select(query.limit(1).exists())
+            )
+            return stream_template('extrato.html',
+                                   transactions=rows,
+                                   has_transactions=has_transactions,
+                                   streaming=True,
+                                   **context)
         
-        balance = total_income - total_expense
+        after = parse_cursor(request.args.get('after'))
+        before = parse_cursor(request.args.get('before'))
         
-        available_years = [
-            int(row[0]) for row in db.session.execute(
-                db.select(extract('year', Transaction.date).distinct())
-                .where(Transaction.deleted_at.is_(None))
-                .order_by(extract('year', Transaction.date).desc())
-            ).all() if row[0] is not None
-        ]
+        transactions, next_cursor, prev_cursor = cached(
+            'extrato_page', year, month, type_, after, before,
+            compute=lambda: extrato_page(query, after=after, before=before)
+        )
         
         return render_template('extrato.html',
-                            transactions=formatted_transactions,
-                            total_income=total_income,
-                            total_expense=total_expense,
-                            balance=balance,
-                            selected_month=month,
-                            selected_year=year,
-                            available_years=available_years)
+                            transactions=transactions,
+                            has_transactions=bool(transactions),
+                            next_cursor=next_cursor,
+                            prev_cursor=prev_cursor,
+                            **context)
     
     except Exception as e:
         flash(f'Ocorreu um erro ao gerar o extrato: {str(e)}', 'error')
         print(f"Error generating report: {str(e)}")
         return redirect(url_for('index'))
 
+@app.route('/extrato/export')
+def export_extrato():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exportacao.GERADORES:
+        abort(400)
+    year, month, type_ = extrato_filters()
+    
+    # Amounts leave as reais text ("1234.56"), the format the import reads back
+    columns = [func.printf('%.2f', Transaction.amount / 100.0).label(name) if name == 'amount'
+               else getattr(Transaction, name) for name in exportacao.CAMPOS]
+    query = extrato_query(year, month, type_).with_only_columns(*columns)
+    chunk_size = app.config['EXPORT_CHUNK_SIZE']
+    result = db.session.execute(query.execution_options(yield_per=chunk_size))
+    
+    mimetype, extension = exportacao.FORMATOS[fmt]
+    period = '-'.join(str(p) for p in (year, month) if p) or 'completo'
+    return Response(
+        stream_with_context(exportacao.GERADORES[fmt](result.partitions())),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=extrato-{period}.{extension}'}
+    )
+
+@app.route('/buscar')
+@conditional
+def search():
+    terms = request.args.get('q', '').strip()
+    year, month, _ = extrato_filters()
+    in_trash = request.args.get('lixeira', type=int) == 1
+    
+    transactions = []
+    query = search_query(terms, year, month, in_trash)
+    if query is not None:
+        transactions = cached('search', terms, year, month, in_trash,
+                              compute=lambda: db.session.execute(query).all())
+    
+    return render_template('search.html',
+                           transactions=transactions,
+                           terms=terms,
+                           in_trash=in_trash,
+                           limit=app.config['SEARCH_LIMIT'],
+                           selected_month=month,
+                           selected_year=year,
+                           available_years=summary_years())
+
+@app.route('/relatorios')
+@conditional
+def reports():
+    year = request.args.get('year', type=int) or date.today().year
+    type_ = 'income' if request.args.get('type') == 'income' else 'expense'
+    kind = relatorios.RECEITA if type_ == 'income' else relatorios.DESPESA
+    
+    columns = current_ledger().columns.atualizar(data_version())
+    start, end = relatorios.intervalo_meses(columns)
+    trend = relatorios.tendencia_mensal(columns, start, end)
+    month_ends = cached('month-end-balances', start, end,
+                        compute=lambda: month_end_balances(start, end))
+    for row, account_balance in zip(trend, month_ends):
+        row['saldo_conta'] = account_balance
+    
+    return render_template('reports.html',
+                           categories=relatorios.por_categoria(columns, kind, year),
+                           trend=trend,
+                           comparison=relatorios.comparativo_anual(columns, year, kind),
+                           selected_year=year,
+                           selected_type=type_,
+                           available_years=summary_years())
+
+@app.route('/saldo')
+@conditional
+def balance_chart_data():
+    """Balance-over-time series for charts: ?inicio=AAAA-MM-DD&fim=AAAA-MM-DD."""
+    end = request.args.get('fim', type=date.fromisoformat) or date.today()
+    start = request.args.get('inicio', type=date.fromisoformat) or end - timedelta(days=365)
+    if start > end:
+        abort(400)
+    points = cached('balance-series', start, end,
+                    compute=lambda: balance_series(start, end))
+    return jsonify(inicio=start.isoformat(), fim=end.isoformat(),
+                   pontos=[{'data': day, 'saldo_centavos': value} for day, value in points])
+
+@app.route('/orcamentos')
+@conditional
+def budgets():
+    today = date.today()
+    year = request.args.get('year', type=int) or today.year
+    month = request.args.get('month', type=int) or today.month
+    # Strictly inside date's range, so the previous and next months exist too
+    if not 1 <= month <= 12 or not date.min.year < year < date.max.year:
+        abort(400)
+    first = date(year, month, 1)
+    previous = first - timedelta(days=1)
+    following = first + timedelta(days=31)
+    return render_template('budgets.html',
+                           budgets=budget_status(year, month),
+                           year=year, month=month,
+                           previous=(previous.year, previous.month),
+                           following=(following.year, following.month))
+
+def budget_redirect():
+    return redirect(url_for('budgets', year=request.form.get('year', type=int),
+                            month=request.form.get('month', type=int)))
+
+@app.route('/orcamentos', methods=['POST'])
+def set_budget():
+    try:
+        category = request.form['category'].strip()
+        amount = dinheiro.centavos(request.form['amount'])
+        if not category or len(category) > 50 or amount <= 0:
+            flash('Categoria e valor positivo são obrigatórios!', 'error')
+        else:
+            db.session.merge(Budget(category=category, amount=amount))
+            bump_data_version()
+            db.session.commit()
+            flash(f'Orçamento de {category} salvo!', 'success')
+    except (ValueError, KeyError) as e:
+        flash(f'Dados inválidos: {str(e)}', 'error')
+    except Exception as e:
+        db.session.rollback()
+        flash('Erro ao salvar orçamento!', 'error')
+        print(f"Error saving budget: {e}")
+    return budget_redirect()
+
+@app.route('/orcamentos/excluir', methods=['POST'])
+def delete_budget():
+    try:
+        if db.session.execute(db.delete(Budget).where(
+                Budget.category == request.form.get('category'))).rowcount:
+            bump_data_version()
+        db.session.commit()
+        flash('Orçamento removido!', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('Erro ao remover orçamento', 'error')
+        print(f"Error deleting budget: {e}")
+    return budget_redirect()
+
 @app.route('/lixeira')
+@conditional
 def trash():
     try:
-        transactions = db.session.scalars(
-            db.select(Transaction)
-            .where(Transaction.deleted_at.isnot(None))
-            .order_by(Transaction.deleted_at.desc())
-        ).all()
+        transactions = db.session.execute(trash_query()).all()
         
         return render_template('trash.html', 
-                            transactions=format_transactions(transactions))
+                            transactions=transactions)
     except Exception as e:
         flash('Erro ao acessar a lixeira.', 'error')
         print(f"Error accessing trash: {e}")
@@ -269,7 +1487,10 @@ def trash():
 def restore_transaction(id):
     try:
         transaction = db.get_or_404(Transaction, id)
-        transaction.deleted_at = None
+        if transaction.deleted_at is not None:
+            transaction.deleted_at = None
+            apply_to_summary(transaction, 1)
+            bump_data_version()
         db.session.commit()
         flash('Transação restaurada com sucesso!', 'success')
     except Exception as e:
@@ -283,7 +1504,10 @@ def restore_transaction(id):
 def permanent_delete(id):
     try:
         transaction = db.get_or_404(Transaction, id)
+        if transaction.deleted_at is None:
+            apply_to_summary(transaction, -1)
         db.session.delete(transaction)
+        bump_data_version()
         db.session.commit()
         flash('Transação excluída permanentemente!', 'success')
     except Exception as e:
@@ -293,22 +1517,146 @@ def permanent_delete(id):
     
     return redirect(url_for('trash'))
 
+# Bulk actions: one set-based statement and one commit for all selected rows
+def bulk_criteria(action):
+    """Rows picked in a bulk form: the checked ids, or the current filter."""
+    if request.form.get('scope') != 'filter':
+        ids = request.form.getlist('ids', type=int)
+        return [Transaction.id.in_(ids)] if ids else []
+    criteria = period_criteria(request.form.get('year', type=int),
+                               request.form.get('month', type=int))
+    if request.form.get('category'):
+        criteria.append(Transaction.category == request.form['category'])
+    # As in dados.py, a filter needs a period or category: a type alone
+    # would select every income or expense row
+    if not criteria:
+        return []
+    if request.form.get('type') in ('income', 'expense'):
+        criteria.append(Transaction.type == request.form['type'])
+    if action == 'permanent-delete':
+        # A filter only ever deletes for good what is already in the trash
+        criteria.append(Transaction.deleted_at.isnot(None))
+    return criteria
+
+def _bulk_update(values, *criteria):
+    return db.session.execute(
+        db.update(Transaction).where(*criteria).values(**values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+def bulk_delete(criteria):
+    apply_query_to_summary(-1, *criteria)
+    return _bulk_update({'deleted_at': datetime.now()},
+                        Transaction.deleted_at.is_(None), *criteria)
+
+def bulk_restore(criteria):
+    restored = _summary_groups(*criteria, trashed=True)
+    restored_days = _balance_groups(*criteria, trashed=True)
+    count = _bulk_update({'deleted_at': None}, Transaction.deleted_at.isnot(None), *criteria)
+    for year, month, type_, category, total, rows in restored:
+        _upsert_summary(int(year), int(month), type_, category, total, rows)
+    apply_to_balance(restored_days)
+    return count
+
+def bulk_permanent_delete(criteria):
+    apply_query_to_summary(-1, *criteria)
+    return db.session.execute(
+        db.delete(Transaction).where(*criteria)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+BULK_ACTIONS = {
+    'delete': (bulk_delete, '{} transações movidas para a lixeira!', 'extrato'),
+    'restore': (bulk_restore, '{} transações restauradas!', 'trash'),
+    'permanent-delete': (bulk_permanent_delete, '{} transações excluídas permanentemente!', 'trash'),
+}
+
+@app.route('/bulk/<action>', methods=['POST'])
+def bulk_action(action):
+    if action not in BULK_ACTIONS:
+        abort(404)
+    apply, message, fallback = BULK_ACTIONS[action]
+    criteria = bulk_criteria(action)
+    count = error = None
+    if not criteria:
+        error = 'Selecione ao menos uma transação, um período ou uma categoria.'
+    else:
+        try:
+            count = apply(criteria)
+            if count:
+                bump_data_version()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            error = 'Erro ao atualizar as transações selecionadas'
+            print(f"Error in bulk {action}: {e}")
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(affected=count, error=error), 400 if error else 200
+    if error:
+        flash(error, 'error')
+    else:
+        flash(message.format(count), 'success')
+    return redirect(request.referrer or url_for(fallback))
+
 @app.route('/empty-trash', methods=['POST'])
 def empty_trash():
-    try:
-        deleted_count = db.session.execute(
-            db.delete(Transaction)
-            .where(Transaction.deleted_at.isnot(None))
-        ).rowcount
-        db.session.commit()
-        flash(f'{deleted_count} transações removidas permanentemente!', 'success')
-    except Exception as e:
-        db.session.rollback()
-        flash('Erro ao esvaziar lixeira', 'error')
-        print(f"Error emptying trash: {e}")
-    
+    if current_ledger().trash_purge.iniciar():
+        flash('A lixeira está sendo esvaziada em segundo plano.', 'success')
+    else:
+        flash('A lixeira já está sendo esvaziada.', 'info')
     return redirect(url_for('trash'))
 
+@app.route('/empty-trash/status')
+def empty_trash_status():
+    return jsonify(current_ledger().trash_purge.progresso)
+
+@app.route('/cache-stats')
+def cache_stats():
+    return jsonify(current_ledger().result_cache.estatisticas())
+
+@app.route('/write-queue-stats')
+def write_queue_stats():
+    write_queue = current_ledger().write_queue
+    return jsonify(write_queue.estatisticas() if write_queue else {'ativa': False})
+
+@app.route('/ledger-stats')
+def ledger_stats():
+    return jsonify(ledgers.estatisticas())
+
+@app.route('/livro/', defaults={'name': None})
+@app.route('/livro/<name>')
+def switch_ledger(name):
+    """Pick this browser session's ledger; without a name, back to the default one."""
+    if name:
+        try:
+            livros.existente(LEDGERS_DIR, name)
+        except (livros.LivroInvalido, livros.LivroInexistente):
+            abort(404)
+        session['ledger'] = name
+    else:
+        session.pop('ledger', None)
+    return redirect(url_for('index'))
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """A fingerprinted static file: cached for a year, precompressed when possible."""
+    if filename not in asset_manifest.values():
+        abort(404)
+    stored, encoding = estaticos.variante(ASSETS_DIR, filename, request.accept_encodings)
+    response = send_from_directory(ASSETS_DIR, stored, max_age=estaticos.UM_ANO,
+                                   mimetype=mimetypes.guess_type(filename)[0])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.exportar(),
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
+
 if __name__ == '__main__':
     try:
         if not DB_PATH.exists():
@@ -319,4 +1667,8 @@ if __name__ == '__main__':
     except PermissionError:
         print(f"Permission denied for database file: {DB_PATH}")
     
+    # Development server only; deployments run `flask migrate` before starting
+    for migration in migracoes.migrar(DB_PATH):
+        print(f"Applied migration {migration.versao:03d}: {migration.descricao}")
+    
     app.run(debug=True)
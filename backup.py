@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+# Tamanho do log a partir do qual ele é compactado em um novo snapshot
+LIMITE_LOG_BYTES = int(os.getenv('BACKUP_LIMITE_LOG_BYTES', 4 * 1024 * 1024))
+
+
+class RegistroAlteracoes:
+    """Backup incremental: snapshot NDJSON + log de alterações só de acréscimo.
+
+    O snapshot começa com um cabeçalho {"seq": N, ...} seguido de uma linha
+    por transação. O log tem um registro por alteração, com `seq` crescente;
+    registros com seq <= N já estão no snapshot.
+    """
+
+    def __init__(self, base: Path, limite_bytes: int = LIMITE_LOG_BYTES):
+        self.log_file = base.with_name(base.stem + '.log.ndjson')
+        self.snapshot_file = base.with_name(base.stem + '.snapshot.ndjson')
+        self.limite_bytes = limite_bytes
+        # Mantida durante commit + anexação, para o log sair na ordem de seq
+        self.trava = threading.RLock()
+
+    def anexar(self, registros: List[Dict]):
+        with open(self.log_file, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(r, default=str, ensure_ascii=False) + '\n'
+                         for r in registros)
+
+    def precisa_compactar(self) -> bool:
+        try:
+            return self.log_file.stat().st_size > self.limite_bytes
+        except FileNotFoundError:
+            return False
+
+    def cabecalho(self) -> Dict:
+        try:
+            with open(self.snapshot_file, encoding='utf-8') as f:
+                return json.loads(f.readline())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def seq_snapshot(self) -> int:
+        return self.cabecalho().get('seq', 0)
+
+    def ultima_seq(self) -> int:
+        """Maior seq conhecida, lendo apenas o fim do log"""
+        ultima = self.seq_snapshot()
+        try:
+            with open(self.log_file, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - 64 * 1024))
+                for linha in reversed(f.read().splitlines()):
+                    try:
+                        return max(ultima, json.loads(linha)['seq'])
+                    except (ValueError, KeyError):
+                        continue
+        except FileNotFoundError:
+            pass
+        return ultima
+
+    def ler_snapshot(self) -> Iterator[list]:
+        """Linhas do snapshot; sem snapshot (nenhuma compactação ainda), nenhuma"""
+        try:
+            with open(self.snapshot_file, encoding='utf-8') as f:
+                f.readline()
+                for linha in f:
+                    if linha.strip():
+                        yield json.loads(linha)
+        except FileNotFoundError:
+            return
+
+    def ler_log(self, desde: int = 0) -> Iterator[Dict]:
+        try:
+            with open(self.log_file, encoding='utf-8') as f:
+                for linha in f:
+                    try:
+                        registro = json.loads(linha)
+                    except ValueError:
+                        # Última linha incompleta após uma queda
+                        continue
+                    if registro.get('seq', 0) > desde:
+                        yield registro
+        except FileNotFoundError:
+            return
+
+    def compactar(self, linhas: Iterable, seq: int, **cabecalho):
+        """Grava um novo snapshot na seq informada e descarta o log anterior.
+
+        Deve ser chamado com `trava` adquirida antes de ler `linhas`; os
+        demais argumentos vão para o cabeçalho.
+        """
+        temporario = self.snapshot_file.with_name(self.snapshot_file.name + '.tmp')
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'seq': seq, 'data_backup': datetime.now().isoformat(),
+                                **cabecalho}) + '\n')
+            for linha in linhas:
+                f.write(json.dumps(list(linha), default=str, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.snapshot_file)
+        self.log_file.unlink(missing_ok=True)
@@ -0,0 +1,130 @@
+"""Vazão de leituras com uma escrita contínua em andamento.
+
+Compara a camada de conexão (uma conexão por thread + WAL) com o modo
+anterior (conexão única compartilhada, rollback journal):
+
+    python -m benchmarks.concorrencia --linhas 100000 --segundos 3
+"""
+import argparse
+import json
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import migracoes
+from benchmarks import gerador
+from conexao import PRAGMAS, ConexoesPorThread, conectar
+
+PRAGMAS_LEGADO = {'journal_mode': 'DELETE', 'synchronous': 'FULL',
+                  'busy_timeout': PRAGMAS['busy_timeout']}
+
+# Mesma consulta da página do extrato (índice parcial ix_transaction_active_date)
+LEITURA = """
+    SELECT id, description, amount, category, type, date
+    FROM "transaction"
+    WHERE deleted_at IS NULL AND date >= ? AND date < ?
+    ORDER BY date DESC
+    LIMIT 50
+"""
+
+INSERCAO = ('INSERT INTO "transaction" (description, amount, category, type, date) '
+            'VALUES (?, ?, ?, ?, ?)')
+
+
+def _linha(rng, inicio):
+    dia = inicio + timedelta(days=rng.randrange(3650))
+    return (f'item {rng.randrange(10 ** 6)}', rng.randrange(100, 50000),
+            'Outros', rng.choice(('income', 'expense')), dia.isoformat())
+
+
+def preparar(caminho, linhas):
+    """Banco com o esquema real (migracoes.py) e um livro sintético"""
+    migracoes.migrar(caminho)
+    con = conectar(caminho)
+    gerador.popular_dados(con, linhas)
+    con.close()
+
+
+def medir(caminho, leitores, segundos, pragmas, compartilhada):
+    conexoes = ConexoesPorThread(caminho, pragmas)
+    unica = conexoes.obter() if compartilhada else None
+    trava = threading.Lock()
+    parar = threading.Event()
+    contagem = [0] * leitores
+    escritas = [0]
+
+    def conexao():
+        return unica if compartilhada else conexoes.obter()
+
+    def ler(i):
+        rng = random.Random(i)
+        while not parar.is_set():
+            mes = date(rng.randrange(2015, 2025), rng.randrange(1, 13), 1)
+            fim = (mes + timedelta(days=32)).replace(day=1)
+            if compartilhada:
+                with trava:
+                    conexao().execute(LEITURA, (mes.isoformat(), fim.isoformat())).fetchall()
+            else:
+                conexao().execute(LEITURA, (mes.isoformat(), fim.isoformat())).fetchall()
+            contagem[i] += 1
+
+    def escrever():
+        rng = random.Random(-1)
+        inicio = date(2015, 1, 1)
+        while not parar.is_set():
+            if compartilhada:
+                with trava:
+                    conexao().execute(INSERCAO, _linha(rng, inicio))
+                    conexao().commit()
+            else:
+                con = conexao()
+                con.execute(INSERCAO, _linha(rng, inicio))
+                con.commit()
+            escritas[0] += 1
+
+    threads = [threading.Thread(target=ler, args=(i,)) for i in range(leitores)]
+    threads.append(threading.Thread(target=escrever))
+    for t in threads:
+        t.start()
+    time.sleep(segundos)
+    parar.set()
+    for t in threads:
+        t.join()
+    conexoes.fechar_todas()
+    return sum(contagem) / segundos, escritas[0] / segundos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=100_000)
+    parser.add_argument('--segundos', type=float, default=2.0)
+    parser.add_argument('--leitores', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--json', type=Path, help='Salva os resultados neste arquivo')
+    args = parser.parse_args(argv)
+
+    modos = {
+        'legado (conexão única, rollback journal)': (PRAGMAS_LEGADO, True),
+        'por thread + WAL': (PRAGMAS, False),
+    }
+    resultados = []
+    for nome, (pragmas, compartilhada) in modos.items():
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = Path(pasta) / 'bench.db'
+            preparar(caminho, args.linhas)
+            # Fixa o journal_mode do arquivo antes de medir
+            ConexoesPorThread(caminho, pragmas).obter().close()
+            for leitores in args.leitores:
+                leituras, escritas = medir(caminho, leitores, args.segundos, pragmas, compartilhada)
+                resultados.append({'modo': nome, 'leitores': leitores,
+                                   'leituras_s': round(leituras), 'escritas_s': round(escritas)})
+                print(f'{nome:45} leitores={leitores:<3} '
+                      f'leituras/s={leituras:>9.0f} escritas/s={escritas:>7.0f}')
+    if args.json:
+        args.json.write_text(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Inserções por segundo: commit por linha contra a fila de escrita em grupo.
+
+Várias threads inserem ao mesmo tempo pelo app (POST /add) e por dados.py
+(adicionar_transacao), primeiro com um commit por inserção (o padrão) e
+depois pela fila de fila_escrita.py (WRITE_QUEUE=1):
+
+    python -m benchmarks.escrita --threads 1 8 32 --segundos 3
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def medir(inserir, threads: int, segundos: float) -> float:
+    """Inserções por segundo com `threads` threads chamando inserir(thread, n)"""
+    parar = threading.Event()
+    contagem = [0] * threads
+    erros = []
+
+    def laco(i):
+        n = 0
+        try:
+            while not parar.is_set():
+                inserir(i, n)
+                n += 1
+        except Exception as e:
+            erros.append(e)
+        contagem[i] = n
+
+    trabalhadoras = [threading.Thread(target=laco, args=(i,)) for i in range(threads)]
+    for t in trabalhadoras:
+        t.start()
+    time.sleep(segundos)
+    parar.set()
+    for t in trabalhadoras:
+        t.join()
+    if erros:
+        raise erros[0]
+    return sum(contagem) / segundos
+
+
+def _dia(n: int) -> str:
+    return f'2024-{n % 12 + 1:02d}-{n % 28 + 1:02d}'
+
+
+def preparar(pasta: Path):
+    """Bancos migrados do app e de dados.py dentro da pasta temporária"""
+    os.environ['DATABASE_PATH'] = str(pasta / 'app.db')
+    os.environ['TRASH_RETENTION_DAYS'] = '0'
+    os.chdir(pasta)
+    migracoes = importlib.import_module('migracoes')
+    app_modulo = importlib.import_module('app')
+    # Esperas pelo lock de escrita não são consultas lentas aqui
+    app_modulo.app.config['SLOW_QUERY_MS'] = float('inf')
+    dados = importlib.import_module('dados')
+    migracoes.migrar(app_modulo.DB_PATH)
+    migracoes.migrar(dados.CAMINHO_BANCO)
+    return app_modulo, dados.GerenciadorTransacoes()
+
+
+def alvos(app_modulo, gerenciador, threads: int):
+    """{nome: (inserir, instalar_fila, gravar_lote)}; instalar_fila(fila ou None) troca o modo"""
+    clientes = [app_modulo.app.test_client(use_cookies=False) for _ in range(threads)]
+
+    def inserir_app(i, n):
+        resposta = clientes[i].post('/add', data={
+            'description': f'Escrita {i}-{n}', 'amount': '12.34', 'category': 'Outros',
+            'type': 'expense', 'transaction_date': _dia(n)})
+        if resposta.status_code != 302:
+            raise RuntimeError(f'POST /add: HTTP {resposta.status_code}')
+
+    def inserir_dados(i, n):
+        gerenciador.adicionar_transacao({'description': f'Escrita {i}-{n}', 'amount': 12.34,
+                                         'category': 'Outros', 'type': 'expense',
+                                         'date': _dia(n)})
+
+    def fila_app(fila):
+        app_modulo.default_ledger.write_queue = fila
+
+    def fila_dados(fila):
+        gerenciador.fila = fila
+
+    return {
+        'app POST /add': (inserir_app, fila_app,
+                          partial(app_modulo.write_batch, app_modulo.default_ledger)),
+        'dados adicionar_transacao': (inserir_dados, fila_dados, gerenciador._gravar_lote),
+    }
+
+
+def reconectar(app_modulo, gerenciador, synchronous: str):
+    """Reabre as conexões com outro PRAGMA synchronous"""
+    conexao = importlib.import_module('conexao')
+    conexao.PRAGMAS['synchronous'] = synchronous
+    with app_modulo.app.app_context():
+        app_modulo.db.engine.dispose()
+    gerenciador.conexoes.fechar_todas()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--segundos', type=float, default=2.0)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--synchronous', nargs='+', default=['NORMAL', 'FULL'],
+                        help='Níveis de PRAGMA synchronous a comparar')
+    parser.add_argument('--max-itens', type=int, help='Tamanho máximo do lote da fila')
+    parser.add_argument('--janela-ms', type=float, help='Janela de espera da fila')
+    parser.add_argument('--json', type=Path, help='Salva os resultados neste arquivo')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(RAIZ))
+    fila_escrita = importlib.import_module('fila_escrita')
+    opcoes_fila = {'durabilidade': 'commit'}
+    if args.max_itens:
+        opcoes_fila['max_itens'] = args.max_itens
+    if args.janela_ms is not None:
+        opcoes_fila['janela'] = args.janela_ms / 1000
+
+    resultados = []
+    origem = os.getcwd()
+    with tempfile.TemporaryDirectory() as pasta:
+        try:
+            app_modulo, gerenciador = preparar(Path(pasta))
+            for synchronous in args.synchronous:
+                reconectar(app_modulo, gerenciador, synchronous)
+                for threads in args.threads:
+                    for nome, (inserir, instalar_fila, gravar_lote) in \
+                            alvos(app_modulo, gerenciador, threads).items():
+                        instalar_fila(None)
+                        por_linha = medir(inserir, threads, args.segundos)
+                        fila = fila_escrita.FilaEscrita(gravar_lote, **opcoes_fila)
+                        instalar_fila(fila)
+                        try:
+                            em_grupo = medir(inserir, threads, args.segundos)
+                        finally:
+                            fila.fechar()
+                            instalar_fila(None)
+                        lote = fila.estatisticas()['media_por_lote']
+                        resultados.append({'alvo': nome, 'synchronous': synchronous,
+                                           'threads': threads,
+                                           'por_linha_s': round(por_linha),
+                                           'em_grupo_s': round(em_grupo),
+                                           'media_por_lote': round(lote, 1)})
+                        print(f'{nome:28} synchronous={synchronous:6} threads={threads:<3} '
+                              f'por linha={por_linha:>7.0f}/s em grupo={em_grupo:>7.0f}/s '
+                              f'({em_grupo / por_linha:4.1f}x, {lote:.1f} por lote)')
+        finally:
+            os.chdir(origem)
+    if args.json:
+        args.json.write_text(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
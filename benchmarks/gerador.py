@@ -0,0 +1,115 @@
+"""Gerador determinístico de livros-caixa sintéticos.
+
+A mesma semente produz sempre as mesmas linhas, em ordem de data (como num
+uso real, em que os ids crescem com o tempo). Usado por benchmarks.suite.
+"""
+import random
+from datetime import date, datetime, time, timedelta
+from typing import Iterator, Tuple
+
+from conexao import conectar
+from orcamento import DEFINIR
+
+# (categoria, peso, valor mínimo, valor máximo, descrições)
+DESPESAS = [
+    ('Alimentação', 30, 8, 250, ['Mercado Extra', 'Padaria São João', 'iFood', 'Açougue Boi Bom', 'Feira livre']),
+    ('Transporte', 18, 5, 180, ['Uber', '99 Táxi', 'Posto Ipiranga', 'Estacionamento', 'Bilhete Único']),
+    ('Moradia', 8, 80, 2500, ['Aluguel', 'Condomínio', 'Conta de luz', 'Conta de água', 'Internet']),
+    ('Saúde', 6, 20, 600, ['Farmácia Drogasil', 'Consulta médica', 'Plano de saúde', 'Exame laboratorial']),
+    ('Lazer', 10, 15, 400, ['Cinema', 'Netflix', 'Spotify', 'Bar do Zé', 'Show']),
+    ('Educação', 4, 30, 900, ['Mensalidade curso', 'Livraria Cultura', 'Udemy']),
+    ('Compras', 12, 10, 1200, ['Amazon', 'Mercado Livre', 'Renner', 'Magazine Luiza']),
+    ('Outros', 12, 5, 300, ['Pix enviado', 'Saque', 'Tarifa bancária', 'Presente']),
+]
+RECEITAS = [
+    ('Salário', 50, 2500, 12000, ['Salário', 'Adiantamento salarial']),
+    ('Freelance', 25, 200, 5000, ['Projeto freelance', 'Consultoria']),
+    ('Investimentos', 15, 5, 1500, ['Rendimento CDB', 'Dividendos', 'Tesouro Direto']),
+    ('Outros', 10, 10, 800, ['Pix recebido', 'Reembolso', 'Venda usada']),
+]
+FRACAO_RECEITAS = 0.1
+
+Linha = Tuple[str, int, str, str, date, datetime]
+
+
+def gerar(linhas: int, semente: int = 42, inicio: date = date(2015, 1, 1),
+          anos: int = 10, fracao_lixeira: float = 0.05) -> Iterator[Linha]:
+    """Gera (descrição, valor em centavos, categoria, tipo, data, removida_em) em ordem de data"""
+    rng = random.Random(semente)
+    dias = (date(inicio.year + anos, inicio.month, inicio.day) - inicio).days
+    pesos_despesas = [c[1] for c in DESPESAS]
+    pesos_receitas = [c[1] for c in RECEITAS]
+    por_dia, resto = divmod(linhas, dias)
+    extras = set(rng.sample(range(dias), resto))
+    for d in range(dias):
+        dia = inicio + timedelta(days=d)
+        for _ in range(por_dia + (d in extras)):
+            if rng.random() < FRACAO_RECEITAS:
+                tipo = 'income'
+                categoria, _, minimo, maximo, descricoes = rng.choices(RECEITAS, pesos_receitas)[0]
+            else:
+                tipo = 'expense'
+                categoria, _, minimo, maximo, descricoes = rng.choices(DESPESAS, pesos_despesas)[0]
+            removida = None
+            if rng.random() < fracao_lixeira:
+                removida = datetime.combine(dia + timedelta(days=rng.randrange(1, 60)),
+                                            time(rng.randrange(24), rng.randrange(60)))
+            yield (rng.choice(descricoes), round(rng.uniform(minimo, maximo) * 100),
+                   categoria, tipo, dia, removida)
+
+
+def palavras(semente: int = 42) -> Iterator[str]:
+    """Termos de busca que existem no livro gerado"""
+    rng = random.Random(semente)
+    todas = sorted({p for *_, descricoes in DESPESAS + RECEITAS
+                    for d in descricoes for p in d.split() if len(p) > 2})
+    while True:
+        yield rng.choice(todas)
+
+
+def _inserir(con, sql: str, linhas, lote: int = 10_000) -> int:
+    total = 0
+    buffer = []
+    for linha in linhas:
+        buffer.append(linha)
+        if len(buffer) >= lote:
+            con.executemany(sql, buffer)
+            total += len(buffer)
+            buffer = []
+    if buffer:
+        con.executemany(sql, buffer)
+        total += len(buffer)
+    con.commit()
+    return total
+
+
+def _texto(linhas: Iterator[Linha]):
+    for descricao, valor, categoria, tipo, dia, removida in linhas:
+        yield (descricao, valor, categoria, tipo, dia.isoformat(),
+               removida and removida.isoformat(' ', 'microseconds'))
+
+
+INSERIR = ('INSERT INTO "transaction" (description, amount, category, type, date, deleted_at) '
+           'VALUES (?, ?, ?, ?, ?, ?)')
+
+
+def popular_app(caminho, linhas, **opcoes) -> int:
+    """Insere as linhas na tabela `transaction` de um banco já migrado"""
+    con = conectar(caminho)
+    try:
+        return _inserir(con, INSERIR, _texto(gerar(linhas, **opcoes)))
+    finally:
+        con.close()
+
+
+def popular_dados(con, linhas, **opcoes) -> int:
+    """Insere as linhas pela conexão de dados.py (mesmo esquema do app)"""
+    return _inserir(con, INSERIR, _texto(gerar(linhas, **opcoes)))
+
+
+def popular_orcamentos(con) -> int:
+    """Um orçamento por categoria de despesa, com limite perto do gasto mensal típico"""
+    con.executemany(DEFINIR, [{'category': categoria, 'amount': peso * maximo * 100}
+                              for categoria, peso, _, maximo, _ in DESPESAS])
+    con.commit()
+    return len(DESPESAS)
@@ -0,0 +1,128 @@
+"""Inserções por segundo em um livro só contra um livro por thread.
+
+N threads inserem ao mesmo tempo, primeiro todas no mesmo livro (disputando
+o lock de escrita dele) e depois cada uma no seu (ver livros.py), pelo app
+(POST /add com X-Ledger) e por dados.py (GerenciadorTransacoes.livro):
+
+    python -m benchmarks.livros --livros 1 2 4 8 --segundos 3
+
+Com uma CPU e um disco rápido o custo é quase todo CPU e os livros pouco
+mudam; o ganho aparece quando o commit espera o disco. --latencia-ms simula
+esse disco: cada commit segura o lock de escrita do seu livro por mais
+alguns milissegundos, sem ocupar a CPU.
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.escrita import RAIZ, medir, _dia
+
+
+def preparar(pasta: Path, quantidade: int, synchronous: str):
+    """App e dados.py com `quantidade` livros migrados dentro da pasta temporária"""
+    os.environ['DATABASE_PATH'] = str(pasta / 'app.db')
+    os.environ['LEDGERS_DIR'] = str(pasta / 'ledgers')
+    os.environ['DADOS_LEDGERS_DIR'] = str(pasta / 'livros')
+    os.environ['LEDGER_MAX_OPEN'] = str(quantidade)
+    os.environ['TRASH_RETENTION_DAYS'] = '0'
+    os.environ['SQLITE_SYNCHRONOUS'] = synchronous
+    os.chdir(pasta)
+    migracoes = importlib.import_module('migracoes')
+    app_modulo = importlib.import_module('app')
+    # Esperas pelo lock de escrita não são consultas lentas aqui
+    app_modulo.app.config['SLOW_QUERY_MS'] = float('inf')
+    dados = importlib.import_module('dados')
+    migracoes.migrar(app_modulo.DB_PATH)
+    nomes = [f'livro{i}' for i in range(quantidade)]
+    cli = app_modulo.app.test_cli_runner()
+    for nome in nomes:
+        for opcoes in ([], ['--dados']):
+            resultado = cli.invoke(args=['migrate', '--ledger', nome, *opcoes])
+            if resultado.exit_code:
+                raise RuntimeError(resultado.output)
+    return app_modulo, dados.GerenciadorTransacoes, nomes
+
+
+def simular_latencia(dados, segundos: float):
+    """Espera `segundos` antes de cada commit, com o lock de escrita já tomado"""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    event.listen(Engine, 'commit', lambda conexao: time.sleep(segundos))
+    confirmar = dados.GerenciadorTransacoes._confirmar
+
+    def confirmar_devagar(self, cursor, registros):
+        time.sleep(segundos)
+        return confirmar(self, cursor, registros)
+    dados.GerenciadorTransacoes._confirmar = confirmar_devagar
+
+
+def alvos(app_modulo, Gerenciador, livro_da_thread, threads: int):
+    """{nome: inserir(thread, n)}, com cada thread escrevendo em livro_da_thread(thread)"""
+    clientes = [app_modulo.app.test_client(use_cookies=False) for _ in range(threads)]
+
+    def inserir_app(i, n):
+        resposta = clientes[i].post('/add', headers={'X-Ledger': livro_da_thread(i)}, data={
+            'description': f'Escrita {i}-{n}', 'amount': '12.34', 'category': 'Outros',
+            'type': 'expense', 'transaction_date': _dia(n)})
+        if resposta.status_code != 302:
+            raise RuntimeError(f'POST /add: HTTP {resposta.status_code}')
+
+    def inserir_dados(i, n):
+        with Gerenciador.livro(livro_da_thread(i)) as gerenciador:
+            gerenciador.adicionar_transacao({'description': f'Escrita {i}-{n}', 'amount': 12.34,
+                                             'category': 'Outros', 'type': 'expense',
+                                             'date': _dia(n)})
+
+    return {'app POST /add': inserir_app, 'dados adicionar_transacao': inserir_dados}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--segundos', type=float, default=2.0)
+    parser.add_argument('--livros', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='Quantidades de threads (e de livros) a comparar')
+    parser.add_argument('--synchronous', default='FULL',
+                        help='PRAGMA synchronous; com FULL cada commit espera o fsync')
+    parser.add_argument('--latencia-ms', type=float, default=0,
+                        help='Atraso simulado de cada commit (disco lento)')
+    parser.add_argument('--json', type=Path, help='Salva os resultados neste arquivo')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(RAIZ))
+    resultados = []
+    origem = os.getcwd()
+    with tempfile.TemporaryDirectory() as pasta:
+        try:
+            app_modulo, Gerenciador, nomes = preparar(Path(pasta), max(args.livros),
+                                                      args.synchronous)
+            if args.latencia_ms:
+                simular_latencia(importlib.import_module('dados'), args.latencia_ms / 1000)
+            base = {}
+            for quantidade in args.livros:
+                um_livro = alvos(app_modulo, Gerenciador, lambda i: nomes[0], quantidade)
+                separados = alvos(app_modulo, Gerenciador, lambda i: nomes[i], quantidade)
+                for alvo in um_livro:
+                    compartilhado = medir(um_livro[alvo], quantidade, args.segundos)
+                    por_livro = medir(separados[alvo], quantidade, args.segundos)
+                    base.setdefault(alvo, por_livro)
+                    resultados.append({'alvo': alvo, 'threads': quantidade,
+                                       'latencia_ms': args.latencia_ms,
+                                       'um_livro_s': round(compartilhado),
+                                       'um_por_thread_s': round(por_livro)})
+                    print(f'{alvo:26} threads={quantidade:<3} um livro={compartilhado:>7.0f}/s '
+                          f'um por thread={por_livro:>7.0f}/s '
+                          f'({por_livro / compartilhado:4.1f}x; {por_livro / base[alvo]:4.1f}x '
+                          f'o de 1 livro)')
+        finally:
+            os.chdir(origem)
+    if args.json:
+        args.json.write_text(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
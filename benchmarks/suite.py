@@ -0,0 +1,463 @@
+"""Latência, consultas SQL e memória de pico das rotas do app e de dados.py.
+
+Gera um livro sintético com semente fixa (benchmarks.gerador) num diretório
+temporário e mede cada cenário: as rotas pelo cliente de testes do Flask e a
+API de GerenciadorTransacoes diretamente. Com --json os resultados ficam
+salvos para comparar dois commits:
+
+    python -m benchmarks.suite --linhas 100000 --json antes.json
+    python -m benchmarks.suite --linhas 100000 --json depois.json
+    python -m benchmarks.suite --comparar antes.json depois.json
+"""
+import argparse
+import importlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from benchmarks import gerador
+
+RAIZ = Path(__file__).resolve().parent.parent
+INICIO = date(2015, 1, 1)
+LINHAS_IMPORTACAO = 100
+# Livro nomeado (vazio) para as rotas de livros
+LIVRO = 'benchmark'
+# Transações por ação em lote com ids marcados
+LINHAS_LOTE = 10
+
+
+class Cenario(NamedTuple):
+    nome: str
+    executar: Callable[[int], object]
+    # Cenários que só fazem sentido uma vez (ex.: esvaziar a lixeira)
+    unico: bool = False
+
+
+class Contador:
+    """Conta os comandos SQL enviados ao banco, sem BEGIN/COMMIT nem os
+    comandos internos de gatilhos e do FTS5 (que o SQLite reporta como '--')"""
+
+    def __init__(self):
+        self.total = 0
+
+    def sqlalchemy(self, conn, cursor, statement, *args):
+        self.total += 1
+
+    def sqlite(self, statement):
+        if not statement.lstrip().upper().startswith(('--', 'BEGIN', 'COMMIT', 'ROLLBACK')):
+            self.total += 1
+
+
+def percentil(amostras: List[float], p: float) -> float:
+    """Percentil pelo método do posto mais próximo"""
+    ordenadas = sorted(amostras)
+    return ordenadas[max(math.ceil(p / 100 * len(ordenadas)) - 1, 0)]
+
+
+def medir(cenario: Cenario, iteracoes: int, contador: Contador,
+          limpar: Callable[[], None]) -> Dict:
+    # A primeira execução (aquecimento) mede a memória de pico; o tracemalloc
+    # deixa tudo mais lento, então as demais execuções medem o tempo sem ele
+    limpar()
+    tracemalloc.start()
+    antes = contador.total
+    inicio = time.perf_counter()
+    cenario.executar(0)
+    tempos = [time.perf_counter() - inicio]
+    consultas = [contador.total - antes]
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if not cenario.unico:
+        tempos, consultas = [], []
+        for i in range(1, iteracoes + 1):
+            limpar()
+            antes = contador.total
+            inicio = time.perf_counter()
+            cenario.executar(i)
+            tempos.append(time.perf_counter() - inicio)
+            consultas.append(contador.total - antes)
+
+    return {
+        'cenario': cenario.nome,
+        'iteracoes': len(tempos),
+        'p50_ms': round(percentil(tempos, 50) * 1000, 3),
+        'p99_ms': round(percentil(tempos, 99) * 1000, 3),
+        'media_ms': round(sum(tempos) / len(tempos) * 1000, 3),
+        'consultas': round(sum(consultas) / len(consultas), 2),
+        'memoria_pico_kib': round(pico / 1024, 1),
+    }
+
+
+def _sorteio(rng: random.Random, quantidade: int, sortear: Callable[[random.Random], object]):
+    return [sortear(rng) for _ in range(quantidade)]
+
+
+def _mes(rng: random.Random, anos: int):
+    return rng.randrange(INICIO.year, INICIO.year + anos), rng.randrange(1, 13)
+
+
+def _amostra_ids(caminho, na_lixeira: bool, quantidade: int,
+                 rng: random.Random) -> List[int]:
+    con = sqlite3.connect(str(caminho))
+    try:
+        ids = [row[0] for row in con.execute(
+            'SELECT id FROM "transaction" WHERE deleted_at IS '
+            f'{"NOT NULL" if na_lixeira else "NULL"}')]
+    finally:
+        con.close()
+    return rng.sample(ids, min(quantidade, len(ids)))
+
+
+def _csv_importacao(i: int) -> str:
+    linhas = ['date,description,amount,category']
+    for k in range(LINHAS_IMPORTACAO):
+        linhas.append(f'2024-{k % 12 + 1:02d}-{k % 28 + 1:02d},Importado {i}-{k},'
+                      f'-{k + 1}.50,Outros')
+    return '\n'.join(linhas) + '\n'
+
+
+def _construir_estaticos(app_modulo, pasta: Path) -> Dict[str, str]:
+    """Roda o build-assets numa cópia de static/ e aponta o app para ela"""
+    estaticos = importlib.import_module('estaticos')
+    copia = pasta / 'static'
+    shutil.copytree(app_modulo.STATIC_DIR, copia,
+                    ignore=shutil.ignore_patterns(estaticos.PASTA_SAIDA))
+    estaticos.construir(copia)
+    app_modulo.ASSETS_DIR = copia / estaticos.PASTA_SAIDA
+    app_modulo.asset_manifest.clear()
+    app_modulo.asset_manifest.update(estaticos.carregar_manifesto(copia))
+    return app_modulo.asset_manifest
+
+
+def _lote(ids: List[int], i: int) -> List[int]:
+    """Os LINHAS_LOTE ids da iteração i, voltando ao início da amostra"""
+    return [ids[(i * LINHAS_LOTE + k) % len(ids)] for k in range(LINHAS_LOTE)]
+
+
+def cenarios_app(app_modulo, caminho, args, contador: Contador):
+    """Cenários das rotas do Flask; devolve (cenários, limpar)"""
+    app = app_modulo.app
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    # Em todos os engines: cada livro nomeado tem o seu
+    event.listen(Engine, 'before_cursor_execute', contador.sqlalchemy)
+    cliente = app.test_client()
+    n = args.iteracoes + 1
+    rng = random.Random(args.semente)
+    meses = _sorteio(rng, n, lambda r: _mes(r, args.anos))
+    termos = gerador.palavras(args.semente)
+    busca = [next(termos) for _ in range(n)]
+    ativas = _amostra_ids(caminho, False, n, rng)
+    lixeira = _amostra_ids(caminho, True, n, rng)
+    lixeira_lote = _amostra_ids(caminho, True, n * LINHAS_LOTE, rng)
+    estilo = _construir_estaticos(app_modulo, caminho.parent)['style.css']
+    comprimido = {'Accept-Encoding': 'br, gzip'}
+
+    def get(url, **kwargs):
+        resposta = cliente.get(url, **kwargs)
+        resposta.get_data()
+        if resposta.status_code >= 400:
+            raise RuntimeError(f'{url}: HTTP {resposta.status_code}')
+
+    def post(url, **kwargs):
+        resposta = cliente.post(url, **kwargs)
+        if resposta.status_code >= 400:
+            raise RuntimeError(f'{url}: HTTP {resposta.status_code}')
+
+    def adicionar(i):
+        ano, mes = meses[i]
+        post('/add', data={'description': f'Benchmark {i}', 'amount': '12.34',
+                           'category': 'Outros', 'type': 'expense',
+                           'transaction_date': f'{ano}-{mes:02d}-15'})
+
+    def importar(i):
+        arquivo = io.BytesIO(_csv_importacao(i).encode())
+        post('/importar', data={'arquivo': (arquivo, 'extrato.csv')},
+             content_type='multipart/form-data')
+
+    def esvaziar(i):
+        # O expurgo roda em segundo plano; mede até o último lote
+        post('/empty-trash')
+        while app_modulo.default_ledger.trash_purge.progresso['rodando']:
+            time.sleep(0.001)
+
+    def lote(acao, i, **filtro):
+        post(f'/bulk/{acao}', data=filtro or {'ids': _lote(lixeira_lote, i)},
+             headers={'Accept': 'application/json'})
+
+    def cursor_meio(i):
+        ano, mes = meses[i]
+        return f'{ano}-{mes:02d}-15_{10 ** 12}'
+
+    cenarios = [
+        Cenario('app GET /', lambda i: get('/')),
+        Cenario('app GET /extrato (mês)',
+                lambda i: get('/extrato?year={}&month={}'.format(*meses[i]))),
+        Cenario('app GET /extrato (mês, br)',
+                lambda i: get('/extrato?year={}&month={}'.format(*meses[i]), headers=comprimido)),
+        Cenario('app GET /extrato (ano, despesas)',
+                lambda i: get(f'/extrato?year={meses[i][0]}&type=expense')),
+        Cenario('app GET /extrato (página no meio)',
+                lambda i: get(f'/extrato?after={cursor_meio(i)}')),
+        Cenario('app GET /extrato (stream, ano)',
+                lambda i: get(f'/extrato?year={meses[i][0]}&stream=1')),
+        Cenario('app GET /extrato/export (csv, ano)',
+                lambda i: get(f'/extrato/export?year={meses[i][0]}&format=csv')),
+        Cenario('app GET /buscar', lambda i: get(f'/buscar?q={busca[i]}')),
+        Cenario('app GET /relatorios', lambda i: get(f'/relatorios?year={meses[i][0]}')),
+        Cenario('app GET /saldo (ano)',
+                lambda i: get(f'/saldo?inicio={meses[i][0]}-01-01&fim={meses[i][0]}-12-31')),
+        Cenario('app GET /orcamentos (mês)',
+                lambda i: get('/orcamentos?year={}&month={}'.format(*meses[i]))),
+        Cenario('app GET /lixeira', lambda i: get('/lixeira')),
+        Cenario('app GET /metrics', lambda i: get('/metrics')),
+        Cenario('app GET /assets (css, br)',
+                lambda i: get(f'/assets/{estilo}', headers=comprimido)),
+        Cenario('app GET / (X-Ledger)', lambda i: get('/', headers={'X-Ledger': LIVRO})),
+        Cenario('app GET /livro/<nome> e /livro/',
+                lambda i: (get(f'/livro/{LIVRO}'), get('/livro/'))),
+        Cenario('app POST /add', adicionar),
+        Cenario('app POST /importar (100 linhas)', importar),
+        Cenario('app POST /orcamentos',
+                lambda i: post('/orcamentos', data={'category': 'Outros', 'amount': f'{300 + i}.00'})),
+        Cenario('app GET /delete', lambda i: get(f'/delete/{ativas[i % len(ativas)]}')),
+        Cenario('app GET /restore', lambda i: get(f'/restore/{ativas[i % len(ativas)]}')),
+        Cenario('app GET /permanent-delete',
+                lambda i: get(f'/permanent-delete/{lixeira[i % len(lixeira)]}')),
+        Cenario('app POST /bulk/delete (filtro, mês)',
+                lambda i: lote('delete', i, scope='filter', year=meses[i][0], month=meses[i][1])),
+        Cenario('app POST /bulk/restore (filtro, mês)',
+                lambda i: lote('restore', i, scope='filter', year=meses[i][0], month=meses[i][1])),
+        Cenario(f'app POST /bulk/permanent-delete ({LINHAS_LOTE} ids)',
+                lambda i: lote('permanent-delete', i)),
+        Cenario('app POST /empty-trash (até concluir)', esvaziar, unico=True),
+    ]
+    # Reservado durante toda a execução, para limpar também o cache dele
+    livro = app_modulo.ledgers.reservar(LIVRO)
+
+    def limpar():
+        app_modulo.default_ledger.result_cache.limpar()
+        livro.result_cache.limpar()
+    return cenarios, limpar
+
+
+def cenarios_dados(gerenciador, caminho, args, contador: Contador):
+    """Cenários da API de GerenciadorTransacoes; devolve (cenários, limpar)"""
+    gerenciador.con.set_trace_callback(contador.sqlite)
+    n = args.iteracoes + 1
+    rng = random.Random(args.semente)
+    meses = _sorteio(rng, n, lambda r: _mes(r, args.anos))
+    termos = gerador.palavras(args.semente)
+    busca = [next(termos) for _ in range(n)]
+    ativas = _amostra_ids(caminho, False, n, rng)
+    lixeira = _amostra_ids(caminho, True, n, rng)
+    lixeira_lote = _amostra_ids(caminho, True, n * LINHAS_LOTE, rng)
+
+    def adicionar(i):
+        ano, mes = meses[i]
+        gerenciador.adicionar_transacao({'description': f'Benchmark {i}', 'amount': 12.34,
+                                         'category': 'Outros', 'type': 'expense',
+                                         'date': f'{ano}-{mes:02d}-15'})
+
+    cenarios = [
+        Cenario('dados obter_ultimas_transacoes', lambda i: gerenciador.obter_ultimas_transacoes()),
+        Cenario('dados obter_transacoes_filtradas (mês)',
+                lambda i: gerenciador.obter_transacoes_filtradas(meses[i][1], meses[i][0])),
+        Cenario('dados obter_transacoes_filtradas (ano)',
+                lambda i: gerenciador.obter_transacoes_filtradas(None, meses[i][0])),
+        Cenario('dados obter_total_por_tipo (ano)',
+                lambda i: gerenciador.obter_total_por_tipo('expense', None, meses[i][0])),
+        Cenario('dados obter_anos_disponiveis', lambda i: gerenciador.obter_anos_disponiveis()),
+        Cenario('dados obter_saldo_em',
+                lambda i: gerenciador.obter_saldo_em(date(meses[i][0], meses[i][1], 15))),
+        Cenario('dados obter_serie_saldo (ano)',
+                lambda i: gerenciador.obter_serie_saldo(date(meses[i][0], 1, 1),
+                                                        date(meses[i][0], 12, 31))),
+        Cenario('dados obter_orcamentos (mês)',
+                lambda i: gerenciador.obter_orcamentos(meses[i][1], meses[i][0])),
+        Cenario('dados buscar', lambda i: gerenciador.buscar(busca[i])),
+        Cenario('dados obter_transacoes_removidas',
+                lambda i: gerenciador.obter_transacoes_removidas()),
+        Cenario('dados adicionar_transacao', adicionar),
+        Cenario('dados importar_extrato (100 linhas)',
+                lambda i: gerenciador.importar_extrato(io.StringIO(_csv_importacao(i)))),
+        Cenario('dados definir_orcamento',
+                lambda i: gerenciador.definir_orcamento('Outros', 300 + i)),
+        Cenario('dados remover_transacao',
+                lambda i: gerenciador.remover_transacao(ativas[i % len(ativas)])),
+        Cenario('dados restaurar_transacao',
+                lambda i: gerenciador.restaurar_transacao(ativas[i % len(ativas)])),
+        Cenario('dados excluir_permanentemente',
+                lambda i: gerenciador.excluir_permanentemente(lixeira[i % len(lixeira)])),
+        Cenario('dados remover_em_lote (mês)',
+                lambda i: gerenciador.remover_em_lote(mes=meses[i][1], ano=meses[i][0])),
+        Cenario('dados restaurar_em_lote (mês)',
+                lambda i: gerenciador.restaurar_em_lote(mes=meses[i][1], ano=meses[i][0])),
+        Cenario(f'dados excluir_em_lote ({LINHAS_LOTE} ids)',
+                lambda i: gerenciador.excluir_em_lote(_lote(lixeira_lote, i))),
+        Cenario('dados esvaziar_lixeira', lambda i: gerenciador.esvaziar_lixeira(), unico=True),
+    ]
+    return cenarios, gerenciador.cache.limpar
+
+
+def preparar_app(pasta: Path, args):
+    """Cria o banco do app com o livro sintético e importa o módulo app"""
+    caminho = pasta / 'app.db'
+    os.environ['DATABASE_PATH'] = str(caminho)
+    # Sem expurgo automático: a lixeira gerada tem itens antigos
+    os.environ['TRASH_RETENTION_DAYS'] = '0'
+    os.environ['LEDGERS_DIR'] = str(pasta / 'ledgers')
+    app_modulo = importlib.import_module('app')
+    migracoes = importlib.import_module('migracoes')
+    migracoes.migrar(caminho)
+    app_modulo.LEDGERS_DIR.mkdir()
+    migracoes.migrar(importlib.import_module('livros').caminho(app_modulo.LEDGERS_DIR, LIVRO))
+    gerador.popular_app(caminho, args.linhas, semente=args.semente, anos=args.anos,
+                        fracao_lixeira=args.lixeira)
+    con = sqlite3.connect(str(caminho))
+    try:
+        gerador.popular_orcamentos(con)
+    finally:
+        con.close()
+    with app_modulo.app.app_context():
+        app_modulo.rebuild_summary()
+        app_modulo.rebuild_balance()
+    return app_modulo, caminho
+
+
+def preparar_dados(pasta: Path, args):
+    """Cria financas.db (e os arquivos de backup) dentro da pasta temporária"""
+    os.chdir(pasta)
+    dados = importlib.import_module('dados')
+    importlib.import_module('migracoes').migrar(dados.CAMINHO_BANCO)
+    gerenciador = dados.GerenciadorTransacoes()
+    gerador.popular_dados(gerenciador.con, args.linhas, semente=args.semente,
+                          anos=args.anos, fracao_lixeira=args.lixeira)
+    gerador.popular_orcamentos(gerenciador.con)
+    gerenciador.reconstruir_resumo()
+    gerenciador.reconstruir_saldo()
+    return gerenciador, pasta / 'financas.db'
+
+
+def _commit() -> Optional[str]:
+    try:
+        saida = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=RAIZ,
+                               capture_output=True, text=True, check=True)
+        return saida.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(args) -> Dict:
+    sys.path.insert(0, str(RAIZ))
+    resultados = []
+    origem = os.getcwd()
+    with tempfile.TemporaryDirectory() as pasta:
+        pasta = Path(pasta)
+        try:
+            grupos = []
+            if 'app' in args.alvos:
+                inicio = time.perf_counter()
+                app_modulo, caminho = preparar_app(pasta, args)
+                print(f'app: {args.linhas} linhas geradas em {time.perf_counter() - inicio:.1f}s')
+                contador = Contador()
+                grupos.append((contador, *cenarios_app(app_modulo, caminho, args, contador)))
+            if 'dados' in args.alvos:
+                inicio = time.perf_counter()
+                gerenciador, caminho = preparar_dados(pasta, args)
+                print(f'dados: {args.linhas} linhas geradas em {time.perf_counter() - inicio:.1f}s')
+                contador = Contador()
+                grupos.append((contador, *cenarios_dados(gerenciador, caminho, args, contador)))
+
+            for contador, cenarios, limpar in grupos:
+                for cenario in cenarios:
+                    if args.filtro and not any(f in cenario.nome for f in args.filtro):
+                        continue
+                    resultado = medir(cenario, args.iteracoes, contador,
+                                      (lambda: None) if args.com_cache else limpar)
+                    resultados.append(resultado)
+                    print(f"{resultado['cenario']:42} p50={resultado['p50_ms']:>9.2f}ms "
+                          f"p99={resultado['p99_ms']:>9.2f}ms "
+                          f"consultas={resultado['consultas']:>7.1f} "
+                          f"memória={resultado['memoria_pico_kib']:>10.1f}KiB")
+            if 'dados' in args.alvos:
+                gerenciador.conexoes.fechar_todas()
+        finally:
+            os.chdir(origem)
+
+    return {
+        'meta': {
+            'commit': _commit(),
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'plataforma': platform.platform(),
+            'linhas': args.linhas,
+            'anos': args.anos,
+            'lixeira': args.lixeira,
+            'semente': args.semente,
+            'iteracoes': args.iteracoes,
+            'com_cache': args.com_cache,
+        },
+        'resultados': resultados,
+    }
+
+
+def comparar(antes: Path, depois: Path):
+    """Mostra a variação de cada métrica entre dois arquivos de resultados"""
+    a, b = (json.loads(Path(p).read_text()) for p in (antes, depois))
+    print(f"{a['meta']['commit']} -> {b['meta']['commit']}")
+    anteriores = {r['cenario']: r for r in a['resultados']}
+    for atual in b['resultados']:
+        anterior = anteriores.get(atual['cenario'])
+        if not anterior:
+            print(f"{atual['cenario']:42} (novo)")
+            continue
+        partes = []
+        for metrica in ('p50_ms', 'p99_ms', 'consultas', 'memoria_pico_kib'):
+            x, y = anterior[metrica], atual[metrica]
+            variacao = f'{(y - x) / x * 100:+.0f}%' if x else 'n/a'
+            partes.append(f'{metrica}={x}->{y} ({variacao})')
+        print(f"{atual['cenario']:42} " + ' '.join(partes))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=10_000,
+                        help='Transações geradas (de 10^4 a 10^7)')
+    parser.add_argument('--anos', type=int, default=10)
+    parser.add_argument('--lixeira', type=float, default=0.05, help='Fração na lixeira')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--iteracoes', type=int, default=50)
+    parser.add_argument('--alvos', nargs='+', choices=['app', 'dados'], default=['app', 'dados'])
+    parser.add_argument('--filtro', nargs='+', help='Só cenários cujo nome contém um destes textos')
+    parser.add_argument('--com-cache', action='store_true',
+                        help='Mantém os caches de resultados entre as execuções')
+    parser.add_argument('--json', type=Path, help='Salva os resultados neste arquivo')
+    parser.add_argument('--comparar', nargs=2, type=Path, metavar=('ANTES', 'DEPOIS'))
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+    relatorio = executar(args)
+    if args.json:
+        args.json.write_text(json.dumps(relatorio, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import re
+from typing import List, Optional
+
+# remove_diacritics: "saude" encontra "Saúde"
+TOKENIZADOR = "unicode61 remove_diacritics 2"
+
+_PALAVRA = re.compile(r'\w+', re.UNICODE)
+
+
+def expressao_fts(texto: str) -> Optional[str]:
+    """Converte o texto digitado em uma consulta FTS5 segura.
+
+    Cada palavra vira um prefixo entre aspas ("uber"* casa com "Uber Trip"),
+    e todas precisam aparecer. Operadores digitados pelo usuário são ignorados.
+    """
+    palavras = _PALAVRA.findall(texto or '')
+    if not palavras:
+        return None
+    return ' '.join(f'"{p}"*' for p in palavras)
+
+
+def ddl_fts(tabela: str, id: str, colunas: List[str]) -> List[str]:
+    """Tabela FTS5 de conteúdo externo e os gatilhos que a mantêm em sincronia.
+
+    Só alterações nas colunas indexadas atualizam o índice; exclusões lógicas
+    (que mudam apenas a data de remoção) não custam nada.
+    """
+    fts = f'{tabela}_fts'
+    lista = ', '.join(colunas)
+    novos = ', '.join(f'new.{c}' for c in colunas)
+    antigos = ', '.join(f'old.{c}' for c in colunas)
+    return [
+        f'''CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {lista}, content='{tabela}', content_rowid='{id}',
+                tokenize='{TOKENIZADOR}'
+            )''',
+        f'''CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON "{tabela}" BEGIN
+                INSERT INTO {fts} (rowid, {lista}) VALUES (new.{id}, {novos});
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON "{tabela}" BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {lista}) VALUES ('delete', old.{id}, {antigos});
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {lista} ON "{tabela}" BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {lista}) VALUES ('delete', old.{id}, {antigos});
+                INSERT INTO {fts} (rowid, {lista}) VALUES (new.{id}, {novos});
+            END''',
+    ]
+
+
+def ddl_reconstruir(tabela: str) -> str:
+    """Reindexa a tabela inteira (usado quando o índice acaba de ser criado)"""
+    return f"INSERT INTO {tabela}_fts ({tabela}_fts) VALUES ('rebuild')"
@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+
+class CacheVersionado:
+    """Cache LRU em memória cujas entradas valem para uma versão dos dados.
+
+    Toda escrita incrementa a versão (guardada no banco, para valer entre
+    processos); ao ver uma versão nova o cache descarta o conteúdo anterior.
+    """
+
+    def __init__(self, max_itens: int = 256):
+        self.max_itens = max_itens
+        self.acertos = 0
+        self.falhas = 0
+        self._versao = None
+        self._itens: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave: Hashable, versao: int, calcular: Callable[[], object]):
+        with self._trava:
+            if versao != self._versao:
+                if self._versao is None or versao > self._versao:
+                    self._itens.clear()
+                    self._versao = versao
+            elif chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave]
+            self.falhas += 1
+
+        valor = calcular()
+
+        with self._trava:
+            # Não guarda resultados de uma versão já ultrapassada
+            if versao == self._versao:
+                self._itens[chave] = valor
+                self._itens.move_to_end(chave)
+                while len(self._itens) > self.max_itens:
+                    self._itens.popitem(last=False)
+        return valor
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self._versao = None
+
+    def estatisticas(self) -> Dict[str, float]:
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': self.acertos / consultas if consultas else 0.0,
+                'itens': len(self._itens),
+                'max_itens': self.max_itens,
+                'versao': self._versao,
+            }
@@ -0,0 +1,104 @@
+import os
+import sqlite3
+import threading
+import weakref
+
+from sqlalchemy import event
+
+# Aplicados a toda conexão aberta, tanto pelo engine do app quanto por dados.py.
+# WAL permite leituras em paralelo com uma escrita; NORMAL só sincroniza o
+# disco nos checkpoints, o que é seguro com WAL.
+PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': -int(os.getenv('SQLITE_CACHE_KIB', 64 * 1024)),
+    'temp_store': 'MEMORY',
+}
+
+
+def configurar_conexao(con, pragmas=None):
+    """Aplica os PRAGMAs de desempenho a uma conexão recém-aberta"""
+    for nome, valor in (pragmas or PRAGMAS).items():
+        con.execute(f'PRAGMA {nome} = {valor}')
+
+
+def conectar(caminho, pragmas=None, **kwargs) -> sqlite3.Connection:
+    kwargs.setdefault('timeout', PRAGMAS['busy_timeout'] / 1000)
+    kwargs.setdefault('check_same_thread', False)
+    con = sqlite3.connect(str(caminho), **kwargs)
+    configurar_conexao(con, pragmas)
+    return con
+
+
+def instalar_no_engine(engine, pragmas=None):
+    """Faz o engine do SQLAlchemy aplicar os mesmos PRAGMAs em cada conexão do pool"""
+    @event.listens_for(engine, 'connect')
+    def _ao_conectar(dbapi_con, registro):
+        configurar_conexao(dbapi_con, pragmas)
+
+
+class _Guarda:
+    """Guarda a conexão no threading.local: quando a thread termina, o Python
+    descarta os dados locais dela, a guarda é coletada e a conexão fechada"""
+    __slots__ = ('con', '__weakref__')
+
+    def __init__(self, con):
+        self.con = con
+
+
+def _fechar(abertas, trava, con):
+    with trava:
+        abertas.discard(con)
+    try:
+        con.close()
+    except sqlite3.ProgrammingError:
+        pass
+
+
+class ConexoesPorThread:
+    """Uma conexão SQLite por thread, aberta sob demanda e fechada quando
+    a thread termina.
+
+    Conexões não são compartilhadas entre threads, então leitores não
+    esperam uns pelos outros e só as escritas disputam o lock do banco.
+    As conexões pertencem a este objeto e fecham junto com ele; para uma
+    conexão avulsa, use conectar().
+    """
+
+    def __init__(self, caminho, pragmas=None, **kwargs):
+        self.caminho = caminho
+        self.pragmas = pragmas
+        self.kwargs = kwargs
+        self._local = threading.local()
+        self._abertas = set()
+        self._trava = threading.Lock()
+
+    def obter(self) -> sqlite3.Connection:
+        guarda = getattr(self._local, 'guarda', None)
+        if guarda is None:
+            con = conectar(self.caminho, self.pragmas, **self.kwargs)
+            guarda = self._local.guarda = _Guarda(con)
+            with self._trava:
+                self._abertas.add(con)
+            # Sem referência a self: o finalizador não mantém este objeto vivo
+            weakref.finalize(guarda, _fechar, self._abertas, self._trava, con)
+        return guarda.con
+
+    @property
+    def abertas(self) -> int:
+        """Quantidade de conexões abertas (uma por thread viva que usou o banco)"""
+        with self._trava:
+            return len(self._abertas)
+
+    def fechar_todas(self):
+        with self._trava:
+            abertas = list(self._abertas)
+            self._abertas.clear()
+        for con in abertas:
+            try:
+                con.close()
+            except sqlite3.ProgrammingError:
+                pass
+        self._local = threading.local()
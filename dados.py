@@ -1,215 +1,839 @@
+import os
 import sqlite3
 import json
+from collections import Counter
+from contextlib import contextmanager
 from pathlib import Path
-from datetime import datetime, date
+from datetime import datetime, date, timezone
+from decimal import Decimal
 from typing import List, Dict, Optional
 
+from periodos import intervalo_periodo
+from backup import RegistroAlteracoes
+from conexao import ConexoesPorThread
+from cache import CacheVersionado
+import importacao
+import busca
+import saldo
+import orcamento
+import limpeza
+import migracoes
+import fila_escrita
+import dinheiro
+import livros
+
+CAMINHO_BANCO = "financas.db"
+# Um banco (e um log de backup) por livro, ver livros.py
+PASTA_LIVROS = Path(os.getenv('DADOS_LEDGERS_DIR', 'ledgers'))
+# No banco e nos backups, valores (amount, totais e saldos) são centavos
+# inteiros (ver dinheiro.py); a API de GerenciadorTransacoes recebe e
+# devolve reais, estes como Decimal exato
+COLUNAS_BACKUP = "id, description, amount, category, type, date, deleted_at"
+
+
+def _em_centavos(linha: list) -> list:
+    """Converte o valor de uma linha de backup anterior aos centavos"""
+    linha[2] = dinheiro.centavos(linha[2])
+    return linha
+
+
+def _em_reais(transacao: Dict) -> Dict:
+    """Cópia da transação com amount em reais"""
+    return {**transacao, 'amount': dinheiro.reais(transacao['amount'])}
+
 class GerenciadorTransacoes:
     _instance = None
     
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance.inicializar()
+            instancia = super().__new__(cls)
+            instancia.inicializar()
+            cls._instance = instancia
         return cls._instance
     
-    def inicializar(self):
-        """Configura a conexão com o banco de dados e estrutura inicial"""
-        self.backup_file = Path("dados_backup.json")
-        self.con = sqlite3.connect("financas.db", check_same_thread=False)
-        self.criar_estrutura()
-        self.carregar_backup()
+    @classmethod
+    @contextmanager
+    def livro(cls, nome: str):
+        """Gerenciador do livro `nome`, reservado durante o bloco.
         
-    def criar_estrutura(self):
-        """Cria as tabelas necessárias se não existirem"""
+        Cada livro tem banco, log de backup, cache e fila de escrita próprios
+        em PASTA_LIVROS; os abertos ficam num LRU limitado (ver livros.py).
+        O livro é criado por `flask --app app migrate --dados --ledger NOME`.
+        """
+        with _livros_abertos.usar(nome) as gerenciador:
+            yield gerenciador
+    
+    @classmethod
+    def _abrir_livro(cls, nome: str) -> 'GerenciadorTransacoes':
+        instancia = super().__new__(cls)
+        instancia.inicializar(livros.existente(PASTA_LIVROS, nome),
+                              PASTA_LIVROS / f'{nome}_backup.json')
+        return instancia
+    
+    def inicializar(self, caminho_banco=CAMINHO_BANCO, backup_file="dados_backup.json"):
+        """Configura a conexão com o banco de dados.
+        
+        Não cria tabelas nem relê o backup: isso é feito uma vez por
+        `flask --app app migrate --dados` (ver migracoes.py).
+        """
+        self.backup_file = Path(backup_file)
+        self.registro = RegistroAlteracoes(self.backup_file)
+        self.cache = CacheVersionado()
+        # BEGIN IMMEDIATE: escritas pegam o lock logo no início e esperam
+        # (busy_timeout) em vez de falhar ao promover uma leitura
+        self.conexoes = ConexoesPorThread(caminho_banco, isolation_level='IMMEDIATE')
+        self.expurgo = limpeza.TarefaExpurgo(self._expurgar_lote, self._contar_lixeira)
+        # Com WRITE_QUEUE=1, inserções e exclusões lógicas saem em lotes (ver fila_escrita)
+        self.fila = fila_escrita.FilaEscrita(self._gravar_lote) if fila_escrita.ATIVA else None
+        migracoes.verificar(self.con, 'flask --app app migrate --dados')
+        
+    @property
+    def con(self) -> sqlite3.Connection:
+        """Conexão da thread atual"""
+        return self.conexoes.obter()
+    
+    def fechar(self):
+        """Grava o que estiver na fila de escrita e fecha as conexões"""
+        if self.fila:
+            self.fila.fechar()
+        self.conexoes.fechar_todas()
+    
+    def _aplicar_resumo(self, cursor, filtro: str, params, sinal: int,
+                        removidas: bool = False):
+        """Soma (sinal=1) ou subtrai (sinal=-1) do resumo mensal e do saldo
+        diário as transações ativas (ou, com removidas=True, as da lixeira)
+        que atendem ao filtro, na transação corrente do cursor"""
+        cursor.execute(f"""
+            INSERT INTO monthly_summary (year, month, type, category, total, count)
+            SELECT CAST(strftime('%Y', date) AS INTEGER),
+                   CAST(strftime('%m', date) AS INTEGER),
+                   type, category, ? * SUM(amount), ? * COUNT(*)
+            FROM "transaction"
+            WHERE deleted_at IS {'NOT NULL' if removidas else 'NULL'} AND ({filtro})
+            GROUP BY 1, 2, 3, 4
+            ON CONFLICT (year, month, type, category) DO UPDATE SET
+                total = total + excluded.total,
+                count = count + excluded.count
+        """, (sinal, sinal, *params))
+        cursor.execute(f"""
+            SELECT date, SUM({saldo.VALOR_ASSINADO}), COUNT(*)
+            FROM "transaction"
+            WHERE deleted_at IS {'NOT NULL' if removidas else 'NULL'} AND ({filtro})
+            GROUP BY date
+        """, params)
+        self._somar_saldo(cursor, {dia: (liquido, qtd) for dia, liquido, qtd in cursor.fetchall()},
+                          sinal)
+    
+    def _somar_saldo(self, cursor, dias: Dict, sinal: int = 1):
+        """Soma ao saldo diário dias já agregados ({data ISO: (líquido, quantidade)})
+        e reacumula o saldo a partir do mais antigo deles"""
+        if not dias:
+            return
+        linhas = saldo.parametros(dias, sinal)
+        cursor.executemany(saldo.SOMAR_DIA, linhas)
+        cursor.executemany(saldo.REMOVER_VAZIO, linhas)
+        cursor.execute(saldo.ACUMULAR, {'desde': min(dias)})
+    
+    def _somar_resumo(self, cursor, grupos: Dict):
+        """Soma ao resumo mensal grupos já agregados por (ano, mes, tipo, categoria)"""
+        cursor.executemany("""
+            INSERT INTO monthly_summary (year, month, type, category, total, count)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (year, month, type, category) DO UPDATE SET
+                total = total + excluded.total,
+                count = count + excluded.count
+        """, [(*k, total, qtd) for k, (total, qtd) in grupos.items()])
+    
+    def reconstruir_resumo(self, verificar: bool = False) -> List[tuple]:
+        """Recalcula o resumo mensal a partir das transações.
+        
+        Retorna as divergências encontradas; com verificar=True apenas compara.
+        """
         cursor = self.con.cursor()
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS transacoes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                descricao TEXT NOT NULL,
-                valor REAL NOT NULL,
-                categoria TEXT NOT NULL,
-                tipo TEXT NOT NULL,
-                data DATE NOT NULL,
-                removido_em DATETIME
-            )
+            SELECT CAST(strftime('%Y', date) AS INTEGER),
+                   CAST(strftime('%m', date) AS INTEGER),
+                   type, category, SUM(amount), COUNT(*)
+            FROM "transaction"
+            WHERE deleted_at IS NULL
+            GROUP BY 1, 2, 3, 4
+        """)
+        esperado = {tuple(row[:4]): tuple(row[4:]) for row in cursor.fetchall()}
+        cursor.execute("""
+            SELECT year, month, type, category, total, count
+            FROM monthly_summary
+            WHERE count != 0
         """)
-        self.con.commit()
+        atual = {tuple(row[:4]): tuple(row[4:]) for row in cursor.fetchall()}
+        
+        divergencias = []
+        for chave in sorted(esperado.keys() | atual.keys()):
+            total_esperado, qtd_esperada = esperado.get(chave, (0, 0))
+            total_atual, qtd_atual = atual.get(chave, (0, 0))
+            if (total_esperado, qtd_esperada) != (total_atual, qtd_atual):
+                divergencias.append((chave, (total_esperado, qtd_esperada), (total_atual, qtd_atual)))
+        
+        if not verificar:
+            migracoes.reconstruir_resumo(cursor)
+            self.con.commit()
+            self.cache.limpar()
+        return divergencias
+        
+    def reconstruir_saldo(self, verificar: bool = False) -> List[tuple]:
+        """Recalcula o saldo diário acumulado a partir das transações.
         
+        Retorna as divergências encontradas; com verificar=True apenas compara.
+        """
+        cursor = self.con.cursor()
+        divergencias = saldo.divergencias(
+            cursor.execute(saldo.ESPERADO).fetchall(),
+            cursor.execute("SELECT date, net, count, balance FROM daily_balance").fetchall()
+        )
+        if not verificar:
+            migracoes.reconstruir_saldo(cursor)
+            self.con.commit()
+            self.cache.limpar()
+        return divergencias
+    
+    def reconstruir_orcamentos(self, verificar: bool = False) -> List[tuple]:
+        """Recalcula o gasto mensal das categorias com orçamento a partir das transações.
+        
+        Retorna as divergências encontradas; com verificar=True apenas compara.
+        """
+        cursor = self.con.cursor()
+        divergencias = orcamento.divergencias(
+            cursor.execute(orcamento.ESPERADO).fetchall(),
+            cursor.execute(orcamento.GRAVADO).fetchall()
+        )
+        if not verificar:
+            for sql in orcamento.RECONSTRUIR:
+                cursor.execute(sql)
+            self.con.commit()
+            self.cache.limpar()
+        return divergencias
+    
+    def _seq_backup(self) -> int:
+        """Última alteração do log de backup já refletida neste banco"""
+        return self.con.execute(
+            "SELECT version FROM data_version WHERE id = 1"
+        ).fetchone()[0]
+    
+    def versao_dados(self) -> int:
+        """Versão dos dados (data_version): a seq do log de backup, incrementada a cada escrita"""
+        return self._seq_backup()
+    
+    def _em_cache(self, chave, calcular):
+        return self.cache.obter(chave, self.versao_dados(), calcular)
+    
+    def estatisticas_cache(self) -> Dict:
+        return self.cache.estatisticas()
+    
+    def _confirmar(self, cursor, registros: List[Dict]):
+        """Confirma a transação corrente e anexa as alterações ao log de backup"""
+        with self.registro.trava:
+            if registros:
+                cursor.execute("""
+                    UPDATE data_version SET version = version + ?, updated_at = ?
+                    WHERE id = 1
+                    RETURNING version
+                """, (len(registros), datetime.now(timezone.utc).replace(tzinfo=None)))
+                ultima = cursor.fetchone()[0]
+                for seq, registro in enumerate(registros, start=ultima - len(registros) + 1):
+                    registro['seq'] = seq
+            self.con.commit()
+            if registros:
+                try:
+                    self.registro.anexar(registros)
+                except Exception as e:
+                    print(f"Erro ao salvar backup: {e}")
+        if self.registro.precisa_compactar():
+            self.salvar_backup()
+    
+    def _carregar_backup_legado(self):
+        """Carrega o antigo dados_backup.json (JSON único) e o converte em snapshot"""
+        try:
+            with open(self.backup_file, 'r') as f:
+                backup = json.load(f)
+            
+            cursor = self.con.cursor()
+            cursor.executemany(f"""
+                INSERT OR IGNORE INTO "transaction" ({COLUNAS_BACKUP})
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [_em_centavos(list(linha)) for linha in backup.get('transacoes', [])])
+            if cursor.rowcount:
+                self.reconstruir_resumo()
+                self.reconstruir_saldo()
+            self.con.commit()
+            self.salvar_backup()
+        except Exception as e:
+            print(f"Erro ao carregar backup: {e}")
+    
+    def _reaplicar(self, cursor, registro: Dict):
+        operacao = registro['op']
+        if operacao == 'inserir':
+            linha = registro['linha'] if registro.get('centavos') else _em_centavos(registro['linha'])
+            cursor.execute(f"""
+                INSERT OR REPLACE INTO "transaction" ({COLUNAS_BACKUP})
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, linha)
+        elif operacao == 'remover':
+            cursor.execute('UPDATE "transaction" SET deleted_at = ? WHERE id = ?',
+                           (registro['em'], registro['id']))
+        elif operacao == 'restaurar':
+            cursor.execute('UPDATE "transaction" SET deleted_at = NULL WHERE id = ?',
+                           (registro['id'],))
+        elif operacao == 'excluir':
+            cursor.execute('DELETE FROM "transaction" WHERE id = ?', (registro['id'],))
+        elif operacao == 'esvaziar':
+            cursor.execute('DELETE FROM "transaction" WHERE deleted_at IS NOT NULL')
+        elif operacao in ('expurgar', 'excluir_lote'):
+            cursor.executemany('DELETE FROM "transaction" WHERE id = ?',
+                               ((id,) for id in registro['ids']))
+        elif operacao == 'remover_lote':
+            cursor.executemany('UPDATE "transaction" SET deleted_at = ? WHERE id = ?',
+                               ((registro['em'], id) for id in registro['ids']))
+        elif operacao == 'restaurar_lote':
+            cursor.executemany('UPDATE "transaction" SET deleted_at = NULL WHERE id = ?',
+                               ((id,) for id in registro['ids']))
+        elif operacao == 'orcamento':
+            self._gravar_orcamento(cursor, registro['categoria'], registro['valor'])
+    
     def carregar_backup(self):
-        """Carrega dados de backup se existir"""
-        if self.backup_file.exists():
-            try:
-                with open(self.backup_file, 'r') as f:
-                    backup = json.load(f)
-                
-                cursor = self.con.cursor()
-                cursor.executemany("""
-                    INSERT OR IGNORE INTO transacoes 
-                    (id, descricao, valor, categoria, tipo, data, removido_em)
+        """Restaura snapshot + log de alterações se o banco estiver desatualizado.
+        
+        Quando o banco já reflete a última alteração registrada, nada é lido
+        além do cabeçalho do snapshot e do fim do log.
+        """
+        # Sem snapshot (o log ainda não passou do limite de compactação), o
+        # snapshot vale como vazio na seq 0 e todo o log é reaplicado
+        if not self.registro.snapshot_file.exists():
+            if self.backup_file.exists():
+                self._carregar_backup_legado()
+            elif not self.registro.log_file.exists():
+                return
+        
+        seq_banco = self._seq_backup()
+        banco_vazio = not self.con.execute('SELECT 1 FROM "transaction" LIMIT 1').fetchone()
+        if self.registro.ultima_seq() <= seq_banco and not banco_vazio:
+            return
+        
+        try:
+            cursor = self.con.cursor()
+            seq_snapshot = self.registro.seq_snapshot()
+            if banco_vazio or seq_snapshot > seq_banco:
+                linhas = self.registro.ler_snapshot()
+                # Snapshots gravados antes dos centavos guardam o valor em reais
+                if not self.registro.cabecalho().get('centavos'):
+                    linhas = map(_em_centavos, linhas)
+                cursor.executemany(f"""
+                    INSERT OR REPLACE INTO "transaction" ({COLUNAS_BACKUP})
                     VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, backup.get('transacoes', []))
-                self.con.commit()
-            except Exception as e:
-                print(f"Erro ao carregar backup: {e}")
+                """, linhas)
+                orcamentos = self.registro.cabecalho().get('orcamentos')
+                if orcamentos is not None:
+                    cursor.execute("DELETE FROM budget")
+                    for categoria, valor in orcamentos.items():
+                        self._gravar_orcamento(cursor, categoria, valor)
+                # O log depois do snapshot vale mesmo que o banco já estivesse
+                # além dele (ex.: banco vazio após excluir tudo): sem isso, as
+                # exclusões definitivas registradas depois se perderiam
+                seq_banco = seq_snapshot
+            for registro in self.registro.ler_log(desde=seq_banco):
+                self._reaplicar(cursor, registro)
+                seq_banco = registro['seq']
+            cursor.execute("UPDATE data_version SET version = ? WHERE id = 1", (seq_banco,))
+            self.reconstruir_resumo()
+            self.reconstruir_saldo()
+        except Exception as e:
+            self.con.rollback()
+            print(f"Erro ao carregar backup: {e}")
     
     def salvar_backup(self):
-        """Salva um backup completo das transações"""
-        transacoes = self.obter_todas_transacoes(include_removed=True)
-        backup = {
-            'data_backup': datetime.now().isoformat(),
-            'transacoes': transacoes
-        }
-        
+        """Compacta o log de alterações em um novo snapshot completo"""
         try:
-            with open(self.backup_file, 'w') as f:
-                json.dump(backup, f, default=str)
+            with self.registro.trava:
+                cursor = self.con.cursor()
+                orcamentos = dict(cursor.execute("SELECT category, amount FROM budget"))
+                cursor.execute(f'SELECT {COLUNAS_BACKUP} FROM "transaction"')
+                self.registro.compactar(cursor, self._seq_backup(), centavos=True,
+                                        orcamentos=orcamentos)
         except Exception as e:
             print(f"Erro ao salvar backup: {e}")
 
     # Métodos CRUD
-    def adicionar_transacao(self, transacao: Dict):
-        """Adiciona uma nova transação"""
-        cursor = self.con.cursor()
+    def _inserir(self, cursor, transacao: Dict) -> Dict:
+        """Insere sem confirmar (amount em centavos); devolve o registro para o log de backup"""
+        centavos = dinheiro.exigir_centavos(transacao['amount'])
         cursor.execute("""
-            INSERT INTO transacoes (descricao, valor, categoria, tipo, data)
+            INSERT INTO "transaction" (description, amount, category, type, date)
             VALUES (?, ?, ?, ?, ?)
         """, (
             transacao['description'],
-            transacao['amount'],
+            centavos,
             transacao['category'],
             transacao['type'],
             transacao['date']
         ))
-        self.con.commit()
+        id = cursor.lastrowid
+        self._aplicar_resumo(cursor, "id = ?", (id,), 1)
+        return {'op': 'inserir', 'centavos': True, 'linha': [
+            id, transacao['description'], centavos, transacao['category'],
+            transacao['type'], transacao['date'], None
+        ]}
+    
+    def _remover(self, cursor, id: int) -> List[Dict]:
+        """Exclusão lógica sem confirmar; devolve os registros para o log de backup
+        (nenhum se a transação não existe ou já está na lixeira)"""
+        self._aplicar_resumo(cursor, "id = ?", (id,), -1)
+        agora = datetime.now()
+        cursor.execute("""
+            UPDATE "transaction"
+            SET deleted_at = ?
+            WHERE id = ? AND deleted_at IS NULL
+        """, (agora, id))
+        return [{'op': 'remover', 'id': id, 'em': agora}] if cursor.rowcount == 1 else []
+    
+    def _gravar_lote(self, itens: List[tuple]) -> List:
+        """Aplica um lote de ('inserir', transação) e ('remover', id) com um único commit"""
+        cursor = self.con.cursor()
+        registros, resultados = [], []
+        try:
+            for operacao, valor in itens:
+                if operacao == 'inserir':
+                    registro = self._inserir(cursor, valor)
+                    registros.append(registro)
+                    resultados.append(registro['linha'][0])
+                else:
+                    removidos = self._remover(cursor, valor)
+                    registros += removidos
+                    resultados.append(bool(removidos))
+            self._confirmar(cursor, registros)
+        except Exception:
+            self.con.rollback()
+            raise
+        return resultados
+    
+    def adicionar_transacao(self, transacao: Dict) -> Optional[int]:
+        """Adiciona uma nova transação (amount em reais, ex.: 12.34 ou '12,34')
+        e retorna o id (None se enfileirada sem esperar o commit)"""
+        transacao = {**transacao, 'amount': dinheiro.centavos(transacao['amount'])}
+        if self.fila:
+            return self.fila.gravar(('inserir', transacao))
+        cursor = self.con.cursor()
+        registro = self._inserir(cursor, transacao)
+        self._confirmar(cursor, [registro])
+        return registro['linha'][0]
+    
+    _CONSULTA_ULTIMAS = """
+        SELECT id, description, amount, category, type, date
+        FROM "transaction"
+        WHERE deleted_at IS NULL
+        ORDER BY date DESC
+        LIMIT ?
+    """
+    
+    _CONSULTA_REMOVIDAS = """
+        SELECT id, description, amount, category, type, date, deleted_at
+        FROM "transaction"
+        WHERE deleted_at IS NOT NULL
+        ORDER BY deleted_at DESC
+    """
+    
+    def _chaves_existentes(self, inicio: date, fim: date) -> Counter:
+        cursor = self.con.cursor()
+        chaves = Counter()
+        # Ativas e na lixeira, cada consulta servida pelo seu índice parcial
+        for filtro in ("deleted_at IS NULL", "deleted_at IS NOT NULL"):
+            cursor.execute(f"""
+                SELECT date, description, amount, type
+                FROM "transaction"
+                WHERE {filtro} AND date >= ? AND date <= ?
+            """, (inicio.isoformat(), fim.isoformat()))
+            chaves.update(importacao.chave(*row) for row in cursor)
+        return chaves
+    
+    def _inserir_lote(self, transacoes: List[Dict]):
+        cursor = self.con.cursor()
+        linhas = [(t['description'], t['amount'], t['category'], t['type'],
+                   t['date'].isoformat()) for t in transacoes]
+        cursor.executemany("""
+            INSERT INTO "transaction" (description, amount, category, type, date)
+            VALUES (?, ?, ?, ?, ?)
+        """, linhas)
+        self._somar_resumo(cursor, importacao.agrupar_por_mes(transacoes))
+        self._somar_saldo(cursor, saldo.agrupar_por_dia(transacoes))
+        # Um único executemany, com o lock de escrita, gera ids consecutivos
+        ultimo_id = cursor.execute('SELECT MAX(id) FROM "transaction"').fetchone()[0]
+        self._confirmar(cursor, [
+            {'op': 'inserir', 'centavos': True, 'linha': [id, *linha, None]}
+            for id, linha in enumerate(linhas, start=ultimo_id - len(linhas) + 1)
+        ])
+    
+    def importar_extrato(self, arquivo, formato: str = 'csv') -> importacao.ResultadoImportacao:
+        """Importa um extrato CSV/OFX em lotes, ignorando transações já existentes"""
+        try:
+            return importacao.importar_extrato(arquivo, formato,
+                                               self._chaves_existentes, self._inserir_lote)
+        except Exception:
+            self.con.rollback()
+            raise
     
     def obter_ultimas_transacoes(self, limite: int = 5) -> List[Dict]:
         """Obtém as últimas transações ativas"""
-        cursor = self.con.cursor()
-        cursor.execute("""
-            SELECT id, descricao, valor, categoria, tipo, data
-            FROM transacoes
-            WHERE removido_em IS NULL
-            ORDER BY data DESC
-            LIMIT ?
-        """, (limite,))
-        return [dict(zip(['id', 'description', 'amount', 'category', 'type', 'date'], row)) 
-                for row in cursor.fetchall()]
+        def calcular():
+            cursor = self.con.cursor()
+            cursor.execute(self._CONSULTA_ULTIMAS, (limite,))
+            return [dict(zip(['id', 'description', 'amount', 'category', 'type', 'date'], row)) 
+                    for row in cursor.fetchall()]
+        return [_em_reais(t) for t in self._em_cache(('ultimas', limite), calcular)]
     
-    def obter_transacoes_filtradas(self, 
-                                 mes: Optional[int] = None, 
-                                 ano: Optional[int] = None) -> List[Dict]:
-        """Obtém transações com filtros de data"""
+    def _consulta_filtrada(self, 
+                           mes: Optional[int] = None, 
+                           ano: Optional[int] = None):
         query = """
-            SELECT id, descricao, valor, categoria, tipo, data
-            FROM transacoes
-            WHERE removido_em IS NULL
+            SELECT id, description, amount, category, type, date
+            FROM "transaction"
+            WHERE deleted_at IS NULL
         """
         params = []
         
-        if ano:
-            query += " AND strftime('%Y', data) = ?"
-            params.append(str(ano))
-        if mes:
-            query += " AND strftime('%m', data) = ?"
+        intervalo = intervalo_periodo(ano, mes)
+        if intervalo:
+            query += " AND date >= ? AND date < ?"
+            params.extend(d.isoformat() for d in intervalo)
+        elif mes:
+            query += " AND strftime('%m', date) = ?"
             params.append(f"{mes:02d}")
         
-        query += " ORDER BY data DESC"
-        
-        cursor = self.con.cursor()
-        cursor.execute(query, params)
-        return [dict(zip(['id', 'description', 'amount', 'category', 'type', 'date'], row)) 
-                for row in cursor.fetchall()]
+        query += " ORDER BY date DESC"
+        return query, params
+    
+    def obter_transacoes_filtradas(self, 
+                                 mes: Optional[int] = None, 
+                                 ano: Optional[int] = None) -> List[Dict]:
+        """Obtém transações com filtros de data"""
+        def calcular():
+            query, params = self._consulta_filtrada(mes, ano)
+            cursor = self.con.cursor()
+            cursor.execute(query, params)
+            return [dict(zip(['id', 'description', 'amount', 'category', 'type', 'date'], row)) 
+                    for row in cursor.fetchall()]
+        return [_em_reais(t) for t in self._em_cache(('filtradas', mes, ano), calcular)]
     
     def obter_total_por_tipo(self, 
                            tipo: str, 
                            mes: Optional[int] = None, 
-                           ano: Optional[int] = None) -> float:
-        """Calcula o total por tipo (income/expense)"""
-        query = """
-            SELECT COALESCE(SUM(valor), 0)
-            FROM transacoes
-            WHERE tipo = ? AND removido_em IS NULL
-        """
-        params = [tipo]
-        
-        if ano:
-            query += " AND strftime('%Y', data) = ?"
-            params.append(str(ano))
-        if mes:
-            query += " AND strftime('%m', data) = ?"
-            params.append(f"{mes:02d}")
-        
-        cursor = self.con.cursor()
-        cursor.execute(query, params)
-        return cursor.fetchone()[0]
+                           ano: Optional[int] = None) -> Decimal:
+        """Calcula o total por tipo (income/expense), em reais"""
+        def calcular():
+            query = """
+                SELECT COALESCE(SUM(total), 0)
+                FROM monthly_summary
+                WHERE type = ?
+            """
+            params = [tipo]
+            
+            if ano:
+                query += " AND year = ?"
+                params.append(ano)
+            if mes:
+                query += " AND month = ?"
+                params.append(mes)
+            
+            cursor = self.con.cursor()
+            cursor.execute(query, params)
+            return cursor.fetchone()[0]
+        return dinheiro.reais(self._em_cache(('total', tipo, mes, ano), calcular))
+    
+    def buscar(self,
+               texto: str,
+               mes: Optional[int] = None,
+               ano: Optional[int] = None,
+               removidas: bool = False,
+               limite: int = 100) -> List[Dict]:
+        """Busca transações pela descrição ou categoria, das mais relevantes
+        para as menos relevantes"""
+        expressao = busca.expressao_fts(texto)
+        if not expressao:
+            return []
+        def calcular():
+            query = f"""
+                SELECT t.id, t.description, t.amount, t.category, t.type, t.date
+                FROM transaction_fts
+                JOIN "transaction" t ON t.id = transaction_fts.rowid
+                WHERE transaction_fts MATCH ?
+                  AND t.deleted_at IS {'NOT NULL' if removidas else 'NULL'}
+            """
+            params = [expressao]
+            intervalo = intervalo_periodo(ano, mes)
+            if intervalo:
+                query += " AND t.date >= ? AND t.date < ?"
+                params.extend(d.isoformat() for d in intervalo)
+            elif mes:
+                query += " AND strftime('%m', t.date) = ?"
+                params.append(f"{mes:02d}")
+            query += " ORDER BY transaction_fts.rank LIMIT ?"
+            params.append(limite)
+            cursor = self.con.cursor()
+            cursor.execute(query, params)
+            return [dict(zip(['id', 'description', 'amount', 'category', 'type', 'date'], row))
+                    for row in cursor.fetchall()]
+        chave = ('busca', expressao, mes, ano, removidas, limite)
+        return [_em_reais(t) for t in self._em_cache(chave, calcular)]
     
     def remover_transacao(self, id: int):
         """Marca uma transação como removida (soft delete)"""
+        if self.fila:
+            self.fila.gravar(('remover', id))
+            return
         cursor = self.con.cursor()
-        cursor.execute("""
-            UPDATE transacoes
-            SET removido_em = ?
-            WHERE id = ?
-        """, (datetime.now(), id))
-        self.con.commit()
+        self._confirmar(cursor, self._remover(cursor, id))
     
     def obter_transacoes_removidas(self) -> List[Dict]:
         """Obtém todas as transações na lixeira"""
         cursor = self.con.cursor()
-        cursor.execute("""
-            SELECT id, descricao, valor, categoria, tipo, data, removido_em
-            FROM transacoes
-            WHERE removido_em IS NOT NULL
-            ORDER BY removido_em DESC
-        """)
-        return [dict(zip(['id', 'description', 'amount', 'category', 'type', 'date', 'removed_at'], row)) 
+        cursor.execute(self._CONSULTA_REMOVIDAS)
+        return [_em_reais(dict(zip(['id', 'description', 'amount', 'category', 'type', 'date', 'removed_at'], row)))
                 for row in cursor.fetchall()]
     
     def restaurar_transacao(self, id: int):
         """Restaura uma transação da lixeira"""
         cursor = self.con.cursor()
         cursor.execute("""
-            UPDATE transacoes
-            SET removido_em = NULL
-            WHERE id = ?
+            UPDATE "transaction"
+            SET deleted_at = NULL
+            WHERE id = ? AND deleted_at IS NOT NULL
         """, (id,))
-        self.con.commit()
+        registros = []
+        if cursor.rowcount:
+            self._aplicar_resumo(cursor, "id = ?", (id,), 1)
+            registros.append({'op': 'restaurar', 'id': id})
+        self._confirmar(cursor, registros)
     
     def excluir_permanentemente(self, id: int):
         """Remove permanentemente uma transação"""
         cursor = self.con.cursor()
+        self._aplicar_resumo(cursor, "id = ?", (id,), -1)
         cursor.execute("""
-            DELETE FROM transacoes
+            DELETE FROM "transaction"
             WHERE id = ?
         """, (id,))
-        self.con.commit()
+        self._confirmar(cursor, [{'op': 'excluir', 'id': id}]
+                        if cursor.rowcount else [])
+    
+    # Orçamentos mensais por categoria (ver orcamento.py)
+    @staticmethod
+    def _gravar_orcamento(cursor, categoria: str, centavos: Optional[int]):
+        """Define (ou, com centavos=None, remove) um orçamento sem confirmar"""
+        if centavos is None:
+            cursor.execute(orcamento.REMOVER, {'category': categoria})
+        else:
+            cursor.execute(orcamento.DEFINIR, {'category': categoria, 'amount': centavos})
     
-    def esvaziar_lixeira(self):
-        """Remove permanentemente todas as transações na lixeira"""
+    def definir_orcamento(self, categoria: str, valor):
+        """Define o limite mensal de despesas da categoria, em reais"""
+        centavos = dinheiro.centavos(valor)
+        if not categoria or centavos <= 0:
+            raise ValueError("Categoria e valor positivo são obrigatórios")
         cursor = self.con.cursor()
-        cursor.execute("""
-            DELETE FROM transacoes
-            WHERE removido_em IS NOT NULL
-        """)
-        self.con.commit()
+        self._gravar_orcamento(cursor, categoria, centavos)
+        self._confirmar(cursor, [{'op': 'orcamento', 'categoria': categoria, 'valor': centavos}])
+    
+    def remover_orcamento(self, categoria: str):
+        """Remove o orçamento da categoria"""
+        cursor = self.con.cursor()
+        self._gravar_orcamento(cursor, categoria, None)
+        self._confirmar(cursor, [{'op': 'orcamento', 'categoria': categoria, 'valor': None}]
+                        if cursor.rowcount else [])
+    
+    def obter_orcamentos(self, mes: int, ano: int) -> List[Dict]:
+        """Limite, gasto e estado de cada orçamento no mês, em reais (ver orcamento.situacao)"""
+        def calcular():
+            return orcamento.situacoes(
+                self.con.execute(orcamento.SITUACAO, {'year': ano, 'month': mes}).fetchall())
+        return [{**o, **{chave: dinheiro.reais(o[chave]) for chave in ('limite', 'gasto', 'restante')}}
+                for o in self._em_cache(('orcamentos', mes, ano), calcular)]
+    
+    # Operações em lote: um único UPDATE/DELETE e um commit para todas as linhas
+    @staticmethod
+    def _filtro_lote(ids: Optional[List[int]] = None,
+                     mes: Optional[int] = None,
+                     ano: Optional[int] = None,
+                     categoria: Optional[str] = None):
+        """Filtro SQL pelos ids informados ou, sem ids, por período e categoria"""
+        if ids:
+            return f"id IN ({', '.join('?' * len(ids))})", list(ids)
+        condicoes, params = [], []
+        intervalo = intervalo_periodo(ano, mes)
+        if intervalo:
+            condicoes.append("date >= ? AND date < ?")
+            params.extend(d.isoformat() for d in intervalo)
+        elif mes:
+            condicoes.append("strftime('%m', date) = ?")
+            params.append(f"{mes:02d}")
+        if categoria:
+            condicoes.append("category = ?")
+            params.append(categoria)
+        if not condicoes:
+            raise ValueError("Informe ids ou ao menos um filtro (período ou categoria)")
+        return ' AND '.join(condicoes), params
+    
+    def remover_em_lote(self, ids: Optional[List[int]] = None, **filtros) -> int:
+        """Move para a lixeira as transações ativas selecionadas; retorna quantas"""
+        filtro, params = self._filtro_lote(ids, **filtros)
+        cursor = self.con.cursor()
+        self._aplicar_resumo(cursor, filtro, params, -1)
+        agora = datetime.now()
+        cursor.execute(f"""
+            UPDATE "transaction" SET deleted_at = ?
+            WHERE deleted_at IS NULL AND ({filtro})
+            RETURNING id
+        """, (agora, *params))
+        afetadas = [row[0] for row in cursor.fetchall()]
+        self._confirmar(cursor, [{'op': 'remover_lote', 'ids': afetadas, 'em': agora}]
+                        if afetadas else [])
+        return len(afetadas)
+    
+    def restaurar_em_lote(self, ids: Optional[List[int]] = None, **filtros) -> int:
+        """Restaura as transações selecionadas que estão na lixeira; retorna quantas"""
+        filtro, params = self._filtro_lote(ids, **filtros)
+        cursor = self.con.cursor()
+        # Só as que estão na lixeira voltam ao resumo
+        self._aplicar_resumo(cursor, filtro, params, 1, removidas=True)
+        cursor.execute(f"""
+            UPDATE "transaction" SET deleted_at = NULL
+            WHERE deleted_at IS NOT NULL AND ({filtro})
+            RETURNING id
+        """, params)
+        afetadas = [row[0] for row in cursor.fetchall()]
+        self._confirmar(cursor, [{'op': 'restaurar_lote', 'ids': afetadas}]
+                        if afetadas else [])
+        return len(afetadas)
+    
+    def excluir_em_lote(self, ids: Optional[List[int]] = None, **filtros) -> int:
+        """Remove permanentemente as transações selecionadas; retorna quantas.
+        
+        Sem ids, só as que estão na lixeira: um filtro nunca apaga de vez
+        transações ativas.
+        """
+        filtro, params = self._filtro_lote(ids, **filtros)
+        if not ids:
+            filtro = f"deleted_at IS NOT NULL AND {filtro}"
+        cursor = self.con.cursor()
+        self._aplicar_resumo(cursor, filtro, params, -1)
+        cursor.execute(f'DELETE FROM "transaction" WHERE {filtro} RETURNING id', params)
+        afetadas = [row[0] for row in cursor.fetchall()]
+        self._confirmar(cursor, [{'op': 'excluir_lote', 'ids': afetadas}]
+                        if afetadas else [])
+        return len(afetadas)
+    
+    @staticmethod
+    def _filtro_lixeira(corte: Optional[datetime]):
+        if corte is None:
+            return "deleted_at IS NOT NULL", ()
+        return "deleted_at IS NOT NULL AND deleted_at < ?", (corte.isoformat(' '),)
+    
+    def _contar_lixeira(self, corte: Optional[datetime] = None) -> int:
+        filtro, params = self._filtro_lixeira(corte)
+        return self.con.execute(f'SELECT COUNT(*) FROM "transaction" WHERE {filtro}',
+                                params).fetchone()[0]
+    
+    def _expurgar_lote(self, corte: Optional[datetime], tamanho: int) -> int:
+        """Exclui um lote da lixeira numa transação curta (ver limpeza.TarefaExpurgo)"""
+        filtro, params = self._filtro_lixeira(corte)
+        cursor = self.con.cursor()
+        # Transações na lixeira já estão fora do resumo mensal
+        cursor.execute(f"""
+            DELETE FROM "transaction"
+            WHERE id IN (
+                SELECT id FROM "transaction"
+                WHERE {filtro}
+                ORDER BY deleted_at
+                LIMIT ?
+            )
+            RETURNING id
+        """, (*params, tamanho))
+        ids = [row[0] for row in cursor.fetchall()]
+        self._confirmar(cursor, [{'op': 'expurgar', 'ids': ids}] if ids else [])
+        return len(ids)
+    
+    def esvaziar_lixeira(self) -> int:
+        """Remove permanentemente todas as transações na lixeira, em lotes"""
+        return self.expurgo.executar()
+    
+    def expurgar_antigas(self, dias: int = limpeza.RETENCAO_DIAS) -> int:
+        """Remove permanentemente o que está na lixeira há mais de `dias` dias"""
+        return self.expurgo.executar(limpeza.corte_retencao(dias))
+    
+    def planos_de_consulta(self) -> Dict[str, List[str]]:
+        """Retorna o EXPLAIN QUERY PLAN de cada listagem"""
+        hoje = date.today()
+        consultas = {
+            'ultimas': (self._CONSULTA_ULTIMAS, (5,)),
+            'filtradas (mês)': self._consulta_filtrada(hoje.month, hoje.year),
+            'filtradas (ano)': self._consulta_filtrada(None, hoje.year),
+            'removidas': (self._CONSULTA_REMOVIDAS, ()),
+            'expurgo': ('SELECT id FROM "transaction" WHERE deleted_at IS NOT NULL '
+                        'AND deleted_at < ? ORDER BY deleted_at LIMIT ?',
+                        (datetime.now().isoformat(' '), limpeza.TAMANHO_LOTE)),
+            'saldo em': (saldo.SALDO_EM, {'date': hoje.isoformat()}),
+            'serie do saldo': (saldo.SERIE, {'inicio': hoje.replace(day=1).isoformat(),
+                                             'fim': hoje.isoformat()}),
+        }
+        cursor = self.con.cursor()
+        planos = {}
+        for nome, (query, params) in consultas.items():
+            cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+            planos[nome] = [row[-1] for row in cursor.fetchall()]
+        return planos
+    
+    def _saldo_em(self, dia: date) -> int:
+        """Saldo ao fim do dia em centavos (uma busca no índice de daily_balance)"""
+        def calcular():
+            row = self.con.execute(saldo.SALDO_EM, {'date': saldo.iso(dia)}).fetchone()
+            return row[0] if row else 0
+        return self._em_cache(('saldo_em', saldo.iso(dia)), calcular)
+    
+    def obter_saldo_em(self, dia: date) -> Decimal:
+        """Saldo da conta ao fim do dia, em reais"""
+        return dinheiro.reais(self._saldo_em(dia))
+    
+    def obter_serie_saldo(self, inicio: date, fim: date) -> List[tuple]:
+        """[(data ISO, saldo em reais)] dos dias com transações em [inicio, fim],
+        a começar pelo saldo que chega a `inicio`"""
+        def calcular():
+            pontos = self.con.execute(saldo.SERIE, {'inicio': saldo.iso(inicio),
+                                                    'fim': saldo.iso(fim)}).fetchall()
+            if not pontos or pontos[0][0] != saldo.iso(inicio):
+                pontos.insert(0, (saldo.iso(inicio), self._saldo_em(inicio)))
+            return pontos
+        return [(dia, dinheiro.reais(centavos)) for dia, centavos
+                in self._em_cache(('serie_saldo', saldo.iso(inicio), saldo.iso(fim)), calcular)]
     
     def obter_anos_disponiveis(self) -> List[int]:
         """Obtém todos os anos com transações"""
-        cursor = self.con.cursor()
-        cursor.execute("""
-            SELECT DISTINCT strftime('%Y', data) as ano
-            FROM transacoes
-            WHERE removido_em IS NULL
-            ORDER BY ano DESC
-        """)
-        return [int(row[0]) for row in cursor.fetchall() if row[0]]
+        def calcular():
+            cursor = self.con.cursor()
+            cursor.execute("""
+                SELECT DISTINCT year
+                FROM monthly_summary
+                WHERE count > 0
+                ORDER BY year DESC
+            """)
+            return [int(row[0]) for row in cursor.fetchall() if row[0]]
+        return list(self._em_cache(('anos',), calcular))
     
     def obter_todas_transacoes(self, include_removed: bool = False) -> List[tuple]:
-        """Obtém todas as transações para backup"""
+        """Obtém todas as transações para backup (amount em reais)"""
         cursor = self.con.cursor()
         if include_removed:
-            cursor.execute("SELECT * FROM transacoes")
+            cursor.execute(f'SELECT {COLUNAS_BACKUP} FROM "transaction"')
         else:
-            cursor.execute("SELECT * FROM transacoes WHERE removido_em IS NULL")
-        return cursor.fetchall()
\ No newline at end of file
+            cursor.execute(f'SELECT {COLUNAS_BACKUP} FROM "transaction" WHERE deleted_at IS NULL')
+        return [(id, descricao, dinheiro.reais(valor), *resto)
+                for id, descricao, valor, *resto in cursor.fetchall()]
+
+
+_livros_abertos = livros.AbertosLRU(
+    GerenciadorTransacoes._abrir_livro, GerenciadorTransacoes.fechar,
+    ocupado=lambda gerenciador: gerenciador.expurgo.progresso['rodando'])
@@ -0,0 +1,56 @@
+import operator
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Valores monetários são centavos inteiros em todo o sistema (INTEGER de 64
+# bits no SQLite, int64 nos arrays de relatorios.py): somas são exatas e
+# não acumulam erro. Reais aparecem só nas bordas: formulários, extratos
+# importados e exportados e os templates (filtro |reais).
+
+_CENTAVO = Decimal('0.01')
+
+
+def centavos(valor) -> int:
+    """Converte um valor em reais em centavos exatos.
+
+    Aceita '1234.56', '1.234,56', 'R$ -12,30', Decimal, int e float; frações
+    de centavo são arredondadas (meio centavo para cima).
+    """
+    if isinstance(valor, bool):
+        raise ValueError("Valor deve ser um número")
+    if isinstance(valor, float):
+        # repr dá o decimal mais curto: 0.1 vira '0.1', não 0.1000000000000000055...
+        valor = repr(valor)
+    elif not isinstance(valor, (int, Decimal)):
+        valor = str(valor).strip().replace('R$', '').replace(' ', '')
+        if ',' in valor:
+            valor = valor.replace('.', '').replace(',', '.')
+    try:
+        decimal = Decimal(valor)
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError("Valor deve ser um número")
+    if not decimal.is_finite():
+        raise ValueError("Valor deve ser um número")
+    return int(decimal.quantize(_CENTAVO, rounding=ROUND_HALF_UP).scaleb(2))
+
+
+def exigir_centavos(valor) -> int:
+    """Confere que o valor já está em centavos inteiros (ex.: 1234 para R$ 12,34)"""
+    try:
+        if isinstance(valor, bool):
+            raise TypeError
+        return operator.index(valor)
+    except TypeError:
+        raise ValueError(f"Valor em centavos deve ser inteiro, recebido {valor!r}")
+
+
+def reais(centavos) -> Decimal:
+    """Centavos como Decimal em reais, sem passar por float"""
+    return Decimal(int(centavos)).scaleb(-2)
+
+
+def formatar(centavos) -> str:
+    """'1234.56' a partir de centavos; médias fracionárias são arredondadas"""
+    inteiro = int(round(centavos))
+    sinal = '-' if inteiro < 0 else ''
+    unidades, resto = divmod(abs(inteiro), 100)
+    return f'{sinal}{unidades}.{resto:02d}'
@@ -0,0 +1,80 @@
+import gzip
+import hashlib
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import compressao
+
+# Pipeline dos arquivos estáticos: `flask --app app build-assets` copia cada
+# arquivo de static/ para static/dist com o hash do conteúdo no nome
+# (style.css -> style.3f2a9c1d0b7e.css) e grava ao lado as versões .gz e .br
+# na compressão máxima, feita uma vez só. Como o nome muda junto com o
+# conteúdo, o app serve esses arquivos com cache de um ano (immutable).
+PASTA_SAIDA = 'dist'
+MANIFESTO = 'manifest.json'
+UM_ANO = 365 * 24 * 3600
+COMPRIMIVEIS = {'.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.html', '.xml'}
+# Sufixo gravado ao lado do arquivo para cada codificação
+SUFIXOS = {'br': '.br', 'gzip': '.gz'}
+
+
+def nome_com_hash(relativo: str, conteudo: bytes) -> str:
+    caminho = Path(relativo)
+    digest = hashlib.sha256(conteudo).hexdigest()[:12]
+    return caminho.with_name(f'{caminho.stem}.{digest}{caminho.suffix}').as_posix()
+
+
+def _precomprimir(destino: Path, conteudo: bytes) -> Dict[str, int]:
+    """Grava destino.gz e destino.br quando ficam menores; devolve os tamanhos"""
+    versoes = {'gzip': gzip.compress(conteudo, 9, mtime=0)}
+    if compressao.brotli:
+        versoes['br'] = compressao.brotli.compress(conteudo, quality=11)
+    tamanhos = {}
+    for codificacao, dados in versoes.items():
+        if len(dados) < len(conteudo):
+            destino.with_name(destino.name + SUFIXOS[codificacao]).write_bytes(dados)
+            tamanhos[codificacao] = len(dados)
+    return tamanhos
+
+
+def construir(origem: Path) -> List[Tuple[str, str, int, Dict[str, int]]]:
+    """Refaz origem/dist e o manifesto; devolve (nome, nome com hash, bytes, comprimidos)"""
+    saida = origem / PASTA_SAIDA
+    if saida.exists():
+        shutil.rmtree(saida)
+    saida.mkdir()
+    manifesto = {}
+    relatorio = []
+    for arquivo in sorted(origem.rglob('*')):
+        if not arquivo.is_file() or saida in arquivo.parents:
+            continue
+        relativo = arquivo.relative_to(origem).as_posix()
+        conteudo = arquivo.read_bytes()
+        manifesto[relativo] = nome_com_hash(relativo, conteudo)
+        destino = saida / manifesto[relativo]
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        destino.write_bytes(conteudo)
+        tamanhos = (_precomprimir(destino, conteudo)
+                    if arquivo.suffix.lower() in COMPRIMIVEIS else {})
+        relatorio.append((relativo, manifesto[relativo], len(conteudo), tamanhos))
+    (saida / MANIFESTO).write_text(json.dumps(manifesto, indent=2, sort_keys=True))
+    return relatorio
+
+
+def carregar_manifesto(origem: Path) -> Dict[str, str]:
+    """{nome original: nome com hash}; vazio se os estáticos não foram gerados"""
+    try:
+        return json.loads((origem / PASTA_SAIDA / MANIFESTO).read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def variante(saida: Path, nome: str, aceitas) -> Tuple[str, Optional[str]]:
+    """(arquivo a enviar, Content-Encoding) para o cliente, preferindo br a gzip"""
+    for codificacao, sufixo in SUFIXOS.items():
+        comprimido = nome + sufixo
+        if aceitas[codificacao] and (saida / comprimido).is_file():
+            return comprimido, codificacao
+    return nome, None
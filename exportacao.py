@@ -0,0 +1,36 @@
+import csv
+import io
+import json
+from typing import Iterable, Iterator, Sequence
+
+CAMPOS = ('id', 'date', 'description', 'amount', 'category', 'type')
+
+FORMATOS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+def linhas_csv(lotes: Iterable[Sequence], campos: Sequence[str] = CAMPOS) -> Iterator[str]:
+    """Gera o CSV um lote por vez, reaproveitando o mesmo buffer"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(campos)
+    yield buffer.getvalue()
+    for lote in lotes:
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerows(lote)
+        yield buffer.getvalue()
+
+
+def linhas_ndjson(lotes: Iterable[Sequence], campos: Sequence[str] = CAMPOS) -> Iterator[str]:
+    """Gera um objeto JSON por linha, um lote por vez"""
+    for lote in lotes:
+        yield ''.join(
+            json.dumps(dict(zip(campos, linha)), default=str, ensure_ascii=False) + '\n'
+            for linha in lote
+        )
+
+
+GERADORES = {'csv': linhas_csv, 'ndjson': linhas_ndjson}
@@ -0,0 +1,141 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+# Escrita em grupo (desligada por padrão): uma thread grava as escritas
+# enfileiradas em lotes de até MAX_ITENS, com um commit por lote. Com janela
+# 0 o lote é o que se acumulou durante o commit anterior; uma janela de
+# alguns ms só compensa quando quem escreve não espera o commit ('queued'),
+# já que com 'commit' os lotes não enchem enquanto todos esperam.
+ATIVA = os.getenv('WRITE_QUEUE', '0') == '1'
+MAX_ITENS = int(os.getenv('WRITE_QUEUE_MAX_ITEMS', 256))
+JANELA_S = float(os.getenv('WRITE_QUEUE_WINDOW_MS', 0)) / 1000
+# 'commit': quem chama espera o commit do seu lote; 'queued': retorna assim
+# que a escrita entra na fila (uma queda pode perder os últimos milissegundos).
+# Para sobreviver a falta de energia, use também SQLITE_SYNCHRONOUS=FULL: o
+# fsync passa a ser um por lote, não um por escrita.
+DURABILIDADE = os.getenv('WRITE_QUEUE_DURABILITY', 'commit')
+DURABILIDADES = ('commit', 'queued')
+
+log = logging.getLogger('fila_escrita')
+
+_FIM = object()
+
+
+class FilaEscrita:
+    """Fila de escritas com commit em grupo.
+
+    `gravar_lote(itens)` aplica todos os itens numa única transação e
+    devolve um resultado por item. Se o lote falhar, cada item é regravado
+    sozinho, para que só o item com problema receba o erro.
+    """
+
+    def __init__(self,
+                 gravar_lote: Callable[[List], List],
+                 max_itens: int = MAX_ITENS,
+                 janela: float = JANELA_S,
+                 durabilidade: str = DURABILIDADE):
+        if durabilidade not in DURABILIDADES:
+            raise ValueError(f'Durabilidade inválida: {durabilidade!r}')
+        self._gravar_lote = gravar_lote
+        self.max_itens = max_itens
+        self.janela = janela
+        self.durabilidade = durabilidade
+        self._fila: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._trava = threading.Lock()
+        self._thread = None
+        self._lotes = 0
+        self._itens = 0
+        self._maior_lote = 0
+
+    def enviar(self, item) -> Future:
+        """Enfileira uma escrita; o futuro recebe o resultado após o commit"""
+        futuro = Future()
+        with self._trava:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._laco, daemon=True,
+                                                name='fila-escrita')
+                self._thread.start()
+                atexit.register(self.fechar)
+        self._fila.put((item, futuro))
+        return futuro
+
+    def gravar(self, item, timeout: float = None):
+        """Enfileira e, com durabilidade 'commit', espera o resultado"""
+        futuro = self.enviar(item)
+        if self.durabilidade == 'queued':
+            return None
+        return futuro.result(timeout)
+
+    def fechar(self, timeout: float = None):
+        """Grava o que ainda está na fila e encerra a thread"""
+        with self._trava:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._fila.put(_FIM)
+            thread.join(timeout)
+
+    def estatisticas(self) -> Dict:
+        with self._trava:
+            return {
+                'lotes': self._lotes,
+                'itens': self._itens,
+                'media_por_lote': self._itens / self._lotes if self._lotes else 0.0,
+                'maior_lote': self._maior_lote,
+                'pendentes': self._fila.qsize(),
+            }
+
+    def _proximo_lote(self, primeiro) -> tuple:
+        """O que já está na fila, mais o que chegar dentro da janela"""
+        lote = [primeiro]
+        prazo = time.monotonic() + self.janela
+        while len(lote) < self.max_itens:
+            try:
+                item = self._fila.get_nowait()
+            except queue.Empty:
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    item = self._fila.get(timeout=restante)
+                except queue.Empty:
+                    break
+            if item is _FIM:
+                return lote, True
+            lote.append(item)
+        return lote, False
+
+    def _laco(self):
+        while True:
+            primeiro = self._fila.get()
+            if primeiro is _FIM:
+                return
+            lote, fim = self._proximo_lote(primeiro)
+            self._gravar(lote)
+            if fim:
+                return
+
+    def _gravar(self, lote: List[tuple]):
+        try:
+            resultados = self._gravar_lote([item for item, _ in lote])
+        except Exception as e:
+            if len(lote) > 1:
+                # Isola o item com problema: cada um é regravado sozinho
+                for par in lote:
+                    self._gravar([par])
+                return
+            lote[0][1].set_exception(e)
+            if self.durabilidade == 'queued':
+                log.exception('Escrita enfileirada descartada')
+            return
+        with self._trava:
+            self._lotes += 1
+            self._itens += len(lote)
+            self._maior_lote = max(self._maior_lote, len(lote))
+        for (_, futuro), resultado in zip(lote, resultados):
+            futuro.set_result(resultado)
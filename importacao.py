@@ -0,0 +1,219 @@
+import csv
+import re
+import time
+from collections import Counter
+from datetime import datetime, date
+from typing import Callable, Dict, Iterator, List, Set, Tuple
+
+from models import validar_campos
+import dinheiro
+
+TAMANHO_LOTE = 5000
+CATEGORIA_PADRAO = 'Outros'
+
+# Nomes de coluna aceitos no CSV, em português ou inglês
+COLUNAS_CSV = {
+    'date': ('date', 'data'),
+    'description': ('description', 'descricao', 'descrição', 'historico', 'histórico'),
+    'amount': ('amount', 'valor'),
+    'category': ('category', 'categoria'),
+    'type': ('type', 'tipo'),
+}
+
+TIPOS = {
+    'income': 'income', 'receita': 'income', 'credito': 'income', 'crédito': 'income',
+    'credit': 'income', 'c': 'income',
+    'expense': 'expense', 'despesa': 'expense', 'debito': 'expense', 'débito': 'expense',
+    'debit': 'expense', 'd': 'expense',
+}
+
+_TAG_OFX = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)')
+
+
+class ResultadoImportacao:
+    """Resumo de uma importação: contagens, erros por linha e velocidade"""
+
+    def __init__(self):
+        self.lidas = 0
+        self.inseridas = 0
+        self.duplicadas = 0
+        self.erros: List[Tuple[int, str]] = []
+        self.segundos = 0.0
+
+    @property
+    def linhas_por_segundo(self) -> float:
+        return self.lidas / self.segundos if self.segundos else 0.0
+
+    def __str__(self):
+        return (f'{self.inseridas} inseridas, {self.duplicadas} duplicadas, '
+                f'{len(self.erros)} com erro ({self.linhas_por_segundo:.0f} linhas/s)')
+
+
+def converter_valor(texto) -> int:
+    """Centavos de '1234.56', '1.234,56' e '-1234,56'"""
+    return dinheiro.centavos(texto)
+
+
+def converter_data(texto) -> date:
+    texto = str(texto).strip()
+    for formato, tamanho in (('%Y-%m-%d', 10), ('%d/%m/%Y', 10), ('%Y%m%d', 8)):
+        try:
+            return datetime.strptime(texto[:tamanho], formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Data inválida: {texto!r}")
+
+
+def normalizar(bruto: Dict) -> Dict:
+    """Converte uma linha lida do extrato em uma transação validada.
+
+    O sinal do valor define o tipo quando a coluna de tipo não existe.
+    """
+    try:
+        valor = converter_valor(bruto.get('amount'))
+    except (TypeError, ValueError):
+        raise ValueError("Valor deve ser um número")
+    tipo = TIPOS.get(str(bruto.get('type') or '').strip().lower())
+    if tipo is None:
+        tipo = 'expense' if valor < 0 else 'income'
+
+    description, amount, category, type = validar_campos(
+        bruto.get('description'), dinheiro.reais(abs(valor)),
+        bruto.get('category') or CATEGORIA_PADRAO, tipo
+    )
+    if len(category) > 50:
+        raise ValueError("Categoria inválida (máximo 50 caracteres)")
+    return {
+        'description': description,
+        'amount': amount,
+        'category': category,
+        'type': type,
+        'date': converter_data(bruto.get('date')),
+    }
+
+
+def ler_csv(arquivo) -> Iterator[Tuple[int, Dict]]:
+    """Lê um CSV linha a linha, aceitando ',' ou ';' como separador"""
+    inicio = arquivo.readline()
+    delimitador = ';' if inicio.count(';') > inicio.count(',') else ','
+    cabecalho = [c.strip().lower() for c in next(csv.reader([inicio], delimiter=delimitador))]
+    indices = {}
+    for campo, nomes in COLUNAS_CSV.items():
+        for nome in nomes:
+            if nome in cabecalho:
+                indices[campo] = cabecalho.index(nome)
+                break
+    faltando = {'date', 'description', 'amount'} - indices.keys()
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(sorted(faltando))}")
+
+    for numero, linha in enumerate(csv.reader(arquivo, delimiter=delimitador), start=2):
+        if not any(linha):
+            continue
+        yield numero, {campo: linha[i] if i < len(linha) else None
+                       for campo, i in indices.items()}
+
+
+def ler_ofx(arquivo) -> Iterator[Tuple[int, Dict]]:
+    """Lê os blocos <STMTTRN> de um OFX (SGML ou XML) sem carregar o arquivo todo"""
+    atual = None
+    for numero, linha in enumerate(arquivo, start=1):
+        for fechamento, tag, valor in _TAG_OFX.findall(linha):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if fechamento and atual is not None:
+                    yield atual.pop('_linha'), {
+                        'date': atual.get('DTPOSTED'),
+                        'description': atual.get('MEMO') or atual.get('NAME'),
+                        'amount': atual.get('TRNAMT'),
+                        'type': None,
+                        'fitid': atual.get('FITID'),
+                    }
+                    atual = None
+                elif not fechamento:
+                    atual = {'_linha': numero}
+            elif atual is not None and not fechamento:
+                atual[tag] = valor.strip()
+
+
+LEITORES = {'csv': ler_csv, 'ofx': ler_ofx}
+
+
+def detectar_formato(nome_arquivo: str) -> str:
+    return 'ofx' if nome_arquivo.lower().endswith(('.ofx', '.qfx')) else 'csv'
+
+
+def chave(data, descricao, valor, tipo) -> Tuple:
+    """Identifica uma transação para deduplicação; aceita data como date ou texto
+    e o valor em centavos"""
+    return str(data)[:10], descricao, int(valor), tipo
+
+
+def agrupar_por_mes(transacoes: List[Dict]) -> Dict[Tuple, Tuple[int, int]]:
+    """Soma um lote por (ano, mês, tipo, categoria), no formato do resumo mensal"""
+    grupos: Dict[Tuple, Tuple[int, int]] = {}
+    for t in transacoes:
+        k = (t['date'].year, t['date'].month, t['type'], t['category'])
+        total, quantidade = grupos.get(k, (0, 0))
+        grupos[k] = (total + t['amount'], quantidade + 1)
+    return grupos
+
+
+def importar_extrato(arquivo,
+                     formato: str,
+                     chaves_existentes: Callable[[date, date], Counter],
+                     inserir_lote: Callable[[List[Dict]], None],
+                     tamanho_lote: int = TAMANHO_LOTE) -> ResultadoImportacao:
+    """Importa um extrato em lotes.
+
+    `chaves_existentes(inicio, fim)` conta as cópias de cada chave (ver `chave`)
+    já gravadas entre as datas, inclusive; `inserir_lote` grava e confirma um
+    lote inteiro. Linhas iguais são legítimas (duas compras de R$ 15 no mesmo
+    dia): de cada chave entram só as cópias do arquivo além das que o banco já
+    tinha. No OFX, um FITID repetido no arquivo é sempre duplicata.
+    """
+    resultado = ResultadoImportacao()
+    inicio = time.perf_counter()
+    vistas: Counter = Counter()
+    inseridas: Counter = Counter()
+    fitids: Set[str] = set()
+    # (ordem da cópia da chave no arquivo, chave, transação)
+    lote: List[Tuple[int, Tuple, Dict]] = []
+
+    def gravar():
+        primeira = min(t['date'] for _, _, t in lote)
+        ultima = max(t['date'] for _, _, t in lote)
+        existentes = chaves_existentes(primeira, ultima)
+        # O banco já tinha existentes[k] - inseridas[k] cópias antes desta importação
+        novas = [(k, t) for copia, k, t in lote if copia > existentes[k] - inseridas[k]]
+        resultado.duplicadas += len(lote) - len(novas)
+        if novas:
+            inserir_lote([t for _, t in novas])
+            inseridas.update(k for k, _ in novas)
+            resultado.inseridas += len(novas)
+        lote.clear()
+
+    for numero, bruto in LEITORES[formato](arquivo):
+        resultado.lidas += 1
+        try:
+            transacao = normalizar(bruto)
+        except ValueError as e:
+            resultado.erros.append((numero, str(e)))
+            continue
+        fitid = bruto.get('fitid')
+        if fitid:
+            if fitid in fitids:
+                resultado.duplicadas += 1
+                continue
+            fitids.add(fitid)
+        k = chave(transacao['date'], transacao['description'],
+                  transacao['amount'], transacao['type'])
+        vistas[k] += 1
+        lote.append((vistas[k], k, transacao))
+        if len(lote) >= tamanho_lote:
+            gravar()
+    if lote:
+        gravar()
+
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
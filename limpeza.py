@@ -0,0 +1,111 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+# Lixeira: dias até a exclusão automática (0 desliga) e ritmo do expurgo
+RETENCAO_DIAS = int(os.getenv('TRASH_RETENTION_DAYS', 30))
+TAMANHO_LOTE = int(os.getenv('PURGE_BATCH_SIZE', 500))
+PAUSA_S = float(os.getenv('PURGE_PAUSE_MS', 50)) / 1000
+INTERVALO_S = float(os.getenv('PURGE_INTERVAL_HOURS', 6)) * 3600
+
+log = logging.getLogger('limpeza')
+
+
+def corte_retencao(dias: int) -> datetime:
+    """Transações removidas antes deste instante passaram do prazo de retenção"""
+    return datetime.now() - timedelta(days=dias)
+
+
+class TarefaExpurgo:
+    """Exclusão definitiva da lixeira em lotes curtos.
+
+    `excluir_lote(corte, tamanho)` apaga até `tamanho` transações removidas
+    antes de `corte` (todas, se None) numa transação própria e devolve quantas
+    apagou; `contar(corte)` estima o total para o progresso. Entre os lotes a
+    tarefa dorme `pausa` segundos, deixando o lock de escrita do SQLite livre
+    para as outras requisições.
+    """
+
+    def __init__(self,
+                 excluir_lote: Callable[[Optional[datetime], int], int],
+                 contar: Callable[[Optional[datetime]], int],
+                 tamanho_lote: int = TAMANHO_LOTE,
+                 pausa: float = PAUSA_S):
+        self._excluir_lote = excluir_lote
+        self._contar = contar
+        self.tamanho_lote = tamanho_lote
+        self.pausa = pausa
+        self._trava = threading.Lock()
+        self._progresso: Dict = {'rodando': False}
+
+    @property
+    def progresso(self) -> Dict:
+        with self._trava:
+            return dict(self._progresso)
+
+    def _comecar(self, corte: Optional[datetime]) -> bool:
+        with self._trava:
+            if self._progresso['rodando']:
+                return False
+            self._progresso = {'rodando': True, 'corte': corte, 'removidas': 0,
+                               'total': None, 'lotes': 0, 'inicio': datetime.now(),
+                               'fim': None, 'erro': None}
+            return True
+
+    def _rodar(self, corte: Optional[datetime]) -> int:
+        removidas = 0
+        try:
+            total = self._contar(corte)
+            with self._trava:
+                self._progresso['total'] = total
+            while True:
+                n = self._excluir_lote(corte, self.tamanho_lote)
+                removidas += n
+                with self._trava:
+                    self._progresso['removidas'] = removidas
+                    self._progresso['lotes'] += 1
+                if n < self.tamanho_lote:
+                    return removidas
+                time.sleep(self.pausa)
+        except Exception as e:
+            with self._trava:
+                self._progresso['erro'] = str(e)
+            raise
+        finally:
+            with self._trava:
+                self._progresso['rodando'] = False
+                self._progresso['fim'] = datetime.now()
+
+    def _rodar_em_fundo(self, corte: Optional[datetime]):
+        try:
+            removidas = self._rodar(corte)
+            if removidas:
+                log.info('Expurgo da lixeira: %d transações excluídas', removidas)
+        except Exception:
+            log.exception('Erro no expurgo da lixeira')
+
+    def executar(self, corte: Optional[datetime] = None) -> int:
+        """Expurga na thread atual e devolve quantas transações foram excluídas"""
+        if not self._comecar(corte):
+            raise RuntimeError('Já existe um expurgo da lixeira em andamento')
+        return self._rodar(corte)
+
+    def iniciar(self, corte: Optional[datetime] = None) -> bool:
+        """Expurga numa thread de fundo; False se já houver um expurgo rodando"""
+        if not self._comecar(corte):
+            return False
+        threading.Thread(target=self._rodar_em_fundo, args=(corte,), daemon=True,
+                         name='expurgo-lixeira').start()
+        return True
+
+    def agendar(self, retencao_dias: int = RETENCAO_DIAS, intervalo: float = INTERVALO_S):
+        """Expurga periodicamente o que está na lixeira há mais de `retencao_dias`"""
+        def laco():
+            while True:
+                if self._comecar(corte := corte_retencao(retencao_dias)):
+                    self._rodar_em_fundo(corte)
+                time.sleep(intervalo)
+        threading.Thread(target=laco, daemon=True, name='expurgo-agendado').start()
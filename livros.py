@@ -0,0 +1,187 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Hashable, List, Optional
+
+# Livros: cada família (ou conta) num arquivo SQLite próprio, com lock de
+# escrita, WAL, caches e fila de escrita próprios, de modo que escritas em
+# livros diferentes não esperam umas pelas outras. Cada processo mantém no
+# máximo MAX_ABERTOS livros abertos; o menos usado recentemente e os ociosos
+# há mais de OCIOSO_S segundos são fechados, exceto os que estão em uso.
+MAX_ABERTOS = int(os.getenv('LEDGER_MAX_OPEN', 64))
+OCIOSO_S = float(os.getenv('LEDGER_IDLE_SECONDS', 300))
+
+# Nomes viram nomes de arquivo: nada de '/', '..' ou maiúsculas
+NOME_VALIDO = re.compile(r'[a-z0-9][a-z0-9_-]{0,62}')
+
+
+class LivroInvalido(ValueError):
+    pass
+
+
+class LivroInexistente(LookupError):
+    pass
+
+
+def validar(nome) -> str:
+    if not isinstance(nome, str) or not NOME_VALIDO.fullmatch(nome):
+        raise LivroInvalido(f'Nome de livro inválido: {nome!r}')
+    return nome
+
+
+def caminho(pasta, nome: str) -> Path:
+    """Arquivo do livro `nome` dentro de `pasta`"""
+    return Path(pasta) / f'{validar(nome)}.db'
+
+
+def existente(pasta, nome: str) -> Path:
+    """Como caminho(), mas o livro já tem de ter sido criado (`flask migrate --ledger`)"""
+    arquivo = caminho(pasta, nome)
+    if not arquivo.exists():
+        raise LivroInexistente(f'Livro não encontrado: {nome}')
+    return arquivo
+
+
+def listar(pasta) -> List[str]:
+    return sorted(arquivo.stem for arquivo in Path(pasta).glob('*.db')
+                  if NOME_VALIDO.fullmatch(arquivo.stem))
+
+
+class _Entrada:
+    __slots__ = ('valor', 'reservas', 'ultimo_uso')
+
+    def __init__(self, valor):
+        self.valor = valor
+        self.reservas = 0
+        self.ultimo_uso = time.monotonic()
+
+
+class AbertosLRU:
+    """Recursos abertos sob demanda por chave (um engine ou um gerenciador
+    por livro), no máximo `maximo` ao mesmo tempo.
+
+    `abrir(chave)` cria o recurso e `fechar(valor)` o libera. Quem usa um
+    recurso o reserva (`usar`, ou `reservar`/`liberar`) e reservados nunca
+    são fechados, assim como aqueles em que `ocupado(valor)` é verdadeiro
+    (um expurgo em andamento, por exemplo): o limite pode ser excedido
+    enquanto todos estiverem em uso. Uma thread de fundo fecha os que
+    ficaram `ocioso` segundos sem reserva.
+    """
+
+    def __init__(self,
+                 abrir: Callable[[Hashable], object],
+                 fechar: Callable[[object], None],
+                 maximo: int = MAX_ABERTOS,
+                 ocioso: float = OCIOSO_S,
+                 ocupado: Optional[Callable[[object], bool]] = None):
+        self._abrir = abrir
+        self._fechar = fechar
+        self._ocupado = ocupado or (lambda valor: False)
+        self.maximo = maximo
+        self.ocioso = ocioso
+        self._itens: "OrderedDict[Hashable, _Entrada]" = OrderedDict()
+        self._trava = threading.Lock()
+        self._varredura = None
+        self.aberturas = 0
+        self.fechamentos = 0
+
+    def reservar(self, chave: Hashable):
+        """Recurso de `chave`, aberto se preciso; devolva com liberar(chave)"""
+        with self._trava:
+            entrada = self._itens.get(chave)
+            if entrada is not None:
+                entrada.reservas += 1
+                self._itens.move_to_end(chave)
+                return entrada.valor
+        # Abre fora da trava: abrir um livro não atrasa os outros
+        valor = self._abrir(chave)
+        with self._trava:
+            entrada = self._itens.get(chave)
+            if entrada is None:
+                entrada = self._itens[chave] = _Entrada(valor)
+                self.aberturas += 1
+                valor = None
+            entrada.reservas += 1
+            self._itens.move_to_end(chave)
+            excedentes = self._escolher(lambda e: len(self._itens) > self.maximo)
+            self._iniciar_varredura()
+        if valor is not None:
+            # Outra thread abriu o mesmo recurso enquanto este era aberto
+            self._fechar(valor)
+        self._fechar_todos(excedentes)
+        return entrada.valor
+
+    def liberar(self, chave: Hashable):
+        with self._trava:
+            entrada = self._itens.get(chave)
+            if entrada is not None:
+                entrada.reservas -= 1
+                entrada.ultimo_uso = time.monotonic()
+            # Acima do limite porque todos estavam em uso: fecha os que sobraram
+            excedentes = self._escolher(lambda e: len(self._itens) > self.maximo)
+        self._fechar_todos(excedentes)
+
+    @contextmanager
+    def usar(self, chave: Hashable):
+        valor = self.reservar(chave)
+        try:
+            yield valor
+        finally:
+            self.liberar(chave)
+
+    def expirar(self) -> int:
+        """Fecha os recursos sem reserva há mais de `ocioso` segundos"""
+        limite = time.monotonic() - self.ocioso
+        with self._trava:
+            ociosos = self._escolher(lambda e: e.ultimo_uso < limite)
+        self._fechar_todos(ociosos)
+        return len(ociosos)
+
+    def fechar_todos(self):
+        """Fecha tudo o que não estiver reservado (ao encerrar o processo)"""
+        with self._trava:
+            livres = self._escolher(lambda e: True)
+        self._fechar_todos(livres)
+
+    def estatisticas(self) -> Dict:
+        with self._trava:
+            return {
+                'abertos': len(self._itens),
+                'em_uso': sum(1 for e in self._itens.values() if e.reservas),
+                'maximo': self.maximo,
+                'ocioso_s': self.ocioso,
+                'aberturas': self.aberturas,
+                'fechamentos': self.fechamentos,
+                'livros': list(self._itens),
+            }
+
+    def _escolher(self, criterio: Callable[[_Entrada], bool]) -> List:
+        """Retira, do menos para o mais recente, as entradas livres que
+        atendem ao critério (reavaliado a cada retirada); chamar com a trava"""
+        escolhidos = []
+        for chave, entrada in list(self._itens.items()):
+            if entrada.reservas or not criterio(entrada) or self._ocupado(entrada.valor):
+                continue
+            del self._itens[chave]
+            escolhidos.append(entrada.valor)
+        self.fechamentos += len(escolhidos)
+        return escolhidos
+
+    def _fechar_todos(self, valores: List):
+        for valor in valores:
+            self._fechar(valor)
+
+    def _iniciar_varredura(self):
+        if self._varredura is None and self.ocioso > 0:
+            self._varredura = threading.Thread(target=self._varrer, daemon=True,
+                                               name='livros-ociosos')
+            self._varredura.start()
+
+    def _varrer(self):
+        while True:
+            time.sleep(max(self.ocioso / 2, 1))
+            self.expirar()
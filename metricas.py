@@ -0,0 +1,171 @@
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+# Limites em segundos (os mesmos dos clientes oficiais do Prometheus)
+LIMITES_TEMPO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_QUANTIDADE = (1, 2, 5, 10, 20, 50, 100, 500, 1000)
+
+
+def _rotulos(nomes: Sequence[str], valores: Tuple, extra: str = '') -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+
+class Contador:
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self._valores: Dict[Tuple, float] = {}
+
+    def incrementar(self, *valores, quantidade: float = 1):
+        self._valores[valores] = self._valores.get(valores, 0) + quantidade
+
+    def exportar(self):
+        yield f'# HELP {self.nome} {self.ajuda}'
+        yield f'# TYPE {self.nome} counter'
+        for valores, total in sorted(self._valores.items()):
+            yield f'{self.nome}{_rotulos(self.rotulos, valores)} {_numero(total)}'
+
+
+class Histograma:
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = (),
+                 limites: Sequence[float] = LIMITES_TEMPO):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self.limites = tuple(limites)
+        # Por combinação de rótulos: [contagem por faixa..., soma]
+        self._series: Dict[Tuple, list] = {}
+
+    def observar(self, *valores, valor: float):
+        serie = self._series.get(valores)
+        if serie is None:
+            serie = self._series[valores] = [0] * (len(self.limites) + 1) + [0.0]
+        serie[bisect_left(self.limites, valor)] += 1
+        serie[-1] += valor
+
+    def exportar(self):
+        yield f'# HELP {self.nome} {self.ajuda}'
+        yield f'# TYPE {self.nome} histogram'
+        for valores, serie in sorted(self._series.items()):
+            acumulado = 0
+            for limite, quantidade in zip(self.limites + (float('inf'),), serie):
+                acumulado += quantidade
+                le = '+Inf' if limite == float('inf') else _numero(limite)
+                rotulos = _rotulos(self.rotulos, valores, f'le="{le}"')
+                yield f'{self.nome}_bucket{rotulos} {acumulado}'
+            yield f'{self.nome}_sum{_rotulos(self.rotulos, valores)} {_numero(serie[-1])}'
+            yield f'{self.nome}_count{_rotulos(self.rotulos, valores)} {acumulado}'
+
+
+class Registro:
+    """Métricas do processo, no formato de texto do Prometheus.
+
+    Cada worker tem o seu registro; o Prometheus soma as séries de todos.
+    """
+
+    def __init__(self):
+        self._metricas = []
+        self._trava = threading.Lock()
+
+    def contador(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()) -> Contador:
+        metrica = Contador(nome, ajuda, rotulos)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nome: str, ajuda: str, rotulos: Sequence[str] = (),
+                   limites: Sequence[float] = LIMITES_TEMPO) -> Histograma:
+        metrica = Histograma(nome, ajuda, rotulos, limites)
+        self._metricas.append(metrica)
+        return metrica
+
+    @property
+    def trava(self) -> threading.Lock:
+        """Segure ao atualizar várias métricas de uma vez"""
+        return self._trava
+
+    def exportar(self) -> str:
+        with self._trava:
+            linhas = [linha for metrica in self._metricas for linha in metrica.exportar()]
+        return '\n'.join(linhas) + '\n'
+
+
+def _quadro(frame) -> str:
+    codigo = frame.f_code
+    return f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})'
+
+
+def pilha_dobrada(frame) -> str:
+    """Pilha da raiz até o quadro atual, no formato 'dobrado' do flamegraph.pl"""
+    quadros = []
+    while frame is not None:
+        quadros.append(_quadro(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(quadros))
+
+
+class AmostradorPilhas:
+    """Amostrador de pilhas para requisições lentas.
+
+    Uma thread de fundo copia, a cada `intervalo` segundos, a pilha das
+    threads que estão atendendo requisições. Quando uma requisição termina
+    acima de `limite` segundos, as amostras vão para um arquivo .folded
+    (uma pilha e a contagem por linha), pronto para flamegraph.pl ou speedscope.
+    """
+
+    def __init__(self, pasta, limite: float, intervalo: float = 0.005):
+        self.pasta = Path(pasta)
+        self.limite = limite
+        self.intervalo = intervalo
+        self._ativas: Dict[int, Counter] = {}
+        self._trava = threading.Lock()
+        self._thread = None
+
+    def iniciar(self):
+        """Começa a amostrar a thread atual"""
+        with self._trava:
+            self._ativas[threading.get_ident()] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._amostrar, daemon=True,
+                                                name='amostrador-pilhas')
+                self._thread.start()
+
+    def finalizar(self, duracao: float, rotulo: str) -> Optional[Path]:
+        """Para de amostrar a thread atual; grava as pilhas se passou do limite"""
+        with self._trava:
+            pilhas = self._ativas.pop(threading.get_ident(), None)
+        if not pilhas or duracao < self.limite:
+            return None
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        nome = re.sub(r'[^\w.-]+', '_', rotulo).strip('_') or 'raiz'
+        arquivo = self.pasta / f'{datetime.now():%Y%m%d-%H%M%S-%f}-{nome}-{duracao * 1000:.0f}ms.folded'
+        arquivo.write_text(''.join(f'{pilha} {n}\n' for pilha, n in pilhas.most_common()))
+        return arquivo
+
+    def _amostrar(self):
+        propria = threading.get_ident()
+        while True:
+            time.sleep(self.intervalo)
+            with self._trava:
+                if not self._ativas:
+                    continue
+                quadros = sys._current_frames()
+                for ident, pilhas in self._ativas.items():
+                    frame = quadros.get(ident)
+                    if frame is not None and ident != propria:
+                        pilhas[pilha_dobrada(frame)] += 1
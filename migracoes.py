@@ -0,0 +1,305 @@
+import sqlite3
+import time
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional
+
+import busca
+import orcamento
+import saldo
+from conexao import conectar
+
+# Esquema único, usado tanto pelo app quanto por dados.py. Cada migração
+# roda uma única vez, numa transação própria, e fica registrada em
+# schema_version; os processos do app só conferem a versão ao subir.
+TABELA_VERSAO = 'schema_version'
+
+
+class Migracao(NamedTuple):
+    versao: int
+    descricao: str
+    aplicar: Callable[[sqlite3.Cursor], None]
+
+
+class EsquemaDesatualizado(RuntimeError):
+    """O banco está numa versão anterior à esperada pelo código"""
+
+
+def _tabelas(cursor) -> set:
+    return {nome for nome, in cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def _colunas(cursor, tabela: str) -> set:
+    return {row[1] for row in cursor.execute(f'PRAGMA table_info("{tabela}")')}
+
+
+def reconstruir_resumo(cursor):
+    """Recalcula monthly_summary a partir das transações ativas"""
+    cursor.execute("DELETE FROM monthly_summary")
+    cursor.execute("""
+        INSERT INTO monthly_summary (year, month, type, category, total, count)
+        SELECT CAST(strftime('%Y', date) AS INTEGER),
+               CAST(strftime('%m', date) AS INTEGER),
+               type, category, SUM(amount), COUNT(*)
+        FROM "transaction"
+        WHERE deleted_at IS NULL
+        GROUP BY 1, 2, 3, 4
+    """)
+
+
+def _indices_transaction(cursor):
+    # Índices parciais: cada listagem é servida por um deles (check-query-plans)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_transaction_active_date
+        ON "transaction" (date, id) WHERE deleted_at IS NULL
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_transaction_active_type_date
+        ON "transaction" (type, date, id) WHERE deleted_at IS NULL
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ix_transaction_trash
+        ON "transaction" (deleted_at) WHERE deleted_at IS NOT NULL
+    """)
+
+
+def _esquema_inicial(cursor):
+    # Mesmo DDL que o db.create_all() do app gerava, para adotar bancos existentes
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS "transaction" (
+            id INTEGER NOT NULL,
+            description VARCHAR(100) NOT NULL,
+            amount FLOAT NOT NULL,
+            category VARCHAR(50) NOT NULL,
+            type VARCHAR(10) NOT NULL,
+            date DATE NOT NULL,
+            deleted_at DATETIME,
+            PRIMARY KEY (id)
+        )
+    """)
+    _indices_transaction(cursor)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS monthly_summary (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            type VARCHAR(10) NOT NULL,
+            category VARCHAR(50) NOT NULL,
+            total FLOAT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (year, month, type, category)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            updated_at DATETIME,
+            PRIMARY KEY (id)
+        )
+    """)
+    # updated_at chegou depois da primeira versão de data_version
+    if 'updated_at' not in _colunas(cursor, 'data_version'):
+        cursor.execute("ALTER TABLE data_version ADD COLUMN updated_at DATETIME")
+    cursor.execute("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)")
+    # Bancos anteriores ao resumo mensal
+    if not cursor.execute("SELECT 1 FROM monthly_summary LIMIT 1").fetchone():
+        reconstruir_resumo(cursor)
+
+
+def _busca_texto(cursor):
+    existia = 'transaction_fts' in _tabelas(cursor)
+    for ddl in busca.ddl_fts('transaction', 'id', ['description', 'category']):
+        cursor.execute(ddl)
+    if not existia:
+        cursor.execute(busca.ddl_reconstruir('transaction'))
+
+
+def _converter_transacoes(cursor):
+    """Traz as tabelas em português do antigo dados.py para o esquema único"""
+    tabelas = _tabelas(cursor)
+    if 'transacoes' not in tabelas:
+        return
+    vazia = not cursor.execute('SELECT 1 FROM "transaction" LIMIT 1').fetchone()
+    # Os ids aparecem no log de backup, então são mantidos quando possível
+    colunas = 'id, ' if vazia else ''
+    cursor.execute(f"""
+        INSERT INTO "transaction" ({colunas}description, amount, category, type, date, deleted_at)
+        SELECT {colunas}descricao, valor, categoria, tipo, data, removido_em
+        FROM transacoes
+        ORDER BY id
+    """)
+    if 'controle' in tabelas:
+        # A seq do log de backup passa a ser a versão dos dados
+        cursor.execute("""
+            UPDATE data_version SET version = MAX(version, (
+                SELECT valor FROM controle WHERE chave = 'seq_backup'))
+            WHERE id = 1
+        """)
+        cursor.execute("DROP TABLE controle")
+    # Os gatilhos de transacoes_fts saem junto com a tabela transacoes
+    cursor.execute("DROP TABLE IF EXISTS transacoes_fts")
+    cursor.execute("DROP TABLE transacoes")
+    cursor.execute("DROP TABLE IF EXISTS resumo_mensal")
+    reconstruir_resumo(cursor)
+
+
+def _converter_transactions(cursor):
+    """Traz a tabela `transactions` do models.py, que datava as transações por created_at"""
+    if 'transactions' not in _tabelas(cursor):
+        return
+    cursor.execute("""
+        INSERT INTO "transaction" (description, amount, category, type, date, deleted_at)
+        SELECT description, amount, category, type, date(created_at), deleted_at
+        FROM transactions
+        ORDER BY id
+    """)
+    if cursor.rowcount:
+        cursor.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
+    cursor.execute("DROP TABLE transactions")
+    reconstruir_resumo(cursor)
+
+
+def reconstruir_saldo(cursor):
+    """Recalcula daily_balance a partir das transações ativas"""
+    for sql in saldo.RECONSTRUIR:
+        cursor.execute(sql)
+
+
+def _saldo_diario(cursor):
+    cursor.execute(saldo.DDL)
+    reconstruir_saldo(cursor)
+
+
+def _centavos(cursor):
+    """Valores em centavos inteiros: somas exatas, sem erro de arredondamento"""
+    # A afinidade FLOAT converteria os inteiros em REAL, então a coluna é trocada
+    cursor.execute('ALTER TABLE "transaction" ADD COLUMN amount_cents INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('UPDATE "transaction" SET amount_cents = CAST(ROUND(amount * 100) AS INTEGER)')
+    cursor.execute('ALTER TABLE "transaction" DROP COLUMN amount')
+    cursor.execute('ALTER TABLE "transaction" RENAME COLUMN amount_cents TO amount')
+    # Os agregados são derivados: recriados com colunas inteiras e recalculados
+    cursor.execute("DROP TABLE monthly_summary")
+    cursor.execute("""
+        CREATE TABLE monthly_summary (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            type VARCHAR(10) NOT NULL,
+            category VARCHAR(50) NOT NULL,
+            total INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (year, month, type, category)
+        )
+    """)
+    reconstruir_resumo(cursor)
+    cursor.execute("DROP TABLE daily_balance")
+    cursor.execute(saldo.DDL)
+    reconstruir_saldo(cursor)
+
+
+def _ids_sem_reuso(cursor):
+    """Ids nunca reutilizados (AUTOINCREMENT): sem isso o SQLite reaproveita o
+    maior id depois de uma exclusão definitiva, e quem acompanha as
+    transações pelo id (relatorios.LivroVetorizado, o log de backup)
+    confundiria a nova linha com a excluída"""
+    cursor.execute("""
+        CREATE TABLE transaction_novo (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            description VARCHAR(100) NOT NULL,
+            amount INTEGER NOT NULL,
+            category VARCHAR(50) NOT NULL,
+            type VARCHAR(10) NOT NULL,
+            date DATE NOT NULL,
+            deleted_at DATETIME
+        )
+    """)
+    # Ids explícitos também avançam sqlite_sequence até o maior deles
+    cursor.execute("""
+        INSERT INTO transaction_novo (id, description, amount, category, type, date, deleted_at)
+        SELECT id, description, amount, category, type, date, deleted_at FROM "transaction"
+    """)
+    # Índices e gatilhos da busca saem junto com a tabela antiga e são recriados
+    cursor.execute('DROP TABLE "transaction"')
+    cursor.execute('ALTER TABLE transaction_novo RENAME TO "transaction"')
+    _indices_transaction(cursor)
+    for ddl in busca.ddl_fts('transaction', 'id', ['description', 'category']):
+        cursor.execute(ddl)
+
+
+def _orcamentos(cursor):
+    cursor.execute(orcamento.DDL)
+
+
+MIGRACOES: List[Migracao] = [
+    Migracao(1, 'esquema inicial (transaction, monthly_summary, data_version)', _esquema_inicial),
+    Migracao(2, 'índice de texto completo sobre descrição e categoria', _busca_texto),
+    Migracao(3, 'converte as tabelas do dados.py (transacoes, resumo_mensal, controle)',
+             _converter_transacoes),
+    Migracao(4, 'converte a tabela transactions do models.py', _converter_transactions),
+    Migracao(5, 'saldo diário acumulado (daily_balance)', _saldo_diario),
+    Migracao(6, 'valores em centavos inteiros (amount, total, net, balance)', _centavos),
+    Migracao(7, 'orçamentos mensais por categoria (budget)', _orcamentos),
+    Migracao(8, 'ids de transaction nunca reutilizados (AUTOINCREMENT)', _ids_sem_reuso),
+]
+
+VERSAO_ATUAL = MIGRACOES[-1].versao
+
+
+def versao(con: sqlite3.Connection) -> int:
+    """Versão do esquema do banco (0 se nenhuma migração foi aplicada)"""
+    try:
+        return con.execute(f"SELECT MAX(version) FROM {TABELA_VERSAO}").fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return 0
+
+
+def verificar(con: sqlite3.Connection, comando: str = 'flask --app app migrate'):
+    """Levanta EsquemaDesatualizado se faltar aplicar alguma migração"""
+    atual = versao(con)
+    if atual < VERSAO_ATUAL:
+        raise EsquemaDesatualizado(
+            f'Banco na versão {atual} do esquema, esperada {VERSAO_ATUAL}: execute `{comando}`')
+
+
+def pendentes(con: sqlite3.Connection) -> List[Migracao]:
+    atual = versao(con)
+    return [m for m in MIGRACOES if m.versao > atual]
+
+
+def migrar(caminho, ao_aplicar: Optional[Callable[[Migracao, float], None]] = None) -> List[Migracao]:
+    """Aplica as migrações pendentes, cada uma em sua própria transação.
+
+    `ao_aplicar(migracao, segundos)` é chamado após cada uma. Duas execuções
+    simultâneas não aplicam a mesma migração duas vezes: a versão é relida
+    depois de obtido o lock de escrita.
+    """
+    con = conectar(caminho, isolation_level=None)
+    aplicadas = []
+    try:
+        con.execute(f"""
+            CREATE TABLE IF NOT EXISTS {TABELA_VERSAO} (
+                version INTEGER NOT NULL PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at DATETIME NOT NULL
+            )
+        """)
+        for migracao in MIGRACOES:
+            inicio = time.perf_counter()
+            cursor = con.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                if migracao.versao <= versao(con):
+                    cursor.execute("ROLLBACK")
+                    continue
+                migracao.aplicar(cursor)
+                cursor.execute(f"INSERT INTO {TABELA_VERSAO} VALUES (?, ?, ?)",
+                               (migracao.versao, migracao.descricao, datetime.now()))
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            aplicadas.append(migracao)
+            if ao_aplicar:
+                ao_aplicar(migracao, time.perf_counter() - inicio)
+    finally:
+        con.close()
+    return aplicadas
@@ -0,0 +1,105 @@
+import os
+from typing import Dict, Iterable, List, Tuple
+
+# Orçamentos mensais por categoria (tabela budget): um limite de despesas em
+# centavos, o mesmo para todos os meses. O gasto do mês em cada categoria já
+# é um contador mantido por todas as escritas (inclusão, exclusão lógica,
+# restauração e exclusão definitiva, no app e em dados.py): a linha
+# (ano, mês, 'expense', categoria) de monthly_summary. A situação dos
+# orçamentos é, portanto, uma busca na chave primária por categoria, sem
+# somar transações; ESPERADO e RECONSTRUIR recalculam esses contadores do zero.
+
+# Fração do limite a partir da qual o orçamento aparece em alerta
+ALERTA = float(os.getenv('BUDGET_WARN_RATIO', 0.8))
+
+DDL = """
+    CREATE TABLE IF NOT EXISTS budget (
+        category VARCHAR(50) NOT NULL,
+        amount INTEGER NOT NULL,
+        PRIMARY KEY (category)
+    ) WITHOUT ROWID
+"""
+
+DEFINIR = """
+    INSERT INTO budget (category, amount) VALUES (:category, :amount)
+    ON CONFLICT (category) DO UPDATE SET amount = excluded.amount
+"""
+
+REMOVER = "DELETE FROM budget WHERE category = :category"
+
+# Limite e gasto do mês de cada categoria com orçamento
+SITUACAO = """
+    SELECT b.category, b.amount, COALESCE(s.total, 0)
+    FROM budget b
+    LEFT JOIN monthly_summary s
+        ON s.year = :year AND s.month = :month
+        AND s.type = 'expense' AND s.category = b.category
+    ORDER BY b.category
+"""
+
+_DESPESAS_ORCADAS = """
+    FROM "transaction"
+    WHERE deleted_at IS NULL AND type = 'expense'
+      AND category IN (SELECT category FROM budget)
+"""
+
+# Contadores recalculados a partir das transações: (ano, mês, categoria, total, quantidade)
+ESPERADO = f"""
+    SELECT CAST(strftime('%Y', date) AS INTEGER),
+           CAST(strftime('%m', date) AS INTEGER),
+           category, SUM(amount), COUNT(*)
+    {_DESPESAS_ORCADAS}
+    GROUP BY 1, 2, 3
+"""
+
+GRAVADO = """
+    SELECT year, month, category, total, count
+    FROM monthly_summary
+    WHERE type = 'expense' AND count != 0
+      AND category IN (SELECT category FROM budget)
+"""
+
+RECONSTRUIR = (
+    """
+    DELETE FROM monthly_summary
+    WHERE type = 'expense' AND category IN (SELECT category FROM budget)
+    """,
+    f"""
+    INSERT INTO monthly_summary (year, month, type, category, total, count)
+    SELECT CAST(strftime('%Y', date) AS INTEGER),
+           CAST(strftime('%m', date) AS INTEGER),
+           'expense', category, SUM(amount), COUNT(*)
+    {_DESPESAS_ORCADAS}
+    GROUP BY 1, 2, 4
+    """,
+)
+
+
+def situacao(categoria: str, limite: int, gasto: int) -> Dict:
+    """Gasto, saldo e estado (ok, alerta ou estourado) de um orçamento, em centavos"""
+    percentual = round(100 * gasto / limite) if limite else 0
+    if gasto > limite:
+        estado = 'estourado'
+    elif gasto >= ALERTA * limite:
+        estado = 'alerta'
+    else:
+        estado = 'ok'
+    return {'categoria': categoria, 'limite': limite, 'gasto': gasto,
+            'restante': limite - gasto, 'percentual': percentual, 'estado': estado}
+
+
+def situacoes(linhas: Iterable[Tuple]) -> List[Dict]:
+    """situacao() de cada linha de SITUACAO"""
+    return [situacao(categoria, limite, gasto) for categoria, limite, gasto in linhas]
+
+
+def divergencias(esperado: Iterable[Tuple], gravado: Iterable[Tuple]) -> List[Tuple]:
+    """Compara os contadores gravados com os recalculados (linhas de ESPERADO e GRAVADO).
+
+    Devolve [((ano, mês, categoria), (total, quantidade) esperados, gravados)].
+    """
+    calculado = {tuple(linha[:3]): tuple(linha[3:]) for linha in esperado}
+    atual = {tuple(linha[:3]): tuple(linha[3:]) for linha in gravado}
+    return [(chave, calculado.get(chave, (0, 0)), atual.get(chave, (0, 0)))
+            for chave in sorted(calculado.keys() | atual.keys())
+            if calculado.get(chave, (0, 0)) != atual.get(chave, (0, 0))]
@@ -0,0 +1,36 @@
+from datetime import date
+from typing import Optional, Tuple
+
+# Intervalo semiaberto que nenhuma data satisfaz
+VAZIO = (date.min, date.min)
+
+
+def intervalo_periodo(ano: Optional[int] = None,
+                      mes: Optional[int] = None) -> Optional[Tuple[date, date]]:
+    """Converte um filtro de ano/mês no intervalo semiaberto [inicio, fim).
+
+    Comparações `data >= inicio AND data < fim` podem usar índices sobre a
+    coluna de data, ao contrário de strftime()/extract(). Sem ano não há
+    intervalo contínuo, e quem chama decide como filtrar apenas pelo mês.
+    Ano fora de 1..9998 ou mês fora de 1..12 dá VAZIO: nenhuma linha, como
+    nos antigos filtros por extract(), em vez de um ValueError de `date`.
+    """
+    if not ano:
+        return None
+    if not date.min.year <= ano < date.max.year or mes and not 1 <= mes <= 12:
+        return VAZIO
+    if not mes:
+        return date(ano, 1, 1), date(ano + 1, 1, 1)
+    inicio = date(ano, mes, 1)
+    fim = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+    return inicio, fim
+
+
+def plano_usa_indice(detalhes) -> bool:
+    """Indica se as linhas de um EXPLAIN QUERY PLAN evitam varredura completa"""
+    for detalhe in detalhes:
+        if detalhe.startswith('SCAN') and 'USING' not in detalhe:
+            return False
+        if 'TEMP B-TREE' in detalhe:
+            return False
+    return True
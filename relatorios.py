@@ -0,0 +1,215 @@
+import threading
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+RECEITA = 1
+DESPESA = 0
+
+NOMES_MESES = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun',
+               'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+
+
+def indice_mes(ano: int, mes: int) -> int:
+    return ano * 12 + mes - 1
+
+
+def rotulo_mes(indice: int) -> str:
+    return f'{NOMES_MESES[indice % 12]}/{indice // 12}'
+
+
+class Colunas:
+    """Foto imutável do livro em arrays NumPy (uma posição por transação)"""
+
+    __slots__ = ('ids', 'meses', 'valores', 'categorias', 'tipos', 'ativas', 'nomes_categorias')
+
+    def __init__(self, ids, meses, valores, categorias, tipos, ativas, nomes_categorias):
+        self.ids = ids                    # int64, crescente
+        self.meses = meses                # int32, ano * 12 + mês - 1
+        self.valores = valores            # int64, centavos, sempre positivo
+        self.categorias = categorias      # int32, código em nomes_categorias
+        self.tipos = tipos                # int8, RECEITA ou DESPESA
+        self.ativas = ativas              # bool, fora da lixeira
+        self.nomes_categorias = nomes_categorias
+
+    @classmethod
+    def vazia(cls):
+        return cls(np.empty(0, np.int64), np.empty(0, np.int32), np.empty(0, np.int64),
+                   np.empty(0, np.int32), np.empty(0, np.int8), np.empty(0, bool), [])
+
+
+class LivroVetorizado:
+    """Colunas do livro em memória, atualizadas de forma incremental.
+
+    `carregar(desde_id)` devolve (id, data, valor, categoria, tipo, removida)
+    de todas as linhas com id > desde_id; `ids_lixeira()` os ids na lixeira;
+    `ids_existentes(ids)` quais desses ids ainda existem; `total_ativas()` a
+    quantidade de transações ativas, usada para detectar exclusões que a
+    atualização incremental não enxerga (nesse caso tudo é recarregado).
+    Depende de ids nunca reutilizados (AUTOINCREMENT, migração 8).
+    """
+
+    def __init__(self,
+                 carregar: Callable[[int], Iterable[Tuple]],
+                 ids_lixeira: Callable[[], Iterable[int]],
+                 ids_existentes: Callable[[List[int]], Iterable[int]],
+                 total_ativas: Callable[[], int]):
+        self._carregar = carregar
+        self._ids_lixeira = ids_lixeira
+        self._ids_existentes = ids_existentes
+        self._total_ativas = total_ativas
+        self._codigos: Dict[str, int] = {}
+        self._versao = None
+        self._trava = threading.Lock()
+        self.colunas = Colunas.vazia()
+        self.recargas = 0
+
+    def _codificar(self, categoria: str) -> int:
+        codigo = self._codigos.get(categoria)
+        if codigo is None:
+            codigo = self._codigos[categoria] = len(self._codigos)
+        return codigo
+
+    def _ler(self, desde_id: int):
+        linhas = list(self._carregar(desde_id))
+        n = len(linhas)
+        ids = np.fromiter((l[0] for l in linhas), np.int64, n)
+        meses = np.fromiter((indice_mes(l[1].year, l[1].month) for l in linhas), np.int32, n)
+        valores = np.fromiter((l[2] for l in linhas), np.int64, n)
+        categorias = np.fromiter((self._codificar(l[3]) for l in linhas), np.int32, n)
+        tipos = np.fromiter((RECEITA if l[4] == 'income' else DESPESA for l in linhas), np.int8, n)
+        ativas = np.fromiter((not l[5] for l in linhas), bool, n)
+        return ids, meses, valores, categorias, tipos, ativas
+
+    def _recarregar(self) -> Colunas:
+        self._codigos = {}
+        self.recargas += 1
+        return Colunas(*self._ler(0), list(self._codigos))
+
+    def _incremental(self, atual: Colunas) -> Colunas:
+        ultimo_id = int(atual.ids[-1]) if len(atual.ids) else 0
+        novas = self._ler(ultimo_id)
+        ids, meses, valores, categorias, tipos, ativas = (
+            np.concatenate((antiga, nova)) for antiga, nova in zip(
+                (atual.ids, atual.meses, atual.valores, atual.categorias,
+                 atual.tipos, atual.ativas), novas)
+        )
+
+        lixeira = np.fromiter(self._ids_lixeira(), np.int64)
+        na_lixeira = np.isin(ids, lixeira)
+        # Linhas que saíram da lixeira foram restauradas ou excluídas de vez
+        saiu = ~ativas & ~na_lixeira
+        if saiu.any():
+            existentes = np.fromiter(self._ids_existentes(ids[saiu].tolist()), np.int64)
+            manter = ~saiu | np.isin(ids, existentes)
+            ids, meses, valores, categorias, tipos, na_lixeira = (
+                a[manter] for a in (ids, meses, valores, categorias, tipos, na_lixeira)
+            )
+        ativas = ~na_lixeira
+        colunas = Colunas(ids, meses, valores, categorias, tipos, ativas, list(self._codigos))
+        if int(ativas.sum()) != self._total_ativas():
+            return self._recarregar()
+        return colunas
+
+    def atualizar(self, versao: int) -> Colunas:
+        """Devolve as colunas para a versão dos dados informada"""
+        with self._trava:
+            if versao != self._versao:
+                self.colunas = (self._incremental(self.colunas) if self._versao is not None
+                                else self._recarregar())
+                self._versao = versao
+            return self.colunas
+
+
+def _somar(posicoes: np.ndarray, valores: np.ndarray, tamanho: int) -> np.ndarray:
+    """Soma os centavos por posição, como int64.
+
+    bincount acumula em float64, que é exato para inteiros até 2^53
+    centavos (R$ 90 trilhões); o resultado volta a ser inteiro.
+    """
+    return np.rint(np.bincount(posicoes, weights=valores, minlength=tamanho)).astype(np.int64)
+
+
+def _filtro(c: Colunas, tipo: Optional[int] = None,
+            inicio: Optional[int] = None, fim: Optional[int] = None) -> np.ndarray:
+    mascara = c.ativas.copy()
+    if tipo is not None:
+        mascara &= c.tipos == tipo
+    if inicio is not None:
+        mascara &= c.meses >= inicio
+    if fim is not None:
+        mascara &= c.meses < fim
+    return mascara
+
+
+def por_categoria(c: Colunas, tipo: int = DESPESA,
+                  ano: Optional[int] = None, mes: Optional[int] = None) -> List[Dict]:
+    """Total, quantidade e média por categoria, do maior para o menor total"""
+    if ano and mes:
+        inicio, fim = indice_mes(ano, mes), indice_mes(ano, mes) + 1
+    elif ano:
+        inicio, fim = indice_mes(ano, 1), indice_mes(ano + 1, 1)
+    else:
+        inicio = fim = None
+    mascara = _filtro(c, tipo, inicio, fim)
+    n = len(c.nomes_categorias)
+    totais = _somar(c.categorias[mascara], c.valores[mascara], n)
+    quantidades = np.bincount(c.categorias[mascara], minlength=n)
+    geral = totais.sum()
+    ordem = np.argsort(-totais)
+    return [{
+        'categoria': c.nomes_categorias[i],
+        'total': int(totais[i]),
+        'quantidade': int(quantidades[i]),
+        'media': float(totais[i] / quantidades[i]),
+        'percentual': float(totais[i] / geral * 100) if geral else 0.0,
+    } for i in ordem if quantidades[i]]
+
+
+def tendencia_mensal(c: Colunas, inicio: int, fim: int, janela: int = 3) -> List[Dict]:
+    """Receitas, despesas, saldo e média móvel do saldo para os meses [inicio, fim)"""
+    tamanho = max(fim - inicio, 0)
+    mascara = _filtro(c, None, inicio, fim)
+    posicoes = c.meses[mascara] - inicio
+    receita = c.tipos[mascara] == RECEITA
+    valores = c.valores[mascara]
+    receitas = _somar(posicoes[receita], valores[receita], tamanho)
+    despesas = _somar(posicoes[~receita], valores[~receita], tamanho)
+    saldo = receitas - despesas
+    acumulado = np.cumsum(np.concatenate(([0], saldo)))
+    janelas = np.minimum(np.arange(1, tamanho + 1), janela)
+    movel = (acumulado[1:] - acumulado[np.arange(tamanho) + 1 - janelas]) / janelas
+    return [{
+        'mes': rotulo_mes(inicio + i),
+        'receitas': int(receitas[i]),
+        'despesas': int(despesas[i]),
+        'saldo': int(saldo[i]),
+        'media_movel': float(movel[i]),
+    } for i in range(tamanho)]
+
+
+def comparativo_anual(c: Colunas, ano: int, tipo: int = DESPESA) -> List[Dict]:
+    """Total de cada mês do ano contra o mesmo mês do ano anterior"""
+    inicio = indice_mes(ano - 1, 1)
+    mascara = _filtro(c, tipo, inicio, inicio + 24)
+    totais = _somar(c.meses[mascara] - inicio, c.valores[mascara], 24)
+    anterior, atual = totais[:12], totais[12:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variacao = np.where(anterior > 0, (atual - anterior) / anterior * 100, np.nan)
+    return [{
+        'mes': NOMES_MESES[i],
+        'anterior': int(anterior[i]),
+        'atual': int(atual[i]),
+        'variacao': None if np.isnan(variacao[i]) else float(variacao[i]),
+    } for i in range(12)]
+
+
+def intervalo_meses(c: Colunas) -> Tuple[int, int]:
+    """Primeiro e último+1 índices de mês com transações ativas"""
+    meses = c.meses[c.ativas]
+    if not len(meses):
+        hoje = date.today()
+        atual = indice_mes(hoje.year, hoje.month)
+        return atual, atual + 1
+    return int(meses.min()), int(meses.max()) + 1
@@ -0,0 +1,126 @@
+from datetime import date
+from itertools import accumulate
+from typing import Dict, Iterable, List, Tuple
+
+# Saldo diário acumulado (tabela daily_balance): uma linha por dia com
+# transações ativas, com o líquido do dia (receitas - despesas) e o saldo ao
+# fim dele, em centavos. O saldo numa data é uma busca na chave primária
+# (O(log n)); cada escrita soma ao líquido do seu dia e reacumula só os dias
+# a partir dele, o que para lançamentos do dia corrente é uma única linha.
+
+VALOR_ASSINADO = "CASE WHEN type = 'income' THEN amount ELSE -amount END"
+
+# WITHOUT ROWID: as linhas ficam ordenadas pela data, e um intervalo de
+# datas (gráficos) é uma leitura contínua
+DDL = """
+    CREATE TABLE IF NOT EXISTS daily_balance (
+        date DATE NOT NULL,
+        net INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        balance INTEGER NOT NULL,
+        PRIMARY KEY (date)
+    ) WITHOUT ROWID
+"""
+
+SOMAR_DIA = """
+    INSERT INTO daily_balance (date, net, count, balance)
+    VALUES (:date, :net, :count, 0)
+    ON CONFLICT (date) DO UPDATE SET
+        net = net + excluded.net,
+        count = count + excluded.count
+"""
+
+# Dias que ficaram sem transações ativas saem da série
+REMOVER_VAZIO = "DELETE FROM daily_balance WHERE date = :date AND count = 0"
+
+# Refaz o saldo de :desde em diante, partindo do saldo do último dia anterior
+ACUMULAR = """
+    UPDATE daily_balance SET balance = acumulado.balance
+    FROM (
+        SELECT date,
+               SUM(net) OVER (ORDER BY date) + COALESCE((
+                   SELECT balance FROM daily_balance
+                   WHERE date < :desde
+                   ORDER BY date DESC LIMIT 1), 0) AS balance
+        FROM daily_balance
+        WHERE date >= :desde
+    ) AS acumulado
+    WHERE daily_balance.date = acumulado.date
+"""
+
+SALDO_EM = """
+    SELECT balance FROM daily_balance
+    WHERE date <= :date
+    ORDER BY date DESC LIMIT 1
+"""
+
+SERIE = """
+    SELECT date, balance FROM daily_balance
+    WHERE date >= :inicio AND date <= :fim
+    ORDER BY date
+"""
+
+ESPERADO = f"""
+    SELECT date, SUM({VALOR_ASSINADO}), COUNT(*)
+    FROM "transaction"
+    WHERE deleted_at IS NULL
+    GROUP BY date
+    ORDER BY date
+"""
+
+RECONSTRUIR = (
+    "DELETE FROM daily_balance",
+    f"""
+    INSERT INTO daily_balance (date, net, count, balance)
+    SELECT date, SUM({VALOR_ASSINADO}), COUNT(*),
+           SUM(SUM({VALOR_ASSINADO})) OVER (ORDER BY date)
+    FROM "transaction"
+    WHERE deleted_at IS NULL
+    GROUP BY date
+    """,
+)
+
+
+def assinado(tipo: str, centavos: int) -> int:
+    return centavos if tipo == 'income' else -centavos
+
+
+def agrupar_por_dia(transacoes: Iterable[Dict]) -> Dict[str, Tuple[int, int]]:
+    """Soma um lote por dia: {data ISO: (líquido em centavos, quantidade)}"""
+    dias: Dict[str, Tuple[int, int]] = {}
+    for t in transacoes:
+        dia = str(t['date'])[:10]
+        liquido, quantidade = dias.get(dia, (0, 0))
+        dias[dia] = (liquido + assinado(t['type'], t['amount']), quantidade + 1)
+    return dias
+
+
+def parametros(dias: Dict[str, Tuple[int, int]], sinal: int = 1) -> List[Dict]:
+    """Linhas para SOMAR_DIA; sinal=-1 retira os dias da série"""
+    return [{'date': dia, 'net': sinal * liquido, 'count': sinal * quantidade}
+            for dia, (liquido, quantidade) in dias.items()]
+
+
+def iso(dia) -> str:
+    return dia.isoformat() if isinstance(dia, date) else str(dia)[:10]
+
+
+def divergencias(esperado: Iterable[Tuple], armazenado: Iterable[Tuple]) -> List[Tuple]:
+    """Compara a série (data, líquido, quantidade, saldo) gravada com a recalculada.
+
+    `esperado` são as linhas de ESPERADO, em ordem de data; o saldo de cada
+    dia é acumulado aqui.
+    """
+    esperado = list(esperado)
+    saldos = accumulate(liquido for _, liquido, _ in esperado)
+    calculado = {iso(dia): (liquido, quantidade, saldo)
+                 for (dia, liquido, quantidade), saldo in zip(esperado, saldos)}
+    gravado = {iso(dia): (liquido, quantidade, saldo)
+               for dia, liquido, quantidade, saldo in armazenado}
+    resultado = []
+    for dia in sorted(calculado.keys() | gravado.keys()):
+        a = calculado.get(dia, (0, 0, None))
+        b = gravado.get(dia, (0, 0, None))
+        if a != b:
+            resultado.append((dia, a, b))
+    return resultado
@@ -0,0 +1,69 @@
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+# app.py e dados.py leem os caminhos ao serem importados: os bancos dos
+# testes ficam numa pasta temporária, nunca em instance/
+PASTA = Path(tempfile.mkdtemp(prefix='contas-testes-'))
+os.environ['DATABASE_PATH'] = str(PASTA / 'app.db')
+os.environ['LEDGERS_DIR'] = str(PASTA / 'ledgers')
+os.environ['DADOS_LEDGERS_DIR'] = str(PASTA / 'dados')
+os.environ['TRASH_RETENTION_DAYS'] = '0'
+
+
+@pytest.fixture
+def abrir_dados(tmp_path):
+    """abrir_dados(nome) -> GerenciadorTransacoes de um banco migrado em tmp_path.
+
+    Fora do singleton e do LRU de livros: reabrir o mesmo nome depois de
+    apagar o banco simula a perda do .db com o log de backup preservado.
+    """
+    import dados
+    import migracoes
+    abertos = []
+
+    def abrir(nome='financas'):
+        caminho = tmp_path / f'{nome}.db'
+        migracoes.migrar(caminho)
+        gerenciador = object.__new__(dados.GerenciadorTransacoes)
+        gerenciador.inicializar(caminho, tmp_path / f'{nome}_backup.json')
+        abertos.append(gerenciador)
+        return gerenciador
+
+    yield abrir
+    for gerenciador in abertos:
+        gerenciador.fechar()
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+    import migracoes
+    migracoes.migrar(app.DB_PATH)
+    app.LEDGERS_DIR.mkdir(parents=True, exist_ok=True)
+    return app
+
+
+@pytest.fixture
+def livro(app_module):
+    """Nome de um livro do app novo e migrado, usado só por este teste"""
+    import livros
+    import migracoes
+    nome = f't{uuid.uuid4().hex[:12]}'
+    migracoes.migrar(livros.caminho(app_module.LEDGERS_DIR, nome))
+    return nome
+
+
+@pytest.fixture
+def cliente(app_module, livro):
+    """Cliente de teste cujas requisições vão ao livro do teste (X-Ledger)"""
+    cliente = app_module.app.test_client()
+    cliente.environ_base['HTTP_X_LEDGER'] = livro
+    return cliente
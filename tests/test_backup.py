@@ -0,0 +1,74 @@
+"""Snapshot + change log of dados.py: replaying must reproduce the ledger,
+including permanent deletes logged after the last snapshot."""
+from pathlib import Path
+
+
+def _adicionar(gerenciador, n):
+    return [gerenciador.adicionar_transacao({'description': f't{i}', 'amount': 10,
+                                             'category': 'A', 'type': 'income',
+                                             'date': f'2024-01-0{i + 1}'})
+            for i in range(n)]
+
+
+def _perder_banco(gerenciador):
+    gerenciador.fechar()
+    for arquivo in Path(gerenciador.registro.log_file).parent.glob('financas.db*'):
+        arquivo.unlink()
+
+
+def test_permanent_deletes_after_snapshot_stay_deleted(abrir_dados):
+    gerenciador = abrir_dados()
+    ids = _adicionar(gerenciador, 3)
+    gerenciador.salvar_backup()
+    for id in ids:
+        gerenciador.excluir_permanentemente(id)
+
+    gerenciador.carregar_backup()
+    assert gerenciador.obter_todas_transacoes(include_removed=True) == []
+
+    _perder_banco(gerenciador)
+    gerenciador = abrir_dados()
+    gerenciador.carregar_backup()
+    assert gerenciador.obter_todas_transacoes(include_removed=True) == []
+    assert gerenciador.reconstruir_resumo(verificar=True) == []
+
+
+def test_lost_database_is_rebuilt_from_snapshot_and_log(abrir_dados):
+    gerenciador = abrir_dados()
+    ids = _adicionar(gerenciador, 3)
+    gerenciador.salvar_backup()
+    gerenciador.remover_transacao(ids[0])
+    gerenciador.excluir_permanentemente(ids[1])
+    gerenciador.definir_orcamento('A', 50)
+    esperado = gerenciador.obter_todas_transacoes(include_removed=True)
+
+    _perder_banco(gerenciador)
+    gerenciador = abrir_dados()
+    gerenciador.carregar_backup()
+    assert gerenciador.obter_todas_transacoes(include_removed=True) == esperado
+    assert gerenciador.obter_total_por_tipo('income') == 10
+    assert [o['limite'] for o in gerenciador.obter_orcamentos(1, 2024)] == [50]
+
+
+def test_log_without_snapshot_is_replayed(abrir_dados):
+    gerenciador = abrir_dados()
+    _adicionar(gerenciador, 2)
+    assert not gerenciador.registro.snapshot_file.exists()
+
+    _perder_banco(gerenciador)
+    gerenciador = abrir_dados()
+    gerenciador.carregar_backup()
+    assert len(gerenciador.obter_todas_transacoes()) == 2
+
+
+def test_removing_a_trashed_row_keeps_its_date_and_logs_once(abrir_dados):
+    gerenciador = abrir_dados()
+    id, = _adicionar(gerenciador, 1)
+    gerenciador.remover_transacao(id)
+    removida = gerenciador.obter_transacoes_removidas()
+
+    gerenciador.remover_transacao(id)
+    gerenciador.remover_transacao(id + 1)
+    assert gerenciador.obter_transacoes_removidas() == removida
+    assert [r['op'] for r in gerenciador.registro.ler_log()].count('remover') == 1
+    assert gerenciador.reconstruir_resumo(verificar=True) == []
@@ -0,0 +1,38 @@
+"""Full-text search filters by period the same way in the app (/buscar) and
+in dados.py (buscar): year and month, year only, and month of any year."""
+import pytest
+
+LINHAS = [('Mercado março', '2023-03-10'), ('Mercado abril', '2024-04-02'),
+          ('Mercado abril antigo', '2023-04-20'), ('Mercado maio', '2024-05-05')]
+
+PERIODOS = [({}, {'Mercado março', 'Mercado abril', 'Mercado abril antigo', 'Mercado maio'}),
+            ({'ano': 2024}, {'Mercado abril', 'Mercado maio'}),
+            ({'mes': 4}, {'Mercado abril', 'Mercado abril antigo'}),
+            ({'mes': 4, 'ano': 2024}, {'Mercado abril'})]
+
+
+@pytest.fixture
+def gerenciador(abrir_dados):
+    gerenciador = abrir_dados()
+    for descricao, dia in LINHAS:
+        gerenciador.adicionar_transacao({'description': descricao, 'amount': 10,
+                                         'category': 'Alimentação', 'type': 'expense',
+                                         'date': dia})
+    return gerenciador
+
+
+@pytest.mark.parametrize('periodo, esperado', PERIODOS)
+def test_dados_search_period(gerenciador, periodo, esperado):
+    assert {t['description'] for t in gerenciador.buscar('mercado', **periodo)} == esperado
+
+
+@pytest.mark.parametrize('periodo, esperado', PERIODOS)
+def test_app_search_period(cliente, periodo, esperado):
+    for descricao, dia in LINHAS:
+        cliente.post('/add', data={'description': descricao, 'amount': '10.00',
+                                   'category': 'Alimentação', 'type': 'expense',
+                                   'transaction_date': dia})
+    consulta = {'q': 'mercado', 'year': periodo.get('ano', ''), 'month': periodo.get('mes', '')}
+    pagina = cliente.get('/buscar', query_string=consulta).get_data(as_text=True)
+    encontrados = {descricao for descricao, _ in LINHAS if f'>{descricao}<' in pagina}
+    assert encontrados == esperado
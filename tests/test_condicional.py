@@ -0,0 +1,86 @@
+"""Conditional GETs (app.conditional): an unchanged page answers 304 to
+its ETag or Last-Modified, and a write or the date changing at midnight
+makes it 200 again."""
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+import livros
+
+
+@pytest.fixture
+def navegador(app_module, livro):
+    """Cliente sem cookies (sem mensagens flash pendentes) no livro do teste"""
+    cliente = app_module.app.test_client(use_cookies=False)
+    cliente.environ_base['HTTP_X_LEDGER'] = livro
+    return cliente
+
+
+def _adicionar(cliente):
+    resposta = cliente.post('/add', data={'description': 'Padaria', 'amount': '9.50',
+                                          'category': 'Alimentação', 'type': 'expense',
+                                          'transaction_date': date.today().isoformat()})
+    assert resposta.status_code == 302
+
+
+def test_unchanged_page_answers_304(navegador):
+    primeira = navegador.get('/')
+    assert primeira.status_code == 200
+    etag, last_modified = primeira.headers['ETag'], primeira.headers['Last-Modified']
+
+    resposta = navegador.get('/', headers={'If-None-Match': etag})
+    assert resposta.status_code == 304
+    assert resposta.headers['ETag'] == etag and not resposta.data
+    assert navegador.get('/', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+
+def test_write_invalidates_etag_and_last_modified(app_module, navegador, livro):
+    primeira = navegador.get('/')
+    etag = primeira.headers['ETag']
+    _adicionar(navegador)
+
+    resposta = navegador.get('/', headers={'If-None-Match': etag})
+    assert resposta.status_code == 200
+    assert 'Padaria' in resposta.get_data(as_text=True)
+    assert resposta.headers['ETag'] != etag
+
+    # Last-Modified tem resolução de segundos: a próxima escrita cai um minuto depois
+    last_modified = resposta.headers['Last-Modified']
+    con = sqlite3.connect(str(livros.caminho(app_module.LEDGERS_DIR, livro)))
+    con.execute("UPDATE data_version SET version = version + 1, "
+                "updated_at = datetime(updated_at, '+1 minute')")
+    con.commit()
+    con.close()
+    assert navegador.get('/', headers={'If-Modified-Since': last_modified}).status_code == 200
+
+
+def test_pages_expire_at_midnight(app_module, navegador, monkeypatch):
+    _adicionar(navegador)
+    ontem = navegador.get('/')
+    etag, last_modified = ontem.headers['ETag'], ontem.headers['Last-Modified']
+
+    class Amanha(date):
+        @classmethod
+        def today(cls):
+            return date.today() + timedelta(days=1)
+
+    monkeypatch.setattr(app_module, 'date', Amanha)
+    assert navegador.get('/', headers={'If-None-Match': etag}).status_code == 200
+    resposta = navegador.get('/', headers={'If-Modified-Since': last_modified})
+    assert resposta.status_code == 200
+    # A nova página vale até a meia-noite seguinte
+    hoje = resposta.headers['Last-Modified']
+    assert navegador.get('/', headers={'If-Modified-Since': hoje}).status_code == 304
+
+
+def test_pending_flash_is_always_rendered(cliente):
+    _adicionar(cliente)
+    # A primeira visita mostra (e consome) a mensagem da inclusão, sem ETag
+    assert 'ETag' not in cliente.get('/').headers
+    etag = cliente.get('/').headers['ETag']
+    # Erro que só redireciona: nada muda no livro, mas há uma mensagem a mostrar
+    cliente.post('/orcamentos', data={'category': 'Lazer', 'amount': 'abc'})
+    resposta = cliente.get('/', headers={'If-None-Match': etag})
+    assert resposta.status_code == 200
+    assert 'Dados inválidos' in resposta.get_data(as_text=True)
@@ -0,0 +1,42 @@
+import sqlite3
+import threading
+
+import pytest
+
+from conexao import ConexoesPorThread
+
+
+def test_connection_is_closed_when_its_thread_ends(tmp_path):
+    conexoes = ConexoesPorThread(tmp_path / 'x.db')
+    principal = conexoes.obter()
+    das_threads = []
+
+    def usar():
+        con = conexoes.obter()
+        assert con is conexoes.obter()
+        con.execute('SELECT 1')
+        das_threads.append(con)
+
+    for _ in range(50):
+        thread = threading.Thread(target=usar)
+        thread.start()
+        thread.join()
+
+    assert conexoes.abertas == 1
+    assert len(das_threads) == 50
+    for con in das_threads:
+        with pytest.raises(sqlite3.ProgrammingError):
+            con.execute('SELECT 1')
+    principal.execute('SELECT 1')
+
+
+def test_fechar_todas(tmp_path):
+    conexoes = ConexoesPorThread(tmp_path / 'x.db')
+    con = conexoes.obter()
+    conexoes.fechar_todas()
+    assert conexoes.abertas == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        con.execute('SELECT 1')
+    # Depois de fechar, a thread abre uma nova sob demanda
+    assert conexoes.obter() is not con
+    assert conexoes.abertas == 1
@@ -0,0 +1,58 @@
+import io
+from collections import Counter
+from datetime import date
+
+import importacao
+
+
+def _importar(texto, formato='csv', banco=None, tamanho_lote=importacao.TAMANHO_LOTE):
+    """Importa `texto` contra um banco em memória (lista de transações)"""
+    banco = [] if banco is None else banco
+
+    def chaves_existentes(inicio, fim):
+        return Counter(importacao.chave(t['date'], t['description'], t['amount'], t['type'])
+                       for t in banco if inicio <= t['date'] <= fim)
+
+    resultado = importacao.importar_extrato(io.StringIO(texto), formato, chaves_existentes,
+                                            banco.extend, tamanho_lote)
+    return resultado, banco
+
+
+CSV = """data;descricao;valor
+2024-03-01;Padaria;-15,00
+2024-03-01;Padaria;-15,00
+2024-03-02;Salario;1000,00
+"""
+
+
+def test_identical_rows_in_one_statement_are_all_imported():
+    resultado, banco = _importar(CSV)
+    assert (resultado.inseridas, resultado.duplicadas) == (3, 0)
+    assert sum(t['description'] == 'Padaria' for t in banco) == 2
+
+
+def test_reimport_only_adds_missing_copies():
+    _, banco = _importar(CSV)
+    resultado, banco = _importar(CSV, banco=banco)
+    assert (resultado.inseridas, resultado.duplicadas) == (0, 3)
+
+    # Uma cópia já gravada: das três do arquivo entram duas
+    banco = [banco[0]]
+    tres = CSV.replace('2024-03-02;Salario;1000,00\n', '2024-03-01;Padaria;-15,00\n')
+    resultado, banco = _importar(tres, banco=banco, tamanho_lote=1)
+    assert (resultado.inseridas, resultado.duplicadas) == (2, 1)
+    assert len(banco) == 3
+
+
+OFX = """<OFX><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240301<TRNAMT>-15.00<FITID>A1<MEMO>Padaria</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240301<TRNAMT>-15.00<FITID>A2<MEMO>Padaria</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240301<TRNAMT>-15.00<FITID>A2<MEMO>Padaria</STMTTRN>
+</BANKTRANLIST></OFX>
+"""
+
+
+def test_ofx_dedupes_by_fitid():
+    resultado, banco = _importar(OFX, 'ofx')
+    assert (resultado.inseridas, resultado.duplicadas) == (2, 1)
+    assert {t['date'] for t in banco} == {date(2024, 3, 1)}
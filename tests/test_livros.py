@@ -0,0 +1,164 @@
+"""Named ledgers: each request goes to its own ledger database (X-Ledger or
+/livro/<nome>), ledgers never see each other's rows or wait on each
+other's write lock, and the LRU of open ledgers never closes one in use."""
+import sqlite3
+import uuid
+
+import pytest
+
+import livros
+import migracoes
+
+
+def _novo_livro(app_module):
+    nome = f't{uuid.uuid4().hex[:12]}'
+    migracoes.migrar(livros.caminho(app_module.LEDGERS_DIR, nome))
+    return nome
+
+
+def _adicionar(cliente, descricao, **headers):
+    resposta = cliente.post('/add', headers=headers, data={
+        'description': descricao, 'amount': '10.00', 'category': 'Outros',
+        'type': 'expense', 'transaction_date': '2024-05-01'})
+    assert resposta.status_code == 302
+
+
+def test_x_ledger_isolates_ledgers(app_module, cliente, livro):
+    outro = _novo_livro(app_module)
+    _adicionar(cliente, 'Só no primeiro')
+    _adicionar(cliente, 'Só no segundo', **{'X-Ledger': outro})
+
+    assert 'Só no primeiro' in cliente.get('/').get_data(as_text=True)
+    assert 'Só no segundo' not in cliente.get('/').get_data(as_text=True)
+    pagina = cliente.get('/', headers={'X-Ledger': outro}).get_data(as_text=True)
+    assert 'Só no segundo' in pagina and 'Só no primeiro' not in pagina
+
+    padrao = app_module.app.test_client().get('/').get_data(as_text=True)
+    assert 'Só no primeiro' not in padrao and 'Só no segundo' not in padrao
+
+
+def test_livro_route_switches_the_session_ledger(app_module, cliente, livro):
+    _adicionar(cliente, 'Compra no livro')
+    navegador = app_module.app.test_client()
+
+    assert navegador.get(f'/livro/{livro}').status_code == 302
+    assert 'Compra no livro' in navegador.get('/').get_data(as_text=True)
+    assert navegador.get('/livro/').status_code == 302
+    assert 'Compra no livro' not in navegador.get('/').get_data(as_text=True)
+
+    assert navegador.get('/livro/nao-existe').status_code == 404
+    assert navegador.get('/livro/Inválido').status_code == 404
+    assert navegador.get('/', headers={'X-Ledger': 'nao-existe'}).status_code == 404
+
+
+def test_write_to_one_ledger_does_not_wait_for_another(app_module, cliente, livro):
+    outro = _novo_livro(app_module)
+    # Segura o lock de escrita do outro livro durante a escrita neste
+    bloqueio = sqlite3.connect(str(livros.caminho(app_module.LEDGERS_DIR, outro)),
+                               isolation_level=None)
+    bloqueio.execute('BEGIN IMMEDIATE')
+    try:
+        _adicionar(cliente, 'Escrita livre')
+    finally:
+        bloqueio.execute('ROLLBACK')
+        bloqueio.close()
+    assert 'Escrita livre' in cliente.get('/').get_data(as_text=True)
+
+
+def test_leased_ledger_is_not_evicted(app_module, cliente, livro):
+    outro = _novo_livro(app_module)
+    maximo = app_module.ledgers.maximo
+    app_module.ledgers.maximo = 1
+    try:
+        reservado = app_module.ledgers.reservar(outro)
+        try:
+            # Abrir outro livro passa do limite, mas o reservado continua aberto
+            _adicionar(cliente, 'Acima do limite')
+            assert outro in app_module.ledgers.estatisticas()['livros']
+            with reservado.engine.connect() as con:
+                con.exec_driver_sql('SELECT COUNT(*) FROM "transaction"').scalar()
+        finally:
+            app_module.ledgers.liberar(outro)
+        assert app_module.ledgers.estatisticas()['abertos'] <= 1
+    finally:
+        app_module.ledgers.maximo = maximo
+
+
+def test_dados_ledgers_are_isolated():
+    import dados
+    dados.PASTA_LIVROS.mkdir(parents=True, exist_ok=True)
+    nomes = [f't{uuid.uuid4().hex[:12]}' for _ in range(2)]
+    for nome in nomes:
+        migracoes.migrar(livros.caminho(dados.PASTA_LIVROS, nome))
+    with dados.GerenciadorTransacoes.livro(nomes[0]) as primeiro:
+        primeiro.adicionar_transacao({'description': 'a', 'amount': 7, 'category': 'A',
+                                      'type': 'income', 'date': '2024-05-01'})
+    with dados.GerenciadorTransacoes.livro(nomes[1]) as segundo:
+        assert segundo is not primeiro
+        assert segundo.obter_total_por_tipo('income') == 0
+    with dados.GerenciadorTransacoes.livro(nomes[0]) as primeiro:
+        assert primeiro.obter_total_por_tipo('income') == 7
+    with pytest.raises(livros.LivroInexistente):
+        with dados.GerenciadorTransacoes.livro('nao-existe'):
+            pass
+
+
+class Recurso:
+    def __init__(self, chave):
+        self.chave = chave
+        self.fechado = False
+
+
+@pytest.fixture
+def lru():
+    fechados = []
+
+    def fechar(recurso):
+        recurso.fechado = True
+        fechados.append(recurso.chave)
+
+    abertos = livros.AbertosLRU(Recurso, fechar, maximo=2, ocioso=0)
+    abertos.fechados = fechados
+    return abertos
+
+
+def test_lru_closes_least_recently_used_free_entry(lru):
+    for chave in 'abc':
+        with lru.usar(chave):
+            pass
+    assert lru.fechados == ['a']
+    with lru.usar('b'):
+        pass
+    with lru.usar('d'):
+        pass
+    assert lru.fechados == ['a', 'c']
+    assert lru.estatisticas()['livros'] == ['b', 'd']
+
+
+def test_lru_exceeds_limit_while_all_entries_are_leased(lru):
+    recursos = [lru.reservar(chave) for chave in 'abc']
+    assert lru.fechados == []
+    assert not any(recurso.fechado for recurso in recursos)
+    assert lru.estatisticas()['em_uso'] == 3
+
+    lru.liberar('b')
+    assert lru.fechados == ['b']
+    lru.liberar('a')
+    lru.liberar('c')
+    assert lru.estatisticas()['abertos'] == 2
+
+
+def test_lru_keeps_busy_entries_open():
+    ocupados = {'a'}
+    abertos = livros.AbertosLRU(Recurso, lambda recurso: None, maximo=1, ocioso=0,
+                                ocupado=lambda recurso: recurso.chave in ocupados)
+    with abertos.usar('a'):
+        pass
+    with abertos.usar('b'):
+        pass
+    # Acima do limite, sai o livre mais recente, não o ocupado mais antigo
+    assert abertos.estatisticas()['livros'] == ['a']
+    ocupados.clear()
+    abertos.ocioso = -1
+    assert abertos.expirar() == 1
+    assert abertos.estatisticas()['abertos'] == 0
@@ -0,0 +1,132 @@
+"""Bulk delete, restore and permanent delete (/bulk/<action> and the
+*_em_lote methods of dados.py), by checked ids or by the current filter:
+the affected counts, and monthly summary, daily balance and budget spend
+still matching a full recomputation afterwards."""
+import sqlite3
+
+import pytest
+
+import livros
+
+LINHAS = [('Mercado', '100.00', 'Alimentação', 'expense', '2024-01-05'),
+          ('Padaria', '10.00', 'Alimentação', 'expense', '2024-01-20'),
+          ('Salário', '3000.00', 'Salário', 'income', '2024-01-05'),
+          ('Cinema', '40.00', 'Lazer', 'expense', '2024-02-10'),
+          ('Feira', '60.00', 'Alimentação', 'expense', '2024-02-11'),
+          ('Bônus', '500.00', 'Salário', 'income', '2024-02-28')]
+JSON = {'Accept': 'application/json'}
+
+
+@pytest.fixture
+def livro_com_linhas(app_module, cliente, livro):
+    cliente.post('/orcamentos', data={'category': 'Alimentação', 'amount': '200.00'})
+    for descricao, valor, categoria, tipo, dia in LINHAS:
+        cliente.post('/add', data={'description': descricao, 'amount': valor,
+                                   'category': categoria, 'type': tipo,
+                                   'transaction_date': dia})
+    con = sqlite3.connect(str(livros.caminho(app_module.LEDGERS_DIR, livro)))
+    ids = dict(con.execute('SELECT description, id FROM "transaction"'))
+    con.close()
+    return ids
+
+
+def _lote(cliente, acao, **dados):
+    resposta = cliente.post(f'/bulk/{acao}', data=dados, headers=JSON)
+    return resposta.status_code, resposta.get_json()
+
+
+def _sem_divergencias(app_module, livro):
+    runner = app_module.app.test_cli_runner()
+    for comando in ('rebuild-summary', 'rebuild-balance', 'rebuild-budgets'):
+        resultado = runner.invoke(args=[comando, '--verify', '--ledger', livro])
+        assert resultado.exit_code == 0, (comando, resultado.output)
+
+
+def _estado(app_module, livro):
+    con = sqlite3.connect(str(livros.caminho(app_module.LEDGERS_DIR, livro)))
+    linhas = dict(con.execute('SELECT description, deleted_at IS NOT NULL FROM "transaction"'))
+    con.close()
+    return linhas
+
+
+def test_bulk_by_ids(app_module, cliente, livro, livro_com_linhas):
+    ids = livro_com_linhas
+    selecionadas = [ids['Mercado'], ids['Cinema']]
+    assert _lote(cliente, 'delete', ids=selecionadas) == (200, {'affected': 2, 'error': None})
+    # Já na lixeira: nada a fazer
+    assert _lote(cliente, 'delete', ids=selecionadas)[1]['affected'] == 0
+    _sem_divergencias(app_module, livro)
+
+    assert _lote(cliente, 'restore', ids=[ids['Cinema']])[1]['affected'] == 1
+    assert _lote(cliente, 'permanent-delete',
+                 ids=[ids['Mercado'], ids['Padaria']])[1]['affected'] == 2
+    assert _estado(app_module, livro) == {'Salário': 0, 'Cinema': 0, 'Feira': 0, 'Bônus': 0}
+    _sem_divergencias(app_module, livro)
+
+
+def test_bulk_by_filter(app_module, cliente, livro, livro_com_linhas):
+    assert _lote(cliente, 'delete', scope='filter', year=2024, month=1,
+                 type='expense')[1]['affected'] == 2
+    assert _lote(cliente, 'delete', scope='filter', category='Salário')[1]['affected'] == 2
+    _sem_divergencias(app_module, livro)
+
+    assert _lote(cliente, 'restore', scope='filter', year=2024, month=1)[1]['affected'] == 3
+    # Por filtro, a exclusão definitiva só alcança o que já está na lixeira
+    assert _lote(cliente, 'permanent-delete', scope='filter',
+                 year=2024)[1]['affected'] == 1
+    assert _estado(app_module, livro) == {'Mercado': 0, 'Padaria': 0, 'Salário': 0,
+                                          'Cinema': 0, 'Feira': 0}
+    _sem_divergencias(app_module, livro)
+
+
+@pytest.mark.parametrize('dados', [{}, {'ids': []}, {'scope': 'filter'},
+                                   {'scope': 'filter', 'type': 'expense'}])
+def test_bulk_requires_a_selection(cliente, livro_com_linhas, dados):
+    status, corpo = _lote(cliente, 'delete', **dados)
+    assert status == 400 and corpo['affected'] is None and corpo['error']
+
+
+def test_bulk_filter_with_invalid_period_affects_nothing(app_module, cliente, livro,
+                                                        livro_com_linhas):
+    for periodo in ({'year': 10000}, {'year': 2024, 'month': 13}, {'month': 13}):
+        assert _lote(cliente, 'delete', scope='filter', **periodo) == \
+            (200, {'affected': 0, 'error': None})
+    assert not any(_estado(app_module, livro).values())
+
+
+def test_unknown_bulk_action(cliente):
+    assert cliente.post('/bulk/explodir', data={'ids': [1]}).status_code == 404
+
+
+def test_dados_bulk(abrir_dados):
+    gerenciador = abrir_dados()
+    gerenciador.definir_orcamento('Alimentação', 200)
+    ids = {descricao: gerenciador.adicionar_transacao({
+        'description': descricao, 'amount': valor, 'category': categoria, 'type': tipo,
+        'date': dia}) for descricao, valor, categoria, tipo, dia in LINHAS}
+
+    assert gerenciador.remover_em_lote([ids['Mercado'], ids['Cinema']]) == 2
+    assert gerenciador.remover_em_lote([ids['Mercado']]) == 0
+    assert gerenciador.remover_em_lote(mes=1, ano=2024) == 2
+    assert gerenciador.remover_em_lote(categoria='Salário') == 1
+    assert gerenciador.restaurar_em_lote(mes=1, ano=2024) == 3
+    assert gerenciador.excluir_em_lote(ano=2024) == 2
+    assert gerenciador.excluir_em_lote([ids['Feira']]) == 1
+    assert gerenciador.remover_em_lote(mes=13, ano=2024) == 0
+    assert {t['description'] for t in gerenciador.obter_transacoes_filtradas()} == \
+        {'Mercado', 'Padaria', 'Salário'}
+    assert gerenciador.reconstruir_resumo(verificar=True) == []
+    assert gerenciador.reconstruir_saldo(verificar=True) == []
+    assert gerenciador.reconstruir_orcamentos(verificar=True) == []
+    assert gerenciador.obter_orcamentos(1, 2024)[0]['gasto'] == 110
+
+
+def test_deleting_a_trashed_row_keeps_its_date(app_module, cliente, livro, livro_com_linhas):
+    con = sqlite3.connect(str(livros.caminho(app_module.LEDGERS_DIR, livro)))
+    consulta = 'SELECT id, deleted_at FROM "transaction" WHERE deleted_at IS NOT NULL'
+    cliente.get(f"/delete/{livro_com_linhas['Mercado']}")
+    removida = con.execute(consulta).fetchall()
+    cliente.get(f"/delete/{livro_com_linhas['Mercado']}")
+    assert con.execute(consulta).fetchall() == removida
+    con.close()
+    _sem_divergencias(app_module, livro)
@@ -0,0 +1,71 @@
+"""Year/month filters outside what `date` can represent select no rows
+instead of raising: every page, export, bulk filter and dados.py query
+that goes through intervalo_periodo."""
+from datetime import date
+
+import pytest
+
+from periodos import VAZIO, intervalo_periodo
+
+
+def test_intervalo_periodo():
+    assert intervalo_periodo(None, 4) is None
+    assert intervalo_periodo(2024) == (date(2024, 1, 1), date(2025, 1, 1))
+    assert intervalo_periodo(2024, 12) == (date(2024, 12, 1), date(2025, 1, 1))
+    assert intervalo_periodo(9998, 12) == (date(9998, 12, 1), date(9999, 1, 1))
+    for ano, mes in ((2024, 13), (2024, -1), (9999, None), (10000, 1), (-3, None)):
+        assert intervalo_periodo(ano, mes) == VAZIO
+
+
+@pytest.fixture
+def com_transacao(cliente):
+    resposta = cliente.post('/add', data={'description': 'Padaria', 'amount': '15.00',
+                                          'category': 'Alimentação', 'type': 'expense',
+                                          'transaction_date': '2024-03-10'})
+    assert resposta.status_code == 302
+    return cliente
+
+
+@pytest.mark.parametrize('query', ['year=10000', 'year=-3', 'month=13', 'year=2024&month=13'])
+def test_pages_answer_out_of_range_periods_without_rows(com_transacao, query):
+    resposta = com_transacao.get(f'/buscar?q=padaria&{query}')
+    assert resposta.status_code == 200
+    assert 'Padaria' not in resposta.get_data(as_text=True)
+
+    resposta = com_transacao.get(f'/extrato?{query}')
+    assert resposta.status_code == 200
+    assert 'Padaria' not in resposta.get_data(as_text=True)
+
+    resposta = com_transacao.get(f'/extrato/export?format=csv&{query}')
+    assert resposta.status_code == 200
+    assert 'Padaria' not in resposta.get_data(as_text=True)
+
+
+def test_in_range_period_still_matches(com_transacao):
+    resposta = com_transacao.get('/buscar?q=padaria&year=2024&month=3')
+    assert 'Padaria' in resposta.get_data(as_text=True)
+
+
+@pytest.mark.parametrize('periodo', [{'year': 10000}, {'year': 2024, 'month': 13}])
+def test_bulk_filter_with_out_of_range_period_affects_nothing(com_transacao, periodo):
+    resposta = com_transacao.post('/bulk/delete', data={'scope': 'filter', **periodo},
+                                  headers={'Accept': 'application/json'})
+    assert resposta.status_code == 200
+    assert resposta.get_json()['affected'] == 0
+
+
+def test_orcamentos_rejects_out_of_range_year(cliente):
+    assert cliente.get('/orcamentos?year=10000').status_code == 400
+    assert cliente.get('/orcamentos?year=2024&month=13').status_code == 400
+
+
+def test_dados_filters_out_of_range_periods(abrir_dados):
+    gerenciador = abrir_dados()
+    gerenciador.adicionar_transacao({'description': 'Padaria', 'amount': 15,
+                                     'category': 'Alimentação', 'type': 'expense',
+                                     'date': '2024-03-10'})
+    assert gerenciador.obter_transacoes_filtradas(13, 2024) == []
+    assert gerenciador.obter_transacoes_filtradas(None, 10000) == []
+    assert gerenciador.buscar('padaria', ano=10000) == []
+    assert gerenciador.remover_em_lote(mes=13, ano=2024) == 0
+    assert len(gerenciador.obter_transacoes_filtradas(3, 2024)) == 1
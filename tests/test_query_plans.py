@@ -0,0 +1,44 @@
+"""Every list query must be served by an index: a full table scan that
+comes back (a dropped index, a filter that stops matching a partial index)
+fails here instead of only slowing down large ledgers."""
+import pytest
+
+import livros
+import migracoes
+from periodos import plano_usa_indice
+
+
+@pytest.fixture(scope='module')
+def gerenciador():
+    import dados
+    dados.PASTA_LIVROS.mkdir(parents=True, exist_ok=True)
+    migracoes.migrar(livros.caminho(dados.PASTA_LIVROS, 'planos'))
+    with dados.GerenciadorTransacoes.livro('planos') as gerenciador:
+        yield gerenciador
+
+
+def _planos_app(app_module):
+    with app_module.app.app_context():
+        return app_module.query_plans()
+
+
+def test_app_query_plans_use_indexes(app_module):
+    plans = _planos_app(app_module)
+    assert plans
+    scans = {name: details for name, details in plans.items() if not plano_usa_indice(details)}
+    assert not scans
+
+
+def test_dados_query_plans_use_indexes(gerenciador):
+    planos = gerenciador.planos_de_consulta()
+    assert planos
+    varreduras = {nome: detalhes for nome, detalhes in planos.items()
+                  if not plano_usa_indice(detalhes)}
+    assert not varreduras
+
+
+def test_plano_usa_indice_detects_scans():
+    assert plano_usa_indice(['SEARCH t USING INDEX ix_transaction_active_date (date>?)'])
+    assert plano_usa_indice(['SCAN t USING INDEX ix_transaction_trash'])
+    assert not plano_usa_indice(['SCAN transaction'])
+    assert not plano_usa_indice(['SEARCH t USING INDEX ix (date>?)', 'USE TEMP B-TREE FOR ORDER BY'])
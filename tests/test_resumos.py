@@ -0,0 +1,163 @@
+"""The rollups every write maintains incrementally (monthly_summary,
+daily_balance and the budgets' spend read from it) must match a full
+recomputation after any mix of writes: add, soft delete, restore,
+permanent delete, bulk actions, statement import and trash purge, in the
+app and in dados.py. There is no edit route or method in this tree, so
+there is no edit path to cover."""
+import io
+import sqlite3
+import time
+from datetime import date
+
+import pytest
+
+import livros
+
+DESPESAS = [('Mercado', '120.50', 'Alimentação', '2024-01-05'),
+            ('Aluguel', '1500.00', 'Moradia', '2024-01-10'),
+            ('Cinema', '42.00', 'Lazer', '2024-02-14'),
+            ('Padaria', '8.90', 'Alimentação', '2024-02-20'),
+            ('Farmácia', '35.10', 'Saúde', '2024-03-01'),
+            ('Uber', '19.99', 'Transporte', '2024-03-03')]
+RECEITAS = [('Salário', '5000.00', 'Salário', '2024-01-05'),
+            ('Freela', '800.00', 'Freelance', '2024-02-28')]
+
+ORCAMENTOS = {'Alimentação': '300.00', 'Lazer': '100.00', 'Moradia': '1500.00'}
+
+EXTRATO = """date,description,amount,category
+2024-02-01,Mercado importado,-55.30,Alimentação
+2024-02-01,Mercado importado,-55.30,Alimentação
+2024-03-15,Reembolso,120.00,Outros
+2024-04-02,Show,-150.00,Lazer
+"""
+
+
+def _esperar_expurgo(cliente):
+    while cliente.get('/empty-trash/status').get_json()['rodando']:
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def escritas(app_module, cliente, livro):
+    """Roda todos os caminhos de escrita do app no livro do teste"""
+    for categoria, limite in ORCAMENTOS.items():
+        resposta = cliente.post('/orcamentos', data={'category': categoria, 'amount': limite})
+        assert resposta.status_code == 302
+    for descricao, valor, categoria, dia in DESPESAS + RECEITAS:
+        tipo = 'income' if (descricao, valor, categoria, dia) in RECEITAS else 'expense'
+        resposta = cliente.post('/add', data={'description': descricao, 'amount': valor,
+                                              'category': categoria, 'type': tipo,
+                                              'transaction_date': dia})
+        assert resposta.status_code == 302
+    resposta = cliente.post('/importar', data={
+        'arquivo': (io.BytesIO(EXTRATO.encode()), 'extrato.csv')},
+        content_type='multipart/form-data')
+    assert resposta.status_code == 200
+
+    con = sqlite3.connect(str(livros.caminho(app_module.LEDGERS_DIR, livro)))
+    ids = dict(con.execute('SELECT description, MAX(id) FROM "transaction" GROUP BY 1'))
+    con.close()
+
+    json = {'Accept': 'application/json'}
+    cliente.get(f"/delete/{ids['Mercado']}")
+    cliente.get(f"/delete/{ids['Cinema']}")
+    cliente.get(f"/restore/{ids['Cinema']}")
+    cliente.get(f"/permanent-delete/{ids['Mercado']}")
+    # Exclusão definitiva de uma transação ativa
+    cliente.get(f"/permanent-delete/{ids['Uber']}")
+    afetadas = cliente.post('/bulk/delete', headers=json, data={
+        'scope': 'filter', 'year': 2024, 'month': 2}).get_json()['affected']
+    assert afetadas == 5
+    afetadas = cliente.post('/bulk/restore', headers=json, data={
+        'ids': [ids['Cinema'], ids['Freela']]}).get_json()['affected']
+    assert afetadas == 2
+    afetadas = cliente.post('/bulk/permanent-delete', headers=json, data={
+        'scope': 'filter', 'category': 'Alimentação'}).get_json()['affected']
+    assert afetadas == 3
+    cliente.get(f"/delete/{ids['Farmácia']}")
+    cliente.post('/empty-trash')
+    _esperar_expurgo(cliente)
+    cliente.get(f"/delete/{ids['Show']}")
+    return ids
+
+
+def _verificar(app_module, comando, livro):
+    resultado = app_module.app.test_cli_runner().invoke(
+        args=[comando, '--verify', '--ledger', livro])
+    return resultado.exit_code, resultado.output
+
+
+def test_app_monthly_summary_has_no_drift(app_module, escritas, livro):
+    assert _verificar(app_module, 'rebuild-summary', livro) == (0, '0 divergências encontradas.\n')
+
+    con = sqlite3.connect(str(livros.caminho(app_module.LEDGERS_DIR, livro)))
+    con.execute("UPDATE monthly_summary SET total = total + 1 WHERE category = 'Moradia'")
+    con.commit()
+    con.close()
+    codigo, saida = _verificar(app_module, 'rebuild-summary', livro)
+    assert codigo == 1 and '1 divergências' in saida
+
+
+@pytest.fixture
+def escritas_dados(abrir_dados):
+    """Os mesmos caminhos de escrita, pelo GerenciadorTransacoes"""
+    gerenciador = abrir_dados()
+    for categoria, limite in ORCAMENTOS.items():
+        gerenciador.definir_orcamento(categoria, limite)
+    ids = {}
+    for descricao, valor, categoria, dia in DESPESAS + RECEITAS:
+        tipo = 'income' if (descricao, valor, categoria, dia) in RECEITAS else 'expense'
+        ids[descricao] = gerenciador.adicionar_transacao({
+            'description': descricao, 'amount': valor, 'category': categoria,
+            'type': tipo, 'date': dia})
+    gerenciador.importar_extrato(io.StringIO(EXTRATO))
+    gerenciador.remover_transacao(ids['Mercado'])
+    gerenciador.remover_transacao(ids['Cinema'])
+    gerenciador.restaurar_transacao(ids['Cinema'])
+    gerenciador.excluir_permanentemente(ids['Mercado'])
+    gerenciador.excluir_permanentemente(ids['Uber'])
+    assert gerenciador.remover_em_lote(mes=2, ano=2024) == 5
+    assert gerenciador.restaurar_em_lote([ids['Cinema'], ids['Freela']]) == 2
+    assert gerenciador.excluir_em_lote(categoria='Alimentação') == 3
+    gerenciador.remover_transacao(ids['Farmácia'])
+    gerenciador.esvaziar_lixeira()
+    gerenciador.remover_transacao(ids['Aluguel'])
+    return gerenciador
+
+
+def test_dados_monthly_summary_has_no_drift(escritas_dados):
+    assert escritas_dados.reconstruir_resumo(verificar=True) == []
+    escritas_dados.con.execute("UPDATE monthly_summary SET count = count + 1")
+    escritas_dados.con.commit()
+    assert escritas_dados.reconstruir_resumo(verificar=True)
+
+
+def test_app_daily_balance_has_no_drift(app_module, escritas, livro, cliente):
+    assert _verificar(app_module, 'rebuild-balance', livro) == (0, '0 divergências encontradas.\n')
+    # O saldo de /saldo é o que sobrou depois de todas as escritas
+    pontos = cliente.get('/saldo?inicio=2024-12-31&fim=2024-12-31').get_json()['pontos']
+    assert pontos[-1]['saldo_centavos'] == 500000 + 80000 + 12000 - 4200 - 150000
+
+
+def test_dados_daily_balance_has_no_drift(escritas_dados):
+    assert escritas_dados.reconstruir_saldo(verificar=True) == []
+    assert escritas_dados.obter_saldo_em(date(2024, 12, 31)) == 5000 + 800 + 120 - 42 - 150
+    escritas_dados.con.execute("UPDATE daily_balance SET balance = balance + 1")
+    escritas_dados.con.commit()
+    assert escritas_dados.reconstruir_saldo(verificar=True)
+
+
+def test_app_budget_spend_has_no_drift(app_module, escritas, livro):
+    assert _verificar(app_module, 'rebuild-budgets', livro) == (0, '0 divergências encontradas.\n')
+    with app_module.app.app_context(), app_module.use_ledger(livro):
+        gastos = {mes: {b['categoria']: b['gasto'] for b in app_module.budget_status(2024, mes)}
+                  for mes in (1, 2)}
+    assert gastos[1] == {'Alimentação': 0, 'Lazer': 0, 'Moradia': 150000}
+    assert gastos[2] == {'Alimentação': 0, 'Lazer': 4200, 'Moradia': 0}
+
+
+def test_dados_budget_spend_has_no_drift(escritas_dados):
+    assert escritas_dados.reconstruir_orcamentos(verificar=True) == []
+    gastos = {o['categoria']: o['gasto'] for o in escritas_dados.obter_orcamentos(2, 2024)}
+    assert gastos == {'Alimentação': 0, 'Lazer': 42, 'Moradia': 0}
+    assert [o['gasto'] for o in escritas_dados.obter_orcamentos(1, 2024)] == [0, 0, 0]
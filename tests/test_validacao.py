@@ -0,0 +1,51 @@
+"""Transaction fields are validated in the model constructor
+(models.validar_campos); /add turns a rejected form into a flash message
+and a redirect back to the form, without writing anything."""
+from datetime import date
+
+import pytest
+
+VALIDA = {'description': '  Padaria  ', 'amount': '12,34', 'category': ' Alimentação ',
+          'type': 'EXPENSE', 'transaction_date': '2024-05-01'}
+
+
+def test_transaction_normalizes_fields(app_module):
+    transacao = app_module.Transaction('  Padaria ', '12,34', ' Alimentação ', 'Income',
+                                       date(2024, 5, 1))
+    assert (transacao.description, transacao.amount, transacao.category, transacao.type,
+            transacao.date) == ('Padaria', 1234, 'Alimentação', 'income', date(2024, 5, 1))
+    assert app_module.Transaction('x', 1, 'c', 'income', '2024-05-01').date == date(2024, 5, 1)
+
+
+@pytest.mark.parametrize('campo, valor', [('description', ''), ('description', '   '),
+                                          ('description', 'x' * 101), ('amount', '0'),
+                                          ('amount', '-5'), ('amount', 'abc'),
+                                          ('type', 'transfer'), ('type', '')])
+def test_transaction_rejects_invalid_fields(app_module, campo, valor):
+    campos = {'description': 'Padaria', 'amount': '1', 'category': 'A', 'type': 'expense',
+              'date': '2024-05-01', campo: valor}
+    with pytest.raises(ValueError):
+        app_module.Transaction(**campos)
+
+
+def test_transaction_rejects_invalid_date(app_module):
+    for dia in ('01/05/2024', 20240501):
+        with pytest.raises(ValueError):
+            app_module.Transaction('Padaria', '1', 'A', 'expense', dia)
+
+
+@pytest.mark.parametrize('campo, valor', [('description', 'x' * 101), ('type', 'transfer'),
+                                          ('amount', '0'), ('transaction_date', 'ontem')])
+def test_add_rejects_invalid_form_with_flash_and_redirect(cliente, campo, valor):
+    resposta = cliente.post('/add', data={**VALIDA, campo: valor})
+    assert resposta.status_code == 302
+    assert resposta.headers['Location'].endswith('/add')
+    assert 'Dados inválidos' in cliente.get('/add').get_data(as_text=True)
+    assert 'Padaria' not in cliente.get('/extrato').get_data(as_text=True)
+
+
+def test_add_stores_normalized_fields(cliente):
+    resposta = cliente.post('/add', data=VALIDA)
+    assert resposta.headers['Location'].endswith('/')
+    pagina = cliente.get('/extrato?type=expense').get_data(as_text=True)
+    assert '>Padaria<' in pagina and '12.34' in pagina